@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+# Flush thresholds shared by the labelers and extractors
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "500"))
+WRITE_BATCH_SECONDS = float(os.getenv("WRITE_BATCH_SECONDS", "2.0"))
+
+
+class BatchWriter:
+    """
+    Buffers parameterized writes and flushes them with executemany in a single transaction
+    once `max_rows` rows are waiting or the oldest waiting write is `max_seconds` old.
+
+    Each add call is a complete unit of work (e.g. all rows for one article), so every
+    flush commits whole units and a crash loses at most the unflushed tail, never half a unit.
+    Statements are replayed in the order they were added.
+
+    Use it as a context manager: that starts a background thread which flushes on age even
+    while the caller is stuck waiting for its next unit (a slow model or API call), and
+    flushes the tail on exit, including when the loop around it raises. Since that thread
+    writes through `conn`, open it with check_same_thread=False and leave it to the writer
+    inside the with block.
+
+    Attributes:
+    - conn (sqlite3.Connection): Connection the writes go to; flush() commits it.
+    - max_rows (int): Buffered rows that trigger a flush.
+    - max_seconds (float): Age of the oldest unflushed write that triggers a flush.
+    - rows_written (int): Rows flushed so far.
+    - flushes (int): Transactions committed so far.
+    """
+
+    def __init__(self, conn, max_rows=WRITE_BATCH_ROWS, max_seconds=WRITE_BATCH_SECONDS):
+        self.conn = conn
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.rows_written = 0
+        self.flushes = 0
+        self._pending = []  # [sql, [params, ...]] runs, in insertion order
+        self._pending_rows = 0
+        self._first_pending = None  # When the oldest unflushed write was added
+        self._lock = threading.Lock()
+        # Wakes the flusher when a write starts the clock, and on exit
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = False
+        self._flusher = None
+        self._flush_error = None
+
+    def add(self, sql, params):
+        """Buffers one write."""
+        self.add_many(sql, [params])
+
+    def add_many(self, sql, rows):
+        """Buffers several writes of the same statement as one unit."""
+        self.add_unit([(sql, rows)])
+
+    def add_unit(self, statements):
+        """
+        Buffers a unit of work made of several statements, e.g. an article's sentences plus
+        its status update, and flushes if due. A unit is never split across transactions.
+
+        Parameters:
+        - statements (list): (sql, list of params) pairs, in the order they must run.
+        """
+        self._raise_flush_error()
+        with self._lock:
+            for sql, rows in statements:
+                rows = list(rows)
+                if not rows:
+                    continue
+                if self._pending and self._pending[-1][0] == sql:
+                    self._pending[-1][1].extend(rows)
+                else:
+                    self._pending.append([sql, rows])
+                self._pending_rows += len(rows)
+                if self._first_pending is None:
+                    self._first_pending = time.monotonic()
+                    self._wakeup.notify()
+            due = self._pending_rows >= self.max_rows or self._seconds_until_due() <= 0
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered in one transaction."""
+        with self._lock:
+            pending, rows = self._pending, self._pending_rows
+            self._pending, self._pending_rows, self._first_pending = [], 0, None
+            if not pending:
+                return
+            with self.conn:
+                for sql, params in pending:
+                    self.conn.executemany(sql, params)
+            self.rows_written += rows
+            self.flushes += 1
+
+    def _seconds_until_due(self):
+        """Time left before the oldest pending write is due; call with the lock held."""
+        if self._first_pending is None:
+            return self.max_seconds
+        return self._first_pending + self.max_seconds - time.monotonic()
+
+    def _flush_when_due(self):
+        # Runs on the flusher thread until __exit__
+        while True:
+            with self._wakeup:
+                # Nothing pending: sleep until a write comes in
+                while not self._stopped and (self._first_pending is None or self._seconds_until_due() > 0):
+                    self._wakeup.wait(None if self._first_pending is None else self._seconds_until_due())
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # Raised in the caller's thread on its next add or on exit
+                print(f"[BatchWriter] Background flush failed: {e}")
+                self._flush_error = e
+                return
+
+    def _raise_flush_error(self):
+        if self._flush_error is not None:
+            error, self._flush_error = self._flush_error, None
+            raise error
+
+    def __enter__(self):
+        self._stopped = False
+        self._flusher = threading.Thread(target=self._flush_when_due, name="batch-writer-flush", daemon=True)
+        self._flusher.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+        self._flusher.join()
+        self._flusher = None
+        self.flush()
+        if exc_type is None:
+            self._raise_flush_error()
@@ -0,0 +1,151 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from common.models import DEFAULT_CHECKPOINT, get_classifier
+
+# Defaults for the shared inference service
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    """
+    Coalesces single-text classification requests into micro-batches.
+
+    Callers submit one text at a time and get a Future back; a worker thread
+    collects queued texts until either `max_batch_size` texts are waiting or the
+    oldest one has waited `max_wait_ms`, then classifies them in one forward pass.
+
+    Attributes:
+    - classify_fn (callable): Takes a list of texts and returns one label per text.
+    - max_batch_size (int): Largest batch handed to `classify_fn`.
+    - max_wait_ms (float): Longest time a text waits for companions before its batch runs.
+    """
+
+    def __init__(self, classify_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.classify_fn = classify_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._latencies_ms = deque(maxlen=1000)
+        self._texts_done = 0
+
+    def submit(self, text):
+        """Queues a text for classification and returns a Future resolving to its label."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def classify(self, text):
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(text).result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self):
+        """Blocks for the first request, then gathers more until the batch is full or the wait expires."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+
+            # Drop requests whose callers cancelled them while they were queued
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            started_at = time.perf_counter()
+            try:
+                labels = self.classify_fn(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+            for (_, future), label in zip(batch, labels):
+                future.set_result(label)
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._latencies_ms.append(elapsed_ms)
+                self._texts_done += len(batch)
+
+    def stats(self):
+        """Returns queue depth, the batch size histogram and recent per-batch latencies."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies_ms)
+            histogram = dict(sorted(self._batch_sizes.items()))
+            texts_done = self._texts_done
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "texts_classified": texts_done,
+            "batches": sum(histogram.values()),
+            "batch_size_histogram": histogram,
+            "batch_latency_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 2) if latencies else None,
+                "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            },
+        }
+
+
+# Process-wide registry: checkpoint -> MicroBatcher
+_batchers = {}
+_registry_lock = threading.Lock()
+
+
+def get_batcher(checkpoint=DEFAULT_CHECKPOINT):
+    """Returns the shared micro-batching service for `checkpoint`."""
+    with _registry_lock:
+        if checkpoint not in _batchers:
+            # The model itself is loaded by the worker on the first batch
+            _batchers[checkpoint] = MicroBatcher(
+                lambda texts: get_classifier(checkpoint).classify_batch(texts, batch_size=len(texts))
+            )
+        return _batchers[checkpoint]
+
+
+def batching_report():
+    """Reports the metrics of every micro-batching service in this process."""
+    with _registry_lock:
+        batchers = dict(_batchers)
+    return {checkpoint: batcher.stats() for checkpoint, batcher in batchers.items()}
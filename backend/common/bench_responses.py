@@ -0,0 +1,91 @@
+"""
+Serialization time and bytes on the wire per dashboard endpoint, before and after the
+orjson/compression change.
+
+Each endpoint is fetched once uncompressed. Its payload is then re-serialized the old way
+(jsonable_encoder + json.dumps, as FastAPI's JSONResponse does) and the new way (orjson),
+and the body is compressed with gzip and, when installed, brotli. The payload is re-parsed
+from JSON, so pandas and numpy values are already plain Python values: the "before" column
+is a lower bound.
+
+From backend/ (combined server):
+    python -m common.bench_responses [path ...]
+From backend/newyorktimes/ (its database path is relative):
+    python ../common/bench_responses.py --app api:app /api/posts/recent /api/metrics
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from starlette.responses import JSONResponse
+from common.compression import brotli, compress
+from common.responses import dumps
+
+DEFAULT_PATHS = ["/threads/", "/mastodon/", "/guardian/", "/youtube/",
+                 "/threads/metrics", "/mastodon/metrics", "/youtube/metrics"]
+
+
+def best_of(fn, repeat):
+    """Fastest of `repeat` runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def bench(client, path, repeat):
+    response = client.get(path, headers={"Accept-Encoding": "identity"})
+    if response.status_code != 200:
+        return None
+    body = response.content
+    payload = json.loads(body)
+    old_render = JSONResponse(None).render
+
+    row = {
+        "path": path,
+        "before_ms": best_of(lambda: old_render(jsonable_encoder(payload)), repeat),
+        "after_ms": best_of(lambda: dumps(payload), repeat),
+        "identity_bytes": len(body),
+        "gzip_bytes": len(compress(body, "gzip")),
+        "br_bytes": len(compress(body, "br")) if brotli is not None else None,
+    }
+    started = time.perf_counter()
+    client.get(path, headers={"Accept-Encoding": "br, gzip"})
+    row["request_ms"] = (time.perf_counter() - started) * 1000
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS)
+    parser.add_argument("--app", default="server:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    module, _, attribute = args.app.partition(":")
+    # No startup events: the endpoints are served from the existing databases, without loading models
+    client = TestClient(getattr(importlib.import_module(module), attribute))
+
+    print(f"{'endpoint':<22}{'json ms':>10}{'orjson ms':>11}{'speedup':>9}{'raw KB':>10}{'gzip KB':>10}{'br KB':>9}{'req ms':>9}")
+    for path in args.paths:
+        row = bench(client, path, args.repeat)
+        if row is None:
+            print(f"{path:<22}  skipped (no data yet or not a 200)")
+            continue
+        br = f"{row['br_bytes'] / 1024:.1f}" if row["br_bytes"] is not None else "-"
+        print(f"{row['path']:<22}{row['before_ms']:>10.2f}{row['after_ms']:>11.2f}"
+              f"{row['before_ms'] / max(row['after_ms'], 1e-6):>8.1f}x"
+              f"{row['identity_bytes'] / 1024:>10.1f}{row['gzip_bytes'] / 1024:>10.1f}{br:>9}{row['request_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
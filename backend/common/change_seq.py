@@ -0,0 +1,88 @@
+"""
+Change sequence for delta sync.
+
+Every tracked table gets an indexed change_seq column. Triggers stamp a row with the next
+value of the database-wide counter when it is inserted or one of its watched columns (its
+labels) changes, and record a tombstone when it is deleted. Writers serialize in SQLite, so
+sequence order is commit order, and a client that remembers the highest sequence it has seen
+(its cursor) can ask for exactly the rows changed after it.
+
+Read the cursor before the rows: a write landing in between is then sent again on the next
+poll rather than skipped, and applying a row twice is harmless.
+"""
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS change_counter (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO change_counter (id, seq) VALUES (1, 0);
+    CREATE TABLE IF NOT EXISTS change_tombstones (
+        table_name TEXT NOT NULL,
+        row_key,
+        change_seq INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_change_tombstones_seq ON change_tombstones (table_name, change_seq);
+"""
+
+_NEXT_SEQ = "UPDATE change_counter SET seq = seq + 1 WHERE id = 1;"
+_SEQ = "(SELECT seq FROM change_counter WHERE id = 1)"
+
+
+def track_changes(conn, table, columns, key="id"):
+    """
+    Adds change_seq to `table` with its index and triggers, stamping rows that predate it.
+    Safe to call on every startup.
+
+    Parameters:
+    - columns (list): Columns whose updates count as a change (e.g. the labels).
+    - key (str): Column reported for deleted rows.
+    """
+    conn.executescript(SCHEMA)
+    existing = [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+    changed = " OR ".join(f"OLD.{col} IS NOT NEW.{col}" for col in columns)
+    with conn:
+        if "change_seq" not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN change_seq INTEGER")
+        # Rows written without the triggers get fresh sequences past everything handed out so far
+        conn.execute(f"UPDATE {table} SET change_seq = {_SEQ} + rowid WHERE change_seq IS NULL")
+        conn.execute(f"""
+            UPDATE change_counter SET seq = MAX(seq, (SELECT IFNULL(MAX(change_seq), 0) FROM {table})) WHERE id = 1
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_change_seq ON {table} (change_seq)")
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table}
+            BEGIN
+                {_NEXT_SEQ}
+                UPDATE {table} SET change_seq = {_SEQ} WHERE rowid = NEW.rowid;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE OF {", ".join(columns)} ON {table}
+            WHEN {changed}
+            BEGIN
+                {_NEXT_SEQ}
+                UPDATE {table} SET change_seq = {_SEQ} WHERE rowid = NEW.rowid;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table}
+            BEGIN
+                {_NEXT_SEQ}
+                INSERT INTO change_tombstones (table_name, row_key, change_seq) VALUES ('{table}', OLD.{key}, {_SEQ});
+            END
+        """)
+
+
+def current_cursor(conn):
+    """Highest change sequence handed out so far; 0 before the first change."""
+    row = conn.execute(f"SELECT {_SEQ}").fetchone()
+    return row[0] or 0
+
+
+def deleted_since(conn, table, since):
+    """Keys of the rows deleted from `table` after the `since` cursor."""
+    rows = conn.execute("""
+        SELECT row_key FROM change_tombstones WHERE table_name = ? AND change_seq > ? ORDER BY change_seq
+    """, (table, since)).fetchall()
+    return [row[0] for row in rows]
@@ -0,0 +1,66 @@
+"""
+Checks that the ONNX backends agree with the PyTorch labels and compares throughput.
+
+Run from the backend directory:
+    python -m common.compare_backends --csv newyorktimes/test.csv
+"""
+import argparse
+import time
+from collections import Counter
+import pandas as pd
+from common.models import DEFAULT_CHECKPOINT, create_classifier
+
+TEXT_COLUMNS = ("content", "text", "comment_text", "extracted_text")
+
+
+def load_texts(csv_path, column=None, limit=None):
+    """Reads the texts to label from `csv_path`, guessing the text column if not given."""
+    df = pd.read_csv(csv_path, quotechar='"')
+    if column is None:
+        column = next((c for c in TEXT_COLUMNS if c in df.columns), None)
+        if column is None:
+            raise KeyError(f"No text column found in {csv_path}; pass --column (columns: {list(df.columns)})")
+    texts = df[column].fillna("").astype(str).str.strip()
+    texts = texts[texts != ""].tolist()
+    return texts[:limit] if limit else texts
+
+
+def timed_labels(classifier, texts, batch_size):
+    """Labels `texts` and returns (labels, texts per second)."""
+    # The prediction cache is bypassed so every run measures the model itself
+    classifier.predict(texts[:batch_size], batch_size=batch_size, use_cache=False)  # Warm-up pass
+    started_at = time.perf_counter()
+    labels = [res["label"] for res in classifier.predict(texts, batch_size=batch_size, use_cache=False)]
+    elapsed = time.perf_counter() - started_at
+    return labels, len(texts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="newyorktimes/test.csv")
+    parser.add_argument("--column", default=None, help="Text column (guessed if omitted)")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N texts")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    args = parser.parse_args()
+
+    texts = load_texts(args.csv, args.column, args.limit)
+    print(f"Loaded {len(texts)} texts from {args.csv}")
+
+    reference, reference_rate = timed_labels(create_classifier(args.checkpoint, backend="torch"), texts, args.batch_size)
+    print(f"{'backend':<12} {'texts/s':>10} {'speedup':>8} {'agreement':>10}")
+    print(f"{'torch':<12} {reference_rate:>10.1f} {1.0:>7.2f}x {100.0:>9.2f}%")
+
+    for name, quantize in (("onnx", False), ("onnx-int8", True)):
+        classifier = create_classifier(args.checkpoint, backend="onnx", quantize=quantize)
+        labels, rate = timed_labels(classifier, texts, args.batch_size)
+        agreement = sum(a == b for a, b in zip(reference, labels)) / len(texts) * 100
+        print(f"{name:<12} {rate:>10.1f} {rate / reference_rate:>7.2f}x {agreement:>9.2f}%")
+
+        disagreements = Counter((a, b) for a, b in zip(reference, labels) if a != b)
+        for (torch_label, onnx_label), count in disagreements.most_common():
+            print(f"    torch={torch_label:<8} {name}={onnx_label:<8} x{count}")
+
+
+if __name__ == "__main__":
+    main()
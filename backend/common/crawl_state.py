@@ -0,0 +1,91 @@
+"""
+Persistent crawl watermarks for incremental ingestion.
+
+Each (source, query) pair has a row in the `crawl_state` table of the database the crawler
+writes to:
+
+- watermark: end of the last window that was crawled completely; the next window starts here.
+- window_start / window_end: the window currently being crawled, or NULL between runs.
+- next_page / pages: the first page of that window not yet stored, and its total page count.
+
+The helpers never commit. Call them inside the same transaction as the rows they account
+for, so a crash leaves the cursor pointing at the first page that was not written.
+"""
+from datetime import datetime, timezone
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS crawl_state (
+        source TEXT NOT NULL,
+        query TEXT NOT NULL,
+        watermark TEXT,
+        window_start TEXT,
+        window_end TEXT,
+        next_page INTEGER,
+        pages INTEGER,
+        updated_at TEXT,
+        PRIMARY KEY (source, query)
+    )
+"""
+
+
+def init_crawl_state(conn):
+    """Creates the crawl_state table if it does not exist."""
+    conn.execute(SCHEMA)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_state(conn, source, query):
+    """Returns the crawl state of (source, query) as a dict, or None if it was never crawled."""
+    row = conn.execute("""
+        SELECT watermark, window_start, window_end, next_page, pages
+        FROM crawl_state WHERE source = ? AND query = ?
+    """, (source, query)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("watermark", "window_start", "window_end", "next_page", "pages"), row))
+
+
+def open_window(conn, source, query, default_start, window_end):
+    """
+    Returns the window to crawl for (source, query) as (window_start, window_end, next_page, pages),
+    or None if the watermark has already reached `window_end`.
+
+    An unfinished window from an interrupted run is resumed as-is. Otherwise a new window
+    runs from the stored watermark (or `default_start` the first time) to `window_end`.
+    """
+    state = get_state(conn, source, query)
+    if state and state["window_end"]:
+        return state["window_start"], state["window_end"], state["next_page"] or 1, state["pages"]
+
+    window_start = (state and state["watermark"]) or default_start
+    if window_start >= window_end:
+        return None
+    conn.execute("""
+        INSERT INTO crawl_state (source, query, window_start, window_end, next_page, pages, updated_at)
+        VALUES (?, ?, ?, ?, 1, NULL, ?)
+        ON CONFLICT (source, query) DO UPDATE SET
+            window_start = excluded.window_start, window_end = excluded.window_end,
+            next_page = 1, pages = NULL, updated_at = excluded.updated_at
+    """, (source, query, window_start, window_end, _now()))
+    return window_start, window_end, 1, None
+
+
+def advance_page(conn, source, query, next_page, pages=None):
+    """Moves the page cursor of the open window; `pages` records the total once it is known."""
+    conn.execute("""
+        UPDATE crawl_state SET next_page = ?, pages = COALESCE(?, pages), updated_at = ?
+        WHERE source = ? AND query = ?
+    """, (next_page, pages, _now(), source, query))
+
+
+def close_window(conn, source, query):
+    """Marks the open window as fully crawled: its end becomes the new watermark."""
+    conn.execute("""
+        UPDATE crawl_state
+        SET watermark = window_end, window_start = NULL, window_end = NULL,
+            next_page = NULL, pages = NULL, updated_at = ?
+        WHERE source = ? AND query = ? AND window_end IS NOT NULL
+    """, (_now(), source, query))
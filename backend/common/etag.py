@@ -0,0 +1,69 @@
+"""
+Conditional GET support for the polled dashboard endpoints.
+
+Each endpoint derives a version token from something cheap to read (the database files'
+last-write stamp, or a snapshot hash) before building its payload. The token is sent as the
+ETag, and a request whose If-None-Match already carries it gets an empty 304 instead of the payload.
+Responses carry Cache-Control: no-cache, so browsers revalidate on every poll and reuse the cached
+body on a 304 without any frontend changes.
+"""
+import hashlib
+import os
+from fastapi.responses import Response
+
+
+def db_version(db_path):
+    """
+    Last-write stamp of a SQLite database: modification time and size of the database file
+    and of its WAL file. Any committed write changes it; reads never do.
+    """
+    stamp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append(f"{st.st_mtime_ns}:{st.st_size}")
+    return "/".join(stamp)
+
+
+def make_etag(*parts):
+    """Strong ETag for the given version parts."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def etag_headers(etag):
+    """Headers sent with every tagged response, 200 or 304."""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def not_modified(request, etag):
+    """Returns an empty 304 if the request's If-None-Match already carries `etag`, else None."""
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    return None
+
+
+def conditional(request, response, *parts):
+    """
+    Tags `response` with the ETag of `parts`.
+
+    Returns:
+    - Response: An empty 304 if the client already holds this version; None if the payload must be built.
+    """
+    etag = make_etag(*parts)
+    unchanged = not_modified(request, etag)
+    if unchanged is None:
+        response.headers.update(etag_headers(etag))
+    return unchanged
@@ -0,0 +1,123 @@
+"""
+Server-sent "data changed" events for the dashboards.
+
+One watcher task checks each source's database last-write stamp (a couple of stat calls)
+every EVENTS_POLL_SECONDS. When a commit moves the source's change cursor (an ingest, a
+labeling run, a Guardian refresh, or a NYT collection run in its own process), a "changed"
+event with the new cursor is published. Clients then refetch with ?since=.
+
+Connections have no queue of their own: they all wait on one shared asyncio.Event, swapped
+on every publish, and then send whatever is newer than what they last sent. An idle
+connection costs one suspended generator.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import anyio.to_thread
+from common.change_seq import current_cursor
+from common.etag import db_version
+
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "2"))
+# Comment lines keep idle connections from being closed by proxies
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "25"))
+
+
+def read_cursor(db_path):
+    """Change cursor of a database, or None if it doesn't exist or isn't tracked yet."""
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            return current_cursor(conn)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Broadcaster:
+    """
+    Publishes cursor changes of a set of databases to any number of event streams.
+
+    Attributes:
+    - sources (dict): Source name -> database path.
+    - cursors (dict): Source name -> latest change cursor.
+    """
+    def __init__(self, sources, poll_interval=EVENTS_POLL_SECONDS):
+        self.sources = sources
+        self.poll_interval = poll_interval
+        self.cursors = {}
+        self._versions = {}
+        # Source name -> sequence number of its last publish
+        self._published = {}
+        self._seq = 0
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def publish(self, source, cursor):
+        self.cursors[source] = cursor
+        self._seq += 1
+        self._published[source] = self._seq
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def poll(self):
+        for name, path in self.sources.items():
+            version = db_version(path)
+            if not version or version == self._versions.get(name):
+                continue
+            self._versions[name] = version
+            cursor = await anyio.to_thread.run_sync(read_cursor, path)
+            if cursor is None or cursor == self.cursors.get(name):
+                continue
+            if name not in self.cursors:
+                # First reading is the baseline, not a change
+                self.cursors[name] = cursor
+            else:
+                self.publish(name, cursor)
+
+    async def run(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                print(f"Event watcher poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        """Starts the watcher task; call from an async startup handler."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def stream(self, sources=None):
+        """
+        Yields SSE messages for `sources` (default: all) until the client goes away.
+        The first message ("hello") carries the current cursors, so a reconnecting client can
+        tell whether it missed a change; after that, one "changed" message per cursor move.
+        """
+        wanted = set(sources or self.sources)
+        yield f"retry: {int(self.poll_interval * 1000) + 3000}\n\n"
+        yield format_event("hello", {"cursors": {name: self.cursors.get(name) for name in sorted(wanted)}})
+        last_seen = self._seq
+        while True:
+            if self._seq == last_seen:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+            # Collected before yielding, so nothing published meanwhile is skipped
+            pending = [name for name, seq in self._published.items() if seq > last_seen and name in wanted]
+            messages = [format_event("changed", {"source": name, "cursor": self.cursors[name]}) for name in pending]
+            last_seen = self._seq
+            for message in messages:
+                yield message
@@ -0,0 +1,247 @@
+import os
+import threading
+import torch
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from common.prediction_cache import get_prediction_cache, text_hash
+
+# Default checkpoint shared by every sub-app
+DEFAULT_CHECKPOINT = "kumo24/bert-sentiment-nuclear"
+
+# Define label mappings
+id2label = {0: "negative", 1: "neutral", 2: "positive"}
+label2id = {"negative": 0, "neutral": 1, "positive": 2}
+
+
+# Inference backend: "torch" (eager PyTorch) or "onnx" (ONNX Runtime, see common/onnx_backend.py)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")
+# Apply int8 dynamic quantization when the ONNX backend exports the model
+SENTIMENT_QUANTIZE = os.getenv("SENTIMENT_QUANTIZE", "1") == "1"
+# Sort texts by token length before batching so each batch is padded only to its own longest text
+SENTIMENT_LENGTH_BUCKETING = os.getenv("SENTIMENT_LENGTH_BUCKETING", "1") == "1"
+
+
+def load_tokenizer(checkpoint):
+    """Loads the checkpoint's tokenizer, making sure it has a padding token."""
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint)
+    if tokenizer.pad_token is None:
+        tokenizer.add_special_tokens({'pad_token': '[PAD]'})
+    return tokenizer
+
+
+def load_model(checkpoint):
+    """Loads the checkpoint as a 3-class sequence classification model."""
+    return AutoModelForSequenceClassification.from_pretrained(
+        checkpoint,
+        num_labels=3,
+        id2label=id2label,
+        label2id=label2id
+    )
+
+
+class BaseClassifier:
+    """
+    Tokenization, batching and label helpers shared by every backend. Subclasses set
+    `tokenizer`, `max_length` and `tensor_type` and implement `_forward(batch)`, which
+    takes a padded tokenizer batch and returns one probability list per row, plus
+    `memory_bytes()`.
+    """
+
+    def predict_proba(self, texts):
+        """Returns class probabilities (one [negative, neutral, positive] list per text)."""
+        batch = self.tokenizer(texts, return_tensors=self.tensor_type, padding=True,
+                               truncation=True, max_length=self.max_length)
+        return self._forward(batch)
+
+    @property
+    def model_id(self):
+        """Identifies the weights producing the predictions (used as a cache key)."""
+        return f"{self.checkpoint}@{self.backend}"
+
+    @property
+    def tokenizer_settings(self):
+        """Tokenizer options that affect predictions (used as a cache key)."""
+        return f"max_length={self.max_length};truncation=true"
+
+    def predict(self, texts, batch_size=32, bucket=None, use_cache=True):
+        """
+        Returns a {"label", "score"} dict per text, matching the transformers pipeline output.
+
+        Texts already in the prediction cache (see common/prediction_cache.py) are not run
+        through the model again; duplicates within `texts` are only run once.
+        """
+        texts = list(texts)
+        cache = get_prediction_cache() if use_cache else None
+        if cache is None or not texts:
+            return self._predict_uncached(texts, batch_size, bucket)
+
+        hashes = [text_hash(text) for text in texts]
+        cached = cache.get_many(hashes, self.model_id, self.tokenizer_settings)
+
+        # Run the model once per distinct uncached text
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+        if missing:
+            computed = self._predict_uncached(list(missing.values()), batch_size, bucket, with_probs=True)
+            new_entries = {h: (res["label"], res["probs"]) for h, res in zip(missing, computed)}
+            cache.put_many(new_entries, self.model_id, self.tokenizer_settings)
+            cached.update((h, probs) for h, (_, probs) in new_entries.items())
+
+        return [self._to_result(cached[h]) for h in hashes]
+
+    def _predict_uncached(self, texts, batch_size=32, bucket=None, with_probs=False):
+        """
+        Runs the model over `texts`.
+
+        With length bucketing (the default, see SENTIMENT_LENGTH_BUCKETING) texts are tokenized
+        once, sorted by token count and batched in that order, so every batch is padded only to
+        the length of its own longest text; results come back in the original order.
+        """
+        if not texts:
+            return []
+        if bucket is None:
+            bucket = SENTIMENT_LENGTH_BUCKETING
+
+        if not bucket:
+            results = []
+            for i in range(0, len(texts), batch_size):
+                results.extend(self._to_result(probs, with_probs) for probs in self.predict_proba(texts[i:i + batch_size]))
+            return results
+
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        features = [{key: encoded[key][i] for key in encoded.keys()} for i in range(len(texts))]
+        order = sorted(range(len(texts)), key=lambda i: len(features[i]["input_ids"]))
+
+        results = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            batch = self.tokenizer.pad([features[i] for i in indices], return_tensors=self.tensor_type)
+            for i, probs in zip(indices, self._forward(batch)):
+                results[i] = self._to_result(probs, with_probs)
+        return results
+
+    def classify_batch(self, texts, batch_size=32):
+        """Returns 'negative' / 'neutral' / 'positive' for each text."""
+        return [res["label"] for res in self.predict(texts, batch_size=batch_size)]
+
+    def classify(self, text):
+        """Returns 'negative' / 'neutral' / 'positive' for a single text."""
+        return self.classify_batch([text])[0]
+
+    @staticmethod
+    def _to_result(probs, with_probs=False):
+        best = max(range(len(probs)), key=probs.__getitem__)
+        result = {"label": id2label[best], "score": probs[best]}
+        if with_probs:
+            result["probs"] = probs
+        return result
+
+
+class SentimentClassifier(BaseClassifier):
+    """
+    Wraps a tokenizer/model pair for a sentiment checkpoint and serializes inference.
+
+    Attributes:
+    - checkpoint (str): Hugging Face checkpoint the weights were loaded from.
+    - tokenizer: Tokenizer loaded from the checkpoint (with a pad token guaranteed).
+    - model: Sequence classification model in eval mode.
+    - device (torch.device): Device the model lives on.
+    - max_length (int): Maximum number of tokens per text; longer texts are truncated.
+    """
+
+    backend = "torch"
+    tensor_type = "pt"
+
+    def __init__(self, checkpoint=DEFAULT_CHECKPOINT, max_length=512):
+        self.checkpoint = checkpoint
+        self.max_length = max_length
+
+        self.tokenizer = load_tokenizer(checkpoint)
+        self.model = load_model(checkpoint)
+
+        # Move model to GPU if available
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model.to(self.device)
+        self.model.eval()
+
+        # torch modules are not safe to call from several threads at once
+        self._lock = threading.Lock()
+
+    def _forward(self, batch):
+        inputs = {k: v.to(self.device) for k, v in batch.items()}
+        with self._lock, torch.no_grad():
+            outputs = self.model(**inputs)
+            probs = torch.softmax(outputs.logits, dim=1).cpu().tolist()
+        return probs
+
+    def memory_bytes(self):
+        """Returns the number of bytes held by the model's parameters and buffers."""
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def create_classifier(checkpoint=DEFAULT_CHECKPOINT, backend=None, quantize=None):
+    """Builds a new classifier for the given backend, bypassing the registry."""
+    backend = backend or SENTIMENT_BACKEND
+    if backend == "torch":
+        return SentimentClassifier(checkpoint)
+    if backend == "onnx":
+        from common.onnx_backend import OnnxSentimentClassifier
+        return OnnxSentimentClassifier(checkpoint, quantize=SENTIMENT_QUANTIZE if quantize is None else quantize)
+    raise ValueError(f"Unknown sentiment backend '{backend}' (expected 'torch' or 'onnx')")
+
+
+# Process-wide registry: checkpoint -> classifier for the configured backend
+_classifiers = {}
+_registry_lock = threading.Lock()
+
+
+def get_classifier(checkpoint=DEFAULT_CHECKPOINT):
+    """Returns the shared classifier for `checkpoint`, loading it on first use."""
+    classifier = _classifiers.get(checkpoint)
+    if classifier is not None:
+        return classifier
+
+    with _registry_lock:
+        # Another thread may have finished loading while we waited for the lock
+        if checkpoint not in _classifiers:
+            print(f"Loading sentiment model {checkpoint} ({SENTIMENT_BACKEND} backend)...")
+            _classifiers[checkpoint] = create_classifier(checkpoint)
+            print(f"Loaded {checkpoint} ({_classifiers[checkpoint].memory_bytes() / 2**20:.1f} MiB).")
+        return _classifiers[checkpoint]
+
+
+def process_rss_bytes():
+    """Returns the resident set size of the current process, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak RSS: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def memory_report():
+    """Reports the loaded checkpoints, their weight sizes and the process RSS."""
+    with _registry_lock:
+        loaded = dict(_classifiers)
+    return {
+        "models": {
+            checkpoint: {
+                "backend": classifier.backend,
+                "device": str(classifier.device),
+                "weights_bytes": classifier.memory_bytes(),
+            }
+            for checkpoint, classifier in loaded.items()
+        },
+        "process_rss_bytes": process_rss_bytes(),
+    }
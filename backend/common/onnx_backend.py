@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import torch
+from common.models import BaseClassifier, DEFAULT_CHECKPOINT, load_model, load_tokenizer
+
+# Exported models are cached here, one directory per checkpoint
+ONNX_CACHE_DIR = os.getenv(
+    "SENTIMENT_ONNX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "aims-dashboard", "onnx")
+)
+
+
+def export_onnx(checkpoint=DEFAULT_CHECKPOINT, quantize=True, cache_dir=ONNX_CACHE_DIR):
+    """
+    Exports `checkpoint` to ONNX (and optionally int8 dynamic quantization) unless a cached
+    export already exists.
+
+    Returns:
+    - str: Path to the .onnx file to load.
+    """
+    model_dir = os.path.join(cache_dir, checkpoint.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+    os.makedirs(model_dir, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        print(f"Exporting {checkpoint} to ONNX...")
+        tokenizer = load_tokenizer(checkpoint)
+        model = load_model(checkpoint)
+        model.eval()
+
+        sample = tokenizer(["nuclear power"], return_tensors="pt")
+        input_names = list(sample.keys())
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["logits"] = {0: "batch"}
+
+        # Write to a temporary name so an interrupted export is never picked up
+        tmp_path = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        os.replace(tmp_path, fp32_path)
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"Quantizing {checkpoint} to int8...")
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+class OnnxSentimentClassifier(BaseClassifier):
+    """
+    Serves the sentiment checkpoint through ONNX Runtime on CPU.
+
+    Attributes:
+    - checkpoint (str): Hugging Face checkpoint the model was exported from.
+    - quantize (bool): Whether the int8 dynamically quantized export is used.
+    - model_path (str): Path of the .onnx file loaded into the session.
+    - max_length (int): Maximum number of tokens per text; longer texts are truncated.
+    """
+
+    backend = "onnx"
+    device = "cpu"
+    tensor_type = "np"
+
+    def __init__(self, checkpoint=DEFAULT_CHECKPOINT, quantize=True, max_length=512):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("SENTIMENT_BACKEND=onnx requires the 'onnxruntime' package (pip install onnxruntime onnx)")
+
+        self.checkpoint = checkpoint
+        self.quantize = quantize
+        self.max_length = max_length
+        self.backend = "onnx-int8" if quantize else "onnx"
+
+        self.tokenizer = load_tokenizer(checkpoint)
+        self.model_path = export_onnx(checkpoint, quantize=quantize)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # ONNX Runtime sessions are safe to run from several threads at once
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _forward(self, batch):
+        feed = {k: v.astype(np.int64) for k, v in batch.items() if k in self._input_names}
+        logits = self.session.run(["logits"], feed)[0]
+
+        # Softmax with the usual max-subtraction for numerical stability
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return (exp / exp.sum(axis=1, keepdims=True)).tolist()
+
+    def memory_bytes(self):
+        """Returns the size of the loaded ONNX weights file."""
+        return os.path.getsize(self.model_path)
@@ -0,0 +1,115 @@
+"""
+Keyset pagination with field projection for the social sub-apps' row endpoints.
+
+Pages are read in (sort column, key) order straight off an index on those columns: the
+cursor holds the last row's sort value and key, so a page costs the same at any depth and
+rows inserted meanwhile never shift later pages. Only the requested columns are read.
+
+Rows whose sort value is NULL are paged too. SQLite sorts NULLs first, so they come before
+the other rows ascending and after them descending. They are read as a segment of their
+own (sort IS NULL, ordered by key), because a row-value comparison against NULL matches
+nothing.
+"""
+import base64
+import json
+import os
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+
+def encode_cursor(sort_value, key):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, key]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns the (sort value, key) pair of a cursor, or raises a 400 if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, key
+
+
+def parse_fields(fields, allowed, default=None):
+    """Validates a comma-separated `fields` parameter; returns the columns in request order."""
+    if not fields:
+        return list(default or allowed)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return requested
+
+
+def fetch_page(conn, table, allowed_fields, allowed_orders, fields=None, order=None, limit=None, cursor=None,
+               key="id", default_fields=None):
+    """
+    Reads one page of `table`.
+
+    Parameters:
+    - allowed_fields (list): Columns clients may request.
+    - allowed_orders (list): Columns clients may sort by; each needs an index on (column, key).
+    - fields (str): Comma-separated columns to return (default: `default_fields`, else all allowed).
+    - order (str): Sort column, prefixed with "-" for descending (default: first allowed, ascending).
+    - limit (int): Rows per page, capped at MAX_PAGE_SIZE.
+    - cursor (str): `next_cursor` of the previous page.
+    - key (str): Unique column that breaks ties; always returned.
+
+    Returns:
+    - dict: results (list of row dicts) and next_cursor (None on the last page).
+    """
+    columns = parse_fields(fields, allowed_fields, default_fields)
+    if key not in columns:
+        columns.insert(0, key)
+
+    order = order or allowed_orders[0]
+    descending = order.startswith("-")
+    sort_column = order.lstrip("-")
+    if sort_column not in allowed_orders:
+        raise HTTPException(status_code=400, detail=f"Cannot order by {sort_column}. Allowed: {', '.join(allowed_orders)}")
+
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+    # Segments of the sort order, True for the NULL one; a page may span both
+    segments = [False, True] if descending else [True, False]
+    sort_value = key_value = None
+    if cursor:
+        sort_value, key_value = decode_cursor(cursor)
+        segments = segments[segments.index(sort_value is None):]
+
+    # One extra row tells whether another page follows
+    rows = []
+    for i, nulls in enumerate(segments):
+        # Only the segment the cursor points into starts after it
+        after_cursor = cursor and i == 0
+        if nulls:
+            where = f"{sort_column} IS NULL" + (f" AND {key} {comparison} ?" if after_cursor else "")
+            params = [key_value] if after_cursor else []
+        elif after_cursor:
+            where, params = f"({sort_column}, {key}) {comparison} (?, ?)", [sort_value, key_value]
+        else:
+            where, params = f"{sort_column} IS NOT NULL", []
+        rows += conn.execute(f"""
+            SELECT {", ".join(columns)}, {sort_column}, {key}
+            FROM {table} WHERE {where}
+            ORDER BY {sort_column} {direction}, {key} {direction}
+            LIMIT ?
+        """, params + [limit + 1 - len(rows)]).fetchall()
+        if len(rows) > limit:
+            break
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return {
+        "results": [dict(zip(columns, row[:len(columns)])) for row in rows],
+        "next_cursor": next_cursor,
+    }
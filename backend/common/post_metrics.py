@@ -0,0 +1,64 @@
+"""
+Dashboard metrics for the Threads, YouTube and Mastodon apps, computed in SQLite from the rows stored
+at ingest. Requests never re-read the source CSVs.
+"""
+import datetime
+from dateutil.relativedelta import relativedelta
+
+
+def period_boundaries(start, end, months=2):
+    """
+    Month-end dates every `months` months, starting with the first month end on or after
+    `start` and not going past `end` (what pandas' date_range(freq="2ME") produces).
+    """
+    boundaries = []
+    month = start.replace(day=1)
+    while True:
+        month_end = month + relativedelta(months=1) - datetime.timedelta(days=1)
+        if month_end > end:
+            return boundaries
+        if month_end >= start:
+            boundaries.append(month_end)
+        month += relativedelta(months=months)
+
+
+def averages(conn, table, columns):
+    """
+    Rounded column means over `table`.
+
+    Parameters:
+    - columns (dict): Output key -> column name, e.g. {"avg_likes": "like_count"}.
+    """
+    selects = ", ".join(f"ROUND(AVG({column}), 2)" for column in columns.values())
+    row = conn.execute(f"SELECT {selects} FROM {table}").fetchone()
+    return dict(zip(columns, row))
+
+
+def sentiment_trends(conn, table, boundaries, date_column="published_on", label_column="true_label"):
+    """
+    Counts rows per label in each period between consecutive `boundaries`
+    (start inclusive, end exclusive), in one query.
+
+    Returns:
+    - dict: time_periods ("YYYY-MM-YYYY-MM") plus positive, negative and neutral counts per period.
+    """
+    periods = list(zip(boundaries, boundaries[1:]))
+    trends = {"time_periods": [], "positive": [], "negative": [], "neutral": []}
+    if not periods:
+        return trends
+
+    values = ", ".join("(?, ?)" for _ in periods)
+    params = [day.isoformat() for period in periods for day in period]
+    counts = {
+        (start, label): count for start, label, count in conn.execute(f"""
+            WITH periods (start, stop) AS (VALUES {values})
+            SELECT p.start, t.{label_column}, COUNT(*)
+            FROM periods p JOIN {table} t ON t.{date_column} >= p.start AND t.{date_column} < p.stop
+            GROUP BY p.start, t.{label_column}
+        """, params)
+    }
+    for start, stop in periods:
+        trends["time_periods"].append(f"{start.strftime('%Y-%m')}-{stop.strftime('%Y-%m')}")
+        for label in ("positive", "negative", "neutral"):
+            trends[label].append(counts.get((start.isoformat(), label), 0))
+    return trends
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Shared by every sub-app (and the NYT collector process)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICTION_CACHE_PATH = os.getenv("PREDICTION_CACHE_PATH", os.path.join(BACKEND_DIR, "cache", "predictions.db"))
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE", "1") == "1"
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "500000"))
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 500
+
+# Pending last_used touches are written out once this many pile up between puts
+_MAX_PENDING_TOUCHES = 10000
+
+
+def normalize_text(text):
+    """Normalizes text so trivially different copies of a sentence share a cache entry."""
+    text = unicodedata.normalize("NFC", str(text))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text):
+    """sha256 of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Persistent, content-addressed cache of classifier outputs.
+
+    Entries are keyed by (sha256 of normalized text, model id, tokenizer settings) and hold
+    the predicted label and class probabilities. Least recently used entries are evicted
+    once the cache grows past `max_entries`.
+
+    Attributes:
+    - db_path (str): Path to the SQLite file backing the cache.
+    - max_entries (int): Entry count above which LRU eviction kicks in.
+    """
+
+    def __init__(self, db_path=PREDICTION_CACHE_PATH, max_entries=PREDICTION_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (text_hash, model_id, tokenizer_settings) -> last hit time, not yet written
+        self._touched = {}
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                text_hash TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                tokenizer_settings TEXT NOT NULL,
+                label TEXT NOT NULL,
+                probs TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text_hash, model_id, tokenizer_settings)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_last_used ON predictions (last_used);")
+        self._conn.commit()
+
+    def get_many(self, hashes, model_id, tokenizer_settings):
+        """
+        Returns {text_hash: probs} for the hashes that are cached, and marks them as used.
+        Lookups only read: the last_used touches are kept in memory and written with the next
+        put (or once _MAX_PENDING_TOUCHES pile up).
+        """
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), _CHUNK):
+                chunk = unique[i:i + _CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"""
+                    SELECT text_hash, probs FROM predictions
+                    WHERE model_id = ? AND tokenizer_settings = ? AND text_hash IN ({placeholders})
+                """, (model_id, tokenizer_settings, *chunk)).fetchall()
+                found.update((h, json.loads(probs)) for h, probs in rows)
+
+            if found:
+                now = time.time()
+                self._touched.update(((h, model_id, tokenizer_settings), now) for h in found)
+                if len(self._touched) >= _MAX_PENDING_TOUCHES:
+                    self._flush_touches()
+                    self._conn.commit()
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, entries, model_id, tokenizer_settings):
+        """Stores {text_hash: (label, probs)} and evicts old entries if the cache is full."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO predictions (text_hash, model_id, tokenizer_settings, label, probs, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (h, model_id, tokenizer_settings, label, json.dumps(probs), now)
+                for h, (label, probs) in entries.items()
+            ])
+            self._conn.commit()
+            self._evict()
+
+    def _flush_touches(self):
+        """Writes the pending last_used touches; the caller commits."""
+        if not self._touched:
+            return
+        self._conn.executemany("""
+            UPDATE predictions SET last_used = ?
+            WHERE text_hash = ? AND model_id = ? AND tokenizer_settings = ?
+        """, [(used, *key) for key, used in self._touched.items()])
+        self._touched = {}
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Trim to 90% so eviction doesn't run again on the very next insert
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute("""
+            DELETE FROM predictions WHERE rowid IN (
+                SELECT rowid FROM predictions ORDER BY last_used ASC LIMIT ?
+            )
+        """, (excess,))
+        self._conn.commit()
+        self.evictions += excess
+
+    def stats(self):
+        """Returns hit/miss counters, entry count and file size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.db_path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "size_bytes": os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Returns the process-wide prediction cache, or None when PREDICTION_CACHE=0."""
+    global _cache
+    if not PREDICTION_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
@@ -0,0 +1,81 @@
+import asyncio
+import random
+import time
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket: holds up to `capacity` tokens and refills at `rate` tokens per second.
+
+    Attributes:
+    - capacity (float): Largest burst the bucket allows.
+    - rate (float): Tokens added per second.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def per_minute(cls, amount):
+        """Bucket allowing `amount` tokens per minute, with a burst of one minute's worth."""
+        return cls(capacity=amount, rate=amount / 60)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, amount=1):
+        """Waits until `amount` tokens are available and takes them."""
+        # A request larger than the bucket could never be served; let it through once full
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Combines a requests-per-minute and an optional tokens-per-minute bucket, matching how
+    the OpenAI and news APIs meter usage.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests = TokenBucket.per_minute(requests_per_minute)
+        self.tokens = TokenBucket.per_minute(tokens_per_minute) if tokens_per_minute else None
+
+    async def acquire(self, tokens=0):
+        """Waits for one request slot (and `tokens` tokens, if metered)."""
+        await self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire(tokens)
+
+
+async def retry_with_backoff(fn, is_retryable, retries=5, base_delay=1.0, max_delay=60.0, retry_after=None):
+    """
+    Awaits `fn()` and retries it with exponential backoff and jitter while `is_retryable(error)`.
+
+    Parameters:
+    - fn (callable): Coroutine function to call.
+    - is_retryable (callable): Returns True for errors worth retrying (429, 5xx, timeouts).
+    - retries (int): Retries after the first attempt.
+    - retry_after (callable): Optional; returns the server-requested delay in seconds for an error, or None.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = retry_after(e) if retry_after else None
+            if delay is None:
+                delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(delay)
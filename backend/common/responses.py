@@ -0,0 +1,44 @@
+"""
+Fast JSON responses for the dashboard apps.
+
+orjson serializes payloads straight to bytes and handles numpy scalars and arrays, dates and
+datetimes natively; pandas Timestamps go through `_default`. Every app uses
+FastJSONResponse as its default response class. Endpoints with large payloads return
+`json_response(...)` instead of a dict, which also skips the jsonable_encoder pass FastAPI
+runs over returned dicts.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    # pandas Timestamp / NaT (NaT is the only value not equal to itself here)
+    if hasattr(value, "isoformat"):
+        return None if value != value else value.isoformat()
+    # numpy scalars orjson doesn't cover (e.g. float16)
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content):
+    """Serializes `content` to JSON bytes. NaN and infinity become null."""
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content, response=None):
+    """
+    Serializes `content` into a FastJSONResponse the endpoint can return directly.
+    Headers already set on the endpoint's injected `response` (ETag, Cache-Control) are kept.
+    """
+    fast = FastJSONResponse(content)
+    if response is not None:
+        fast.raw_headers.extend(response.headers.raw)
+    return fast
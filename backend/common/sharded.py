@@ -0,0 +1,145 @@
+"""
+Multi-process labeling for large backfills.
+
+Rows are split into shards that a pool of worker processes labels in parallel; each worker
+loads its own copy of the model with a pinned number of intra-op threads so the workers
+don't oversubscribe the CPU. Results stream back as shards finish.
+
+Benchmark the speedup on this machine (from the backend directory):
+    python -m common.sharded --csv newyorktimes/test.csv
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Worker processes used by the labelers; 1 keeps labeling in-process
+LABEL_WORKERS = int(os.getenv("LABEL_WORKERS", "1"))
+SHARD_SIZE = int(os.getenv("LABEL_SHARD_SIZE", "256"))
+
+# Set in each worker process by _init_worker
+_worker_classifier = None
+_worker_use_cache = True
+
+
+def _init_worker(threads, checkpoint, use_cache):
+    global _worker_classifier, _worker_use_cache
+    # Thread pools are sized when torch loads, so pin them before importing it
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+
+    from common.models import get_classifier
+    _worker_classifier = get_classifier(checkpoint)
+    _worker_use_cache = use_cache
+
+
+def _label_shard(shard):
+    row_ids, texts = shard
+    results = _worker_classifier.predict(texts, use_cache=_worker_use_cache)
+    return [(row_id, res["label"], res["score"]) for row_id, res in zip(row_ids, results)]
+
+
+def _warm_up():
+    # Keeps a worker busy briefly so each warm-up task lands on a different process
+    time.sleep(0.5)
+
+
+def make_pool(workers, threads_per_worker=None, checkpoint=None, use_cache=True):
+    """Starts a pool of labeling processes, each with `threads_per_worker` torch threads."""
+    from common.models import DEFAULT_CHECKPOINT
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    # spawn gives every worker a fresh interpreter, so torch isn't inherited mid-initialization
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                               initargs=(threads_per_worker, checkpoint or DEFAULT_CHECKPOINT, use_cache))
+
+
+def iter_labeled_rows(rows, workers=None, threads_per_worker=None, shard_size=SHARD_SIZE,
+                      checkpoint=None, use_cache=True, pool=None):
+    """
+    Labels (row_id, text) pairs across worker processes.
+
+    Parameters:
+    - rows (list): (row_id, text) pairs to label.
+    - workers (int): Number of worker processes (defaults to LABEL_WORKERS).
+    - threads_per_worker (int): torch threads per worker (defaults to cores / workers).
+    - shard_size (int): Rows handed to a worker at a time.
+    - pool (ProcessPoolExecutor): Reuse a pool from make_pool() instead of starting one.
+
+    Yields:
+    - list: (row_id, label, score) tuples for one finished shard, in completion order.
+    """
+    workers = workers or LABEL_WORKERS
+    rows = list(rows)
+    shards = [rows[i:i + shard_size] for i in range(0, len(rows), shard_size)]
+    shards = [([row_id for row_id, _ in shard], [text for _, text in shard]) for shard in shards]
+
+    if pool is None and workers <= 1:
+        from common.models import DEFAULT_CHECKPOINT, get_classifier
+        classifier = get_classifier(checkpoint or DEFAULT_CHECKPOINT)
+        for row_ids, texts in shards:
+            results = classifier.predict(texts, use_cache=use_cache)
+            yield [(row_id, res["label"], res["score"]) for row_id, res in zip(row_ids, results)]
+        return
+
+    owns_pool = pool is None
+    if owns_pool:
+        pool = make_pool(workers, threads_per_worker, checkpoint, use_cache)
+    try:
+        futures = [pool.submit(_label_shard, shard) for shard in shards]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        if owns_pool:
+            pool.shutdown()
+
+
+def label_texts(texts, workers=None, **kwargs):
+    """Labels `texts` across worker processes and returns the labels in input order."""
+    labels = [None] * len(texts)
+    for shard in iter_labeled_rows(list(enumerate(texts)), workers=workers, **kwargs):
+        for i, label, _ in shard:
+            labels[i] = label
+    return labels
+
+
+def main():
+    import argparse
+    from common.compare_backends import load_texts
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="newyorktimes/test.csv")
+    parser.add_argument("--column", default=None, help="Text column (guessed if omitted)")
+    parser.add_argument("--limit", type=int, default=2000, help="Only use the first N texts")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    args = parser.parse_args()
+
+    texts = load_texts(args.csv, args.column, args.limit)
+    rows = list(enumerate(texts))
+    print(f"Labeling {len(texts)} texts on {os.cpu_count()} cores, "
+          f"{args.threads_per_worker} thread(s) per worker (prediction cache bypassed)")
+    print(f"{'workers':>7} {'texts/s':>9} {'speedup':>8}")
+
+    counts = sorted({1, args.max_workers, *(2 ** i for i in range(1, 8) if 2 ** i < args.max_workers)})
+    baseline = None
+    for workers in counts:
+        pool = make_pool(workers, args.threads_per_worker, use_cache=False)
+        # Load the model in every worker before timing
+        for future in [pool.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+
+        started_at = time.perf_counter()
+        for _ in iter_labeled_rows(rows, shard_size=max(8, len(rows) // (workers * 4)), pool=pool):
+            pass
+        rate = len(texts) / (time.perf_counter() - started_at)
+        pool.shutdown()
+
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>9.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
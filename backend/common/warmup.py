@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from fastapi.responses import JSONResponse
+
+# "background" lets the server bind immediately; "blocking" finishes warm-up before serving
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
+
+_tasks = []
+_status = {}
+_lock = threading.Lock()
+_started = False
+
+
+def register(name, fn):
+    """Registers a warm-up task (model loading, first-time population) for a sub-app."""
+    with _lock:
+        if name in _status:
+            return
+        _tasks.append((name, fn))
+        _status[name] = {"state": "pending"}
+
+
+def start():
+    """Runs every registered warm-up task once; returns immediately unless WARMUP_MODE=blocking."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    # One thread per sub-app so a slow first update doesn't hold back the others;
+    # the model registry makes sure the shared checkpoint is only loaded once.
+    threads = [
+        threading.Thread(target=_run, args=(name, fn), name=f"warmup-{name}", daemon=True)
+        for name, fn in list(_tasks)
+    ]
+    for thread in threads:
+        thread.start()
+
+    if WARMUP_MODE == "blocking":
+        for thread in threads:
+            thread.join()
+
+
+def _run(name, fn):
+    _set(name, state="warming")
+    started_at = time.time()
+    try:
+        fn()
+    except Exception as e:
+        print(f"[Warmup] {name} failed: {e}")
+        _set(name, state="failed", error=str(e))
+        return
+    elapsed = round(time.time() - started_at, 2)
+    print(f"[Warmup] {name} ready after {elapsed}s")
+    _set(name, state="ready", seconds=elapsed)
+
+
+def _set(name, **fields):
+    with _lock:
+        _status[name] = fields
+
+
+def is_ready(name):
+    """Returns True once the named sub-app finished warming up."""
+    with _lock:
+        return _status.get(name, {}).get("state") == "ready"
+
+
+def status():
+    """Returns the warm-up state of every registered sub-app."""
+    with _lock:
+        return {name: dict(fields) for name, fields in _status.items()}
+
+
+def warming_response(name):
+    """503 response returned by endpoints that have no data to serve yet."""
+    with _lock:
+        fields = dict(_status.get(name, {"state": "pending"}))
+    return JSONResponse(
+        status_code=503,
+        content={"status": "warming", "component": name, **fields},
+        headers={"Retry-After": "30"},
+    )
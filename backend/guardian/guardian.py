@@ -1,39 +1,56 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import sqlite3
 import sys
-import json
-import pandas as pd
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from guardian.services.scraper import GuardianScraper
 from guardian.services.processor import process_articles
-from guardian.services.labeler import label_extracted_text
+from guardian.services.labeler import ensure_label_triggers, label_extracted_text
+from guardian.services.rollups import read_rollups
+from guardian.services import pipeline
+from common.models import get_classifier
+from common import warmup
+from common.etag import conditional, db_version, etag_headers, make_etag, not_modified
+from common.compression import choose_encoding, compress, weak_etag
+from common.responses import FastJSONResponse, dumps, json_response
+from common.change_seq import current_cursor, deleted_since
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
     allow_credentials=True,
     allow_methods=["GET"],
     allow_headers=["*"],
+    expose_headers=["X-Snapshot-Age"],
 )
 
 # Connect to the SQLite database
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(ROOT_DIR, "database", "guardian.db")
 
-last_checked_time = None 
+# Scrape, extract and label concurrently (GUARDIAN_PIPELINE=0 runs them one after another)
+PIPELINE_MODE = os.getenv("GUARDIAN_PIPELINE", "1") == "1"
+
+# Requests are served from a precomputed snapshot; once it is older than this many seconds,
+# the next request triggers a background update (stale-while-revalidate)
+SNAPSHOT_MAX_AGE = int(os.getenv("GUARDIAN_SNAPSHOT_MAX_AGE", "3600"))
+
+# Serialized dashboard payload, its ETag, when it was built and its compressed copies by encoding
+snapshot = {"body": None, "etag": None, "built_at": None, "encoded": {}}
+_snapshot_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_triggers_ready = False
 
 # Ensure the database is updated
 def ensure_data_is_up_to_date():
     """Check if latest 1-year data is scraped, processed, and labeled. If not, update it."""
-    global last_checked_time
-
     print("Running Guardian data update...")
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
@@ -43,41 +60,36 @@ def ensure_data_is_up_to_date():
     articles_before = cursor.fetchone()[0]
     
     # **Step 2: Decide scraping time range**
+    # Each query resumes from its own watermark in the crawl_state table; `from_date` only
+    # applies to queries that have never been crawled.
     now_utc = datetime.now(timezone.utc)
     to_date = now_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
-    
-    # Initialize `last_checked_time` if it's not already set
-    if last_checked_time is None:
-        cursor.execute("SELECT MAX(publish_date) FROM articles;")
-        latest_date = cursor.fetchone()[0]
-        # If the database has at least one article, use its latest publish_date
-        if latest_date:
-            last_checked_time = datetime.strptime(latest_date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-            print(f"Initialized last_checked_time from the database: {last_checked_time}")
-        else:
-            # Fallback to 1 year ago from today if no data in DB
-            last_checked_time = datetime.now(timezone.utc) - timedelta(days=365)
-            print("No articles in the database. Defaulting to one year ago.")
-    
-    # Use last_checked_time if available; otherwise fallback again to one year ago
-    if last_checked_time:
-        from_date = last_checked_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    cursor.execute("SELECT MAX(publish_date) FROM articles;")
+    latest_date = cursor.fetchone()[0]
+    if latest_date:
+        # Databases scraped before crawl_state existed pick up from their newest article
+        from_date = latest_date
     else:
-        one_year_ago = datetime.today() - timedelta(days=365)
-        from_date = one_year_ago.strftime("%Y-%m-%dT%H:%M:%SZ")
+        # Fallback to 1 year ago from today if no data in DB
+        from_date = (now_utc - timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        print("No articles in the database. Defaulting to one year ago.")
     
-    print(f"Scraping articles from {from_date} to {to_date}...")    
+    if PIPELINE_MODE:
+        print(f"Running the scrape/extract/label pipeline up to {to_date}...")
+        pipeline.run_pipeline(from_date, to_date)
+        conn.close()
+        print("Data is up to date.")
+        return
+
+    print(f"Scraping new articles up to {to_date}...")    
     scraper = GuardianScraper(from_date=from_date, to_date=to_date, db_path=DATABASE_PATH)
     scraper.scrape_articles()
     
-    # Step 3: Update the last checked time
-    last_checked_time = now_utc
-    
-    # **Step 4: Count articles after scraping**
+    # **Step 3: Count articles after scraping**
     cursor.execute("SELECT COUNT(*) FROM articles;")
     articles_after = cursor.fetchone()[0]
     
-    # **Step 5: If new articles were added, process them**
+    # **Step 4: If new articles were added, process them**
     if articles_after > articles_before:
         new_articles = articles_after - articles_before
         print(f"{new_articles} new articles detected! Processing nuclear-related content...")
@@ -85,7 +97,7 @@ def ensure_data_is_up_to_date():
     else:
         print("No new articles found. Skipping processing step.")
    
-    # **Step 6: Check if extracted nuclear content needs labeling**
+    # **Step 5: Check if extracted nuclear content needs labeling**
     cursor.execute("SELECT COUNT(*) FROM extracted_content WHERE label IS NULL;")
     unlabeled_count = cursor.fetchone()[0]
 
@@ -99,85 +111,189 @@ def ensure_data_is_up_to_date():
     # last_updated = now
     print("Data is up to date.")
 
-# Schedule the update
+def prepare_database():
+    """
+    Creates the rollup and change-tracking triggers the dashboard reads rely on, once per
+    process rather than on every read. Needs the extracted_content table (see has_data).
+    """
+    global _triggers_ready
+    if _triggers_ready:
+        return
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        ensure_label_triggers(conn)
+    finally:
+        conn.close()
+    _triggers_ready = True
+
+def rebuild_snapshot():
+    """Recomputes the dashboard payload from the database and swaps it in."""
+    prepare_database()
+    body = dumps(build_dashboard_data())
+    with _snapshot_lock:
+        snapshot["body"] = body
+        snapshot["etag"] = make_etag(body)
+        snapshot["built_at"] = time.time()
+        snapshot["encoded"] = {}
+    return body
+
+def encoded_snapshot(body, encoding):
+    """The snapshot body compressed with `encoding`, compressed once per snapshot rather than per request."""
+    with _snapshot_lock:
+        encoded = snapshot["encoded"].get(encoding) if snapshot["body"] is body else None
+    if encoded is None:
+        encoded = compress(body, encoding)
+        with _snapshot_lock:
+            if snapshot["body"] is body:
+                snapshot["encoded"][encoding] = encoded
+    return encoded
+
+def refresh():
+    """Brings the data up to date and rebuilds the snapshot; skipped if a refresh is already running."""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    try:
+        ensure_data_is_up_to_date()
+        rebuild_snapshot()
+    except Exception as e:
+        print(f"Guardian refresh failed, still serving the previous snapshot: {e}")
+    finally:
+        _refresh_lock.release()
+
+def refresh_in_background():
+    """Starts refresh() on a background thread unless one is already running."""
+    if _refresh_lock.locked():
+        return
+    threading.Thread(target=refresh, name="guardian-refresh", daemon=True).start()
+
+# Schedule the update (started by the warm-up task, not on import)
 scheduler = BackgroundScheduler()
-scheduler.add_job(lambda: ensure_data_is_up_to_date(), trigger='cron', hour=3, minute=0)
-scheduler.start()
+scheduler.add_job(refresh, trigger='cron', hour=3, minute=0)
+
+def has_data():
+    """True if the database already holds extracted content that can be served."""
+    if not os.path.exists(DATABASE_PATH):
+        return False
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM extracted_content WHERE label IS NOT NULL);")
+        populated = cursor.fetchone()[0]
+    except sqlite3.OperationalError:
+        populated = 0  # Tables are created by the first scrape
+    conn.close()
+    return bool(populated)
+
+def warm_up():
+    """Serves existing data right away, then loads the labeler model, starts the daily schedule and runs the first update."""
+    if has_data():
+        rebuild_snapshot()
+    get_classifier()
+    if not scheduler.running:
+        scheduler.start()
+    refresh()
+
+warmup.register("guardian", warm_up)
+
+@app.on_event("startup")
+def start_warmup():
+    # A fresh database gets its triggers with the first snapshot, after the first scrape
+    if has_data():
+        prepare_database()
+    warmup.start()
+
+# API: Metrics of the last pipeline run
+@app.get("/pipeline")
+def get_pipeline_metrics():
+    return pipeline.last_metrics or {"detail": "The pipeline has not run yet."}
 
 # API: Guardian dashboard data
 @app.get("/")
-def get_guardian_data():
-    ensure_data_is_up_to_date()  # Trigger update on demand
-    
-    # Load the latest 1-year data from the database
-    query = """
-        SELECT e.id, e.article_id, a.author, a.title, a.publish_date, e.extracted_text, e.label, e.score
-        FROM extracted_content e
-        JOIN articles a ON e.article_id = a.id
-        WHERE a.publish_date >= datetime('now', '-11 months', 'start of month')
+def get_guardian_data(request: Request, response: Response, since: int = None):
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    Serves the current snapshot immediately; a stale one is refreshed in the background.
+    Clients that already hold this snapshot (If-None-Match) get an empty 304.
+    With `since` (the cursor of an earlier response), the aggregates are read live and only
+    sentences labeled or relabeled after the cursor are sent, plus the ids of deleted ones.
+    """
+    if snapshot["body"] is None:
+        if not has_data():
+            return warmup.warming_response("guardian")
+        rebuild_snapshot()
+    with _snapshot_lock:
+        body, etag, built_at = snapshot["body"], snapshot["etag"], snapshot["built_at"]
 
-    # Convert publish_date to datetime and extract month/year
-    df["publish_date"] = pd.to_datetime(df["publish_date"], errors='coerce')
-    df.dropna(subset=["publish_date"], inplace=True)
-    df["Year-Month"] = df["publish_date"].dt.to_period("M").astype(str)
+    age = time.time() - built_at
+    if age > SNAPSHOT_MAX_AGE and warmup.is_ready("guardian"):
+        refresh_in_background()
 
-    # Sort data to ensure the latest dates are displayed
-    df = df.sort_values(by="publish_date", ascending=False)
+    if since is not None:
+        unchanged = conditional(request, response, db_version(DATABASE_PATH))
+        return unchanged if unchanged is not None else json_response(build_dashboard_data(since), response)
 
-    # Unique articles per month
-    df_unique_articles = df.drop_duplicates(subset=["article_id"])
-    df_article_counts = df_unique_articles.groupby("Year-Month").size().reset_index(name="Article Count")
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    headers = {"X-Snapshot-Age": str(int(age)), **etag_headers(etag)}
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None:
+        body = encoded_snapshot(body, encoding)
+        headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding", "ETag": weak_etag(etag)})
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    # Total content count per month
-    df_content_counts = df.groupby("Year-Month").size().reset_index(name="Content Count")
+def build_dashboard_data(since=None):
+    """
+    Assembles the dashboard payload: aggregates from the monthly rollups, the latest articles,
+    labeled sentences and the change cursor. With `since`, only sentences changed after that
+    cursor are included, plus the ids of deleted ones.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = current_cursor(conn)
 
-    # Sentiment distribution per month
-    df_sentiment_counts = df.groupby(["Year-Month", "label"]).size().reset_index(name="Count")
+    # Last 12 months, including the current one (UTC)
+    since_month = conn.execute("SELECT strftime('%Y-%m', 'now', 'start of month', '-11 months');").fetchone()[0]
+    aggregates = read_rollups(conn, since_month)
 
-    # Overall sentiment distribution
-    df_overall_sentiment = df.groupby("label").size().reset_index(name="Total Count")
+    # Articles from the last 30 days
+    latest_articles = conn.execute("""
+        SELECT a.title, a.author, substr(a.publish_date, 1, 10)
+        FROM articles a
+        WHERE a.publish_date >= strftime('%Y-%m-%dT%H:%M:%SZ', 'now', '-30 days')
+          AND EXISTS (SELECT 1 FROM extracted_content e WHERE e.article_id = a.id AND e.label IS NOT NULL)
+        ORDER BY a.publish_date DESC
+    """).fetchall()
+
+    # Labeled sentences for the frontend's word frequency and word cloud
+    results = conn.execute(f"""
+        SELECT e.id, e.extracted_text, e.label
+        FROM extracted_content e
+        JOIN articles a ON e.article_id = a.id
+        WHERE e.label IS NOT NULL AND e.extracted_text IS NOT NULL AND substr(a.publish_date, 1, 7) >= ?
+          {"AND e.change_seq > ?" if since is not None else ""}
+        ORDER BY a.publish_date DESC
+    """, (since_month,) if since is None else (since_month, since)).fetchall()
+    deleted = deleted_since(conn, "extracted_content", since) if since is not None else None
+    conn.close()
 
     # Use UTC instead of local time
     today = datetime.now(timezone.utc)
     expected_months = [(today.replace(day=1) - relativedelta(months=i)).strftime("%Y-%m") for i in range(0, 12)]
-    
-    # Filter articles from the last 30 days
-    thirty_days_ago = today - timedelta(days=30)
-    latest_articles = df_unique_articles[df_unique_articles["publish_date"] >= thirty_days_ago][
-        ["title", "author", "publish_date"]
-    ]
-    
-    # Format as list of dicts
-    latest_articles_data = latest_articles.sort_values(by="publish_date", ascending=False).apply(
-        lambda row: {
-            "title": row["title"],
-            "author": row["author"],
-            "date": str(row["publish_date"].date())
-        },
-        axis=1
-    ).tolist()
-    
-    # Prepare result rows for frontend sentiment processing
-    results = df[["extracted_text", "label"]].dropna().to_dict(orient="records")
-
-    return {
-        "sentiment_trend": df_sentiment_counts.to_dict(orient="records"),
-        "sentiment_distribution": df_overall_sentiment.to_dict(orient="records"),
-        "article_count": df_article_counts.to_dict(orient="records"),
-        "content_count": df_content_counts.to_dict(orient="records"),
+
+    payload = {
+        **aggregates,
         "expected_months": expected_months,
-        "latest_articles": latest_articles_data,
-        "results": results,
+        "latest_articles": [{"title": title, "author": author, "date": date} for title, author, date in latest_articles],
+        "results": [{"id": row_id, "extracted_text": text, "label": label} for row_id, text, label in results],
         "overview_stats": {
-            "total_articles": df_unique_articles.shape[0],
-            "total_content": df.shape[0],
+            "total_articles": sum(row["Article Count"] for row in aggregates["article_count"]),
+            "total_content": sum(row["Content Count"] for row in aggregates["content_count"]),
             "time_range_start": expected_months[0],
             "time_range_end": expected_months[-1]
-        }
+        },
+        "cursor": cursor
     }
+    if since is not None:
+        payload["deleted"] = deleted
+    return payload
 
 # Run the app with: uvicorn guardian:app --reload
@@ -1,49 +1,19 @@
 import os
 import sqlite3
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from common.sharded import iter_labeled_rows
+from common.batch_writer import BatchWriter
+from common.change_seq import track_changes
+from guardian.services.rollups import ensure_rollups
 
 # Database path
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 db_path = os.path.join(ROOT_DIR, "database", "guardian.db")
 DATABASE_PATH = db_path
 
-# Define the model checkpoint
-checkpoint = "kumo24/bert-sentiment-nuclear"
-
-# Load the tokenizer
-tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-
-# Define label mappings
-id2label = {0: "negative", 1: "neutral", 2: "positive"}
-label2id = {"negative": 0, "neutral": 1, "positive": 2}
-
-# Ensure the tokenizer has a padding token
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-
-# Load the model
-model = AutoModelForSequenceClassification.from_pretrained(
-    checkpoint, 
-    num_labels=3, 
-    id2label=id2label, 
-    label2id=label2id
-)
-
-# Move model to GPU if available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-
-# Create a sentiment analysis pipeline
-sentiment_task = pipeline(
-    "sentiment-analysis",
-    model=model,
-    tokenizer=tokenizer,
-    device=0 if torch.cuda.is_available() else -1,
-    truncation=True,  # Truncate long texts
-    padding=True,  # Pad shorter texts
-    batch_size=8  # Process multiple texts in batches
-)
+def ensure_label_triggers(conn):
+    """Creates the triggers on the label column that keep the monthly rollups and the change sequence current."""
+    ensure_rollups(conn)
+    track_changes(conn, "extracted_content", ["label"])
 
 def add_label_columns():
     """Adds 'label' and 'score' columns to the extracted_content table if they don't exist."""
@@ -60,12 +30,19 @@ def add_label_columns():
         cursor.execute("ALTER TABLE extracted_content ADD COLUMN score REAL;")
 
     conn.commit()
+    ensure_label_triggers(conn)
     conn.close()
     print("Database schema updated: 'label' and 'score' columns added if missing.")
 
-def label_extracted_text():
-    """Fetches extracted sentences, applies sentiment analysis, and updates the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+def label_extracted_text(workers=None):
+    """
+    Fetches extracted sentences, applies sentiment analysis, and updates the database.
+    With `workers` > 1 (or LABEL_WORKERS set) the rows are labeled by a pool of processes.
+    Labels are committed in batches (WRITE_BATCH_ROWS rows or WRITE_BATCH_SECONDS seconds),
+    so an interrupted run keeps everything flushed before it stopped.
+    """
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    ensure_label_triggers(conn)
     cursor = conn.cursor()
 
     # Fetch extracted content that hasn't been labeled
@@ -79,27 +56,17 @@ def label_extracted_text():
 
     print(f"Found {len(rows)} unlabeled extracted sentences. Processing...")
 
-    # Prepare data for batch processing
-    batch_size = 8
-    ids, texts = map(list, zip(*rows))
-
-    labels, scores = [], []
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i : i + batch_size]  # Take a batch of texts
-        results = sentiment_task(batch_texts)  # Apply sentiment analysis
-
-        # Store results
-        labels.extend([res["label"] for res in results])
-        scores.extend([res["score"] for res in results])
-
-    # Update database with results
-    for row_id, label, score in zip(ids, labels, scores):
-        cursor.execute("""
-            UPDATE extracted_content
-            SET label = ?, score = ?
-            WHERE id = ?;
-        """, (label, score, row_id))
-        conn.commit()
+    # Shards stream back as they finish; the writer batches them into few transactions
+    labeled = 0
+    with BatchWriter(conn) as writer:
+        for shard in iter_labeled_rows(rows, workers=workers):
+            writer.add_many("""
+                UPDATE extracted_content
+                SET label = ?, score = ?
+                WHERE id = ?;
+            """, [(label, score, row_id) for row_id, label, score in shard])
+            labeled += len(shard)
+            print(f"Labeled {labeled}/{len(rows)} extracted sentences...")
 
     print(f"Successfully labeled {len(rows)} extracted sentences.")
     conn.close()
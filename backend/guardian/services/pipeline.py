@@ -0,0 +1,323 @@
+"""
+Streaming scrape -> extract -> label pipeline for The Guardian.
+
+The three stages run at the same time and hand work to each other through bounded queues:
+newly stored articles go to GPT extraction as soon as their page is written, and each
+article's extracted sentences go to the BERT labeler as soon as they are saved. A full
+queue blocks the stage feeding it, so a slow stage throttles the ones upstream instead of
+piling up work in memory. Every stage reports its own throughput and latency.
+"""
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from common.models import get_classifier
+from common.ratelimit import RateLimiter
+from guardian.services.scraper import GuardianScraper
+from guardian.services.processor import (EXTRACT_CONCURRENCY, EXTRACT_RPM, EXTRACT_TPM, create_async_client,
+                                         extract_nuclear_content_async, init_extracted_db, save_article_result,
+                                         save_failed_extraction, settle_failed_articles, split_nuclear_sentences)
+from guardian.services.labeler import DATABASE_PATH, add_label_columns
+
+# Items each queue holds before the stage feeding it blocks
+PIPELINE_QUEUE_SIZE = int(os.getenv("GUARDIAN_PIPELINE_QUEUE_SIZE", "32"))
+LABEL_THREADS = int(os.getenv("GUARDIAN_PIPELINE_LABEL_THREADS", "1"))
+LABEL_BATCH_SIZE = int(os.getenv("GUARDIAN_PIPELINE_LABEL_BATCH", "32"))
+
+# Sent downstream once a stage has no more work
+_DONE = object()
+
+# Metrics of the most recent run, served by the Guardian app
+last_metrics = None
+
+
+def _percentiles(values, scale=1.0, digits=1):
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+
+    def percentile(p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * scale, digits)
+
+    return {"p50": percentile(0.50), "p95": percentile(0.95), "max": round(values[-1] * scale, digits)}
+
+
+class StageStats:
+    """
+    Throughput and latency counters for one pipeline stage.
+
+    Attributes:
+    - name (str): Stage name.
+    - workers (int): Concurrent workers in the stage.
+    - items (int): Items the stage finished.
+    - errors (int): Items the stage gave up on.
+    - blocked_seconds (float): Time spent waiting on a full downstream queue (backpressure).
+    """
+
+    def __init__(self, name, workers, in_queue=None):
+        self.name = name
+        self.workers = workers
+        self.in_queue = in_queue
+        self.items = 0
+        self.errors = 0
+        self.blocked_seconds = 0.0
+        self._latencies = deque(maxlen=5000)
+        self._started_at = time.perf_counter()
+        self._finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds=None, items=1):
+        """Counts `items` finished items that took `seconds` each (if timed)."""
+        with self._lock:
+            self.items += items
+            if seconds is not None:
+                self._latencies.extend([seconds] * items)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def put(self, out_queue, item):
+        """Puts `item` on the downstream queue, counting the time spent blocked on it."""
+        started_at = time.perf_counter()
+        out_queue.put(item)
+        with self._lock:
+            self.blocked_seconds += time.perf_counter() - started_at
+
+    def finish(self):
+        self._finished_at = time.perf_counter()
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "errors": self.errors,
+                "items_per_second": round(self.items / elapsed, 2) if elapsed else None,
+                "latency_ms": _percentiles(self._latencies, scale=1000),
+                "blocked_seconds": round(self.blocked_seconds, 2),
+                "queue_depth": self.in_queue.qsize() if self.in_queue is not None else None,
+            }
+
+
+def _publish_age_seconds(publish_date):
+    try:
+        published = datetime.strptime(publish_date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+    return (datetime.now(timezone.utc) - published).total_seconds()
+
+
+def run_pipeline(from_date, to_date, extract_workers=None, label_threads=None, queue_size=None):
+    """
+    Scrapes, extracts and labels Guardian articles with all three stages running concurrently.
+    Articles left unprocessed and sentences left unlabeled by earlier runs are fed in first.
+
+    Parameters:
+    - from_date, to_date (str): Default scrape window (see GuardianScraper).
+    - extract_workers (int): GPT extractions in flight (defaults to GUARDIAN_EXTRACT_CONCURRENCY).
+    - label_threads (int): Labeling threads (defaults to GUARDIAN_PIPELINE_LABEL_THREADS).
+    - queue_size (int): Capacity of each queue between stages.
+
+    Returns:
+    - dict: Per-stage metrics plus end-to-end latencies.
+    """
+    global last_metrics
+    extract_workers = extract_workers or EXTRACT_CONCURRENCY
+    label_threads = label_threads or LABEL_THREADS
+    queue_size = queue_size or PIPELINE_QUEUE_SIZE
+
+    scraper = GuardianScraper(from_date=from_date, to_date=to_date, db_path=DATABASE_PATH)
+    init_extracted_db()
+    add_label_columns()
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    # Articles that failed extraction too many runs get their regex matches (labeled below)
+    settle_failed_articles(conn)
+    unprocessed = conn.execute("SELECT id, body_text, publish_date FROM articles WHERE processed_status IS NULL;").fetchall()
+    unlabeled = conn.execute("SELECT id, extracted_text FROM extracted_content WHERE label IS NULL;").fetchall()
+    conn.close()
+
+    extract_queue = queue.Queue(maxsize=queue_size)
+    label_queue = queue.Queue(maxsize=queue_size)
+    stages = {
+        "scrape": StageStats("scrape", 1),
+        "extract": StageStats("extract", extract_workers, extract_queue),
+        "label": StageStats("label", label_threads, label_queue),
+    }
+    end_to_end, publish_to_label = deque(maxlen=5000), deque(maxlen=5000)
+    latency_lock = threading.Lock()
+    started_at = time.perf_counter()
+
+    # --- Stage 1: scrape, handing over each page's new articles as soon as it is stored
+    def enqueue_articles(articles):
+        for article_id, body_text, publish_date in articles:
+            stages["scrape"].put(extract_queue, (article_id, body_text, publish_date, time.perf_counter()))
+        stages["scrape"].record(items=len(articles))
+
+    def scrape():
+        try:
+            enqueue_articles(unprocessed)
+            scraper.on_new_articles = enqueue_articles
+            scraper.scrape_articles()
+        except Exception as e:
+            print(f"[Pipeline] Scrape stage failed: {e}")
+        finally:
+            stages["scrape"].finish()
+            for _ in range(extract_workers):
+                extract_queue.put(_DONE)
+
+    # --- Stage 2: GPT extraction, `extract_workers` requests in flight
+    async def extract_all(executor):
+        loop = asyncio.get_running_loop()
+        limiter = RateLimiter(EXTRACT_RPM, EXTRACT_TPM)
+        async_client = create_async_client()
+        conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+
+        async def worker():
+            while True:
+                item = await loop.run_in_executor(executor, extract_queue.get)
+                if item is _DONE:
+                    return
+                article_id, body_text, publish_date, enqueued_at = item
+                item_started_at = time.perf_counter()
+                try:
+                    extracted = await extract_nuclear_content_async(async_client, limiter, body_text)
+                except Exception as e:
+                    # Same handling as process_articles_async: regex fallback or counted for a later run
+                    print(f"[Pipeline] Extraction failed for article ID {article_id}: {e}")
+                    stages["extract"].error()
+                    rows = save_failed_extraction(conn, article_id, body_text, e)
+                else:
+                    rows = save_article_result(conn, article_id, split_nuclear_sentences(body_text, extracted))
+                    stages["extract"].record(time.perf_counter() - item_started_at)
+                if rows:
+                    await loop.run_in_executor(executor, stages["extract"].put, label_queue,
+                                               (rows, publish_date, enqueued_at))
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(extract_workers)))
+        finally:
+            await async_client.close()
+            conn.close()
+
+    def extract():
+        # Sentences a previous run extracted but never labeled go first
+        for i in range(0, len(unlabeled), LABEL_BATCH_SIZE):
+            stages["extract"].put(label_queue, (unlabeled[i:i + LABEL_BATCH_SIZE], None, None))
+        # Queue gets/puts block, so they run on their own threads rather than the event loop
+        executor = ThreadPoolExecutor(max_workers=extract_workers + 1)
+        try:
+            asyncio.run(extract_all(executor))
+        except Exception as e:
+            print(f"[Pipeline] Extract stage failed: {e}")
+            # Keep draining so the scrape stage never blocks on a queue nobody reads
+            while scrape_thread.is_alive() or not extract_queue.empty():
+                try:
+                    extract_queue.get(timeout=0.2)
+                except queue.Empty:
+                    pass
+        finally:
+            executor.shutdown(wait=False)
+            stages["extract"].finish()
+            for _ in range(label_threads):
+                label_queue.put(_DONE)
+
+    # --- Stage 3: BERT labeling, batching whatever has queued up
+    def label():
+        conn = None
+        done = False
+        try:
+            classifier = get_classifier()
+            conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+            while not done:
+                item = label_queue.get()
+                if item is _DONE:
+                    done = True
+                    break
+                batch = [item]
+                while sum(len(rows) for rows, _, _ in batch) < LABEL_BATCH_SIZE:
+                    try:
+                        item = label_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+
+                rows = [row for rows, _, _ in batch for row in rows]
+                batch_started_at = time.perf_counter()
+                try:
+                    results = classifier.predict([text for _, text in rows])
+                    conn.executemany(
+                        "UPDATE extracted_content SET label = ?, score = ? WHERE id = ?;",
+                        [(res["label"], res["score"], row_id) for (row_id, _), res in zip(rows, results)]
+                    )
+                    conn.commit()
+                except Exception as e:
+                    # Left unlabeled; the next run picks them up again
+                    print(f"[Pipeline] Labeling failed for {len(rows)} sentences: {e}")
+                    stages["label"].error()
+                    continue
+                stages["label"].record(time.perf_counter() - batch_started_at, items=len(rows))
+
+                now = time.perf_counter()
+                with latency_lock:
+                    for _, publish_date, enqueued_at in batch:
+                        if enqueued_at is not None:
+                            end_to_end.append(now - enqueued_at)
+                        age = _publish_age_seconds(publish_date)
+                        if age is not None:
+                            publish_to_label.append(age)
+        except Exception as e:
+            print(f"[Pipeline] Label stage failed: {e}")
+            stages["label"].error()
+        finally:
+            # Keep draining up to this thread's _DONE so the extract stage never blocks on a
+            # queue nobody reads
+            while not done:
+                done = label_queue.get() is _DONE
+            if conn is not None:
+                conn.close()
+
+    scrape_thread = threading.Thread(target=scrape, name="pipeline-scrape")
+    threads = [scrape_thread, threading.Thread(target=extract, name="pipeline-extract")]
+    label_workers = [threading.Thread(target=label, name=f"pipeline-label-{i}") for i in range(label_threads)]
+    for thread in threads + label_workers:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for thread in label_workers:
+        thread.join()
+    stages["label"].finish()
+
+    last_metrics = {
+        "seconds": round(time.perf_counter() - started_at, 2),
+        "pages_scraped": scraper.stats["pages"],
+        "stages": {name: stage.snapshot() for name, stage in stages.items()},
+        # From the article being stored (or picked up from a previous run) to its sentences being labeled
+        "end_to_end_ms": _percentiles(end_to_end, scale=1000),
+        "publish_to_label_minutes": _percentiles(publish_to_label, scale=1 / 60),
+    }
+    print_report(last_metrics)
+    return last_metrics
+
+
+def print_report(metrics):
+    """Prints one line per stage plus the end-to-end latency."""
+    print(f"[Pipeline] Finished in {metrics['seconds']}s ({metrics['pages_scraped']} pages scraped).")
+    for name, stage in metrics["stages"].items():
+        latency = stage["latency_ms"]
+        timing = f"p50={latency['p50']}ms p95={latency['p95']}ms " if latency["p50"] is not None else ""
+        print(f"[Pipeline] {name:<8} workers={stage['workers']:<3} items={stage['items']:<6} "
+              f"errors={stage['errors']:<4} rate={stage['items_per_second']}/s {timing}"
+              f"blocked={stage['blocked_seconds']}s")
+    e2e = metrics["end_to_end_ms"]
+    print(f"[Pipeline] end-to-end p50={e2e['p50']}ms p95={e2e['p95']}ms max={e2e['max']}ms")
@@ -1,9 +1,12 @@
 import os
 import re
-import time
+import asyncio
 import sqlite3
-from openai import AzureOpenAI
+import openai
+from openai import AsyncAzureOpenAI, AzureOpenAI
 from dotenv import load_dotenv
+from common.ratelimit import RateLimiter, retry_with_backoff
+from common.batch_writer import BatchWriter
 
 # Load environment variables
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
@@ -19,6 +22,14 @@ AZURE_OPENAI_ORGANIZATION = os.getenv("AZURE_OPENAI_ORGANIZATION")
 if not all([AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_VERSION]):
     raise ValueError("Missing Azure OpenAI environment variables!")
 
+# Extraction concurrency and Azure OpenAI quota (requests and tokens per minute)
+EXTRACT_CONCURRENCY = int(os.getenv("GUARDIAN_EXTRACT_CONCURRENCY", "8"))
+EXTRACT_RPM = int(os.getenv("GUARDIAN_EXTRACT_RPM", "60"))
+EXTRACT_TPM = int(os.getenv("GUARDIAN_EXTRACT_TPM", "80000"))
+EXTRACT_RETRIES = int(os.getenv("GUARDIAN_EXTRACT_RETRIES", "5"))
+# Runs an article may fail extraction on (retries exhausted) before it falls back to the regex matches
+EXTRACT_MAX_ATTEMPTS = int(os.getenv("GUARDIAN_EXTRACT_MAX_ATTEMPTS", "3"))
+
 # Initialize Azure OpenAI Client
 client = AzureOpenAI(
     api_key=AZURE_OPENAI_API_KEY,
@@ -49,42 +60,47 @@ def init_extracted_db():
             FOREIGN KEY(article_id) REFERENCES articles(id) ON DELETE CASCADE
         )
     ''')
+
+    # Failed extraction runs per article (the articles table is created by the scraper)
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(articles);")]
+    if columns and "extract_attempts" not in columns:
+        cursor.execute("ALTER TABLE articles ADD COLUMN extract_attempts INTEGER NOT NULL DEFAULT 0;")
     conn.commit()
     conn.close()
 
+EXTRACTION_PROMPT = (
+    "This project is for academic research to analyze nuclear power discussions and help mitigate misinformation.\n"
+    "Extract only single, stand-alone sentences that meet one of the following criteria:\n"
+    "1. The sentence contains the word 'nuclear' or any of its variants. **Every sentence containing 'nuclear' must be extracted with NO exceptions.**\n"
+    "2. The sentence directly discusses nuclear power, nuclear safety, nuclear waste, nuclear policy, or nuclear technology.\n"
+    "\n"
+    "**Strict Extraction Rules:**\n"
+    "- **DO NOT omit any sentence containing 'nuclear'** or its variants, regardless of surrounding context.\n"
+    "- Each extracted sentence must be a complete, stand-alone statement that conveys nuclear-related information.\n"
+    "- Exclude any sentence that only discusses general energy, environmental policy, or economic factors unless they are directly linked to nuclear content.\n"
+    "- **DO NOT return loosely related content** unless they explicitly focus on nuclear topics.\n"
+    "- **DO NOT summarize, paraphrase, modify, or generate new content**—extract sentences exactly as they appear.\n"
+    "- If the article does NOT contain 'nuclear' or any nuclear-related content, return **'None'**.\n"
+    "\n"
+    "**Output Format:**\n"
+    "- Return extracted sentences exactly as they appear in the original document.\n"
+    "- If no nuclear-related content is found, return **'None'**.\n"
+    "- Maintain original punctuation and spacing.\n"
+)
+
+def build_messages(text):
+    """Chat messages asking the model to extract nuclear-related sentences from `text`."""
+    return [
+        {"role": "system", "content": EXTRACTION_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
 def extract_nuclear_content(text):
     """Uses an AI model to extract nuclear-related content from the given text."""
     try:
         response = client.chat.completions.create(
             model="gpt-35-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "This project is for academic research to analyze nuclear power discussions and help mitigate misinformation.\n"
-                        "Extract only single, stand-alone sentences that meet one of the following criteria:\n"
-                        "1. The sentence contains the word 'nuclear' or any of its variants. **Every sentence containing 'nuclear' must be extracted with NO exceptions.**\n"
-                        "2. The sentence directly discusses nuclear power, nuclear safety, nuclear waste, nuclear policy, or nuclear technology.\n"
-                        "\n"
-                        "**Strict Extraction Rules:**\n"
-                        "- **DO NOT omit any sentence containing 'nuclear'** or its variants, regardless of surrounding context.\n"
-                        "- Each extracted sentence must be a complete, stand-alone statement that conveys nuclear-related information.\n"
-                        "- Exclude any sentence that only discusses general energy, environmental policy, or economic factors unless they are directly linked to nuclear content.\n"
-                        "- **DO NOT return loosely related content** unless they explicitly focus on nuclear topics.\n"
-                        "- **DO NOT summarize, paraphrase, modify, or generate new content**—extract sentences exactly as they appear.\n"
-                        "- If the article does NOT contain 'nuclear' or any nuclear-related content, return **'None'**.\n"
-                        "\n"
-                        "**Output Format:**\n"
-                        "- Return extracted sentences exactly as they appear in the original document.\n"
-                        "- If no nuclear-related content is found, return **'None'**.\n"
-                        "- Maintain original punctuation and spacing.\n"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": text
-                }
-            ],            
+            messages=build_messages(text),
             temperature=0
         )
         return response.choices[0].message.content.strip()
@@ -93,16 +109,152 @@ def extract_nuclear_content(text):
         print(f"Error processing text: {e}")
         return ""
 
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) used for tokens-per-minute limiting."""
+    return (len(EXTRACTION_PROMPT) + len(text or "")) // 4 + 500  # plus room for the completion
+
+def is_retryable(error):
+    """429s, 5xx responses, timeouts and dropped connections are worth retrying."""
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+def retry_after_seconds(error):
+    """Delay requested by the server via the Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def create_async_client():
+    """Async Azure OpenAI client for the retrying extraction path."""
+    # Our own retry loop handles backoff, so the SDK shouldn't retry underneath it
+    return AsyncAzureOpenAI(
+        api_key=AZURE_OPENAI_API_KEY,
+        api_version=AZURE_OPENAI_VERSION,
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        organization=AZURE_OPENAI_ORGANIZATION,
+        max_retries=0
+    )
+
+async def extract_nuclear_content_async(async_client, limiter, text):
+    """Rate-limited, retrying async version of extract_nuclear_content(); raises once retries run out."""
+    async def call():
+        await limiter.acquire(estimate_tokens(text))
+        return await async_client.chat.completions.create(
+            model="gpt-35-turbo",
+            messages=build_messages(text),
+            temperature=0
+        )
+
+    response = await retry_with_backoff(call, is_retryable, retries=EXTRACT_RETRIES, retry_after=retry_after_seconds)
+    return response.choices[0].message.content.strip()
+
 def extract_nuclear_with_grep(text):
     """Find all sentences containing 'nuclear' using regex (grep equivalent in Python)."""
     nuclear_sentences = re.findall(r'([^.?!]*\bnuclear\b[^.?!]*[.?!])', text, re.IGNORECASE)
     return [sentence.strip() for sentence in nuclear_sentences]
 
-def process_articles():
-    """Processes articles from the SQLite database and extracts nuclear-related content."""
+def split_nuclear_sentences(body_text, extracted_content):
+    """Merges GPT-extracted sentences with the regex matches and cleans them up."""
+    # Step 1: Sentences extracted using GPT
+    gpt_sentences = set(re.split(r'(?<=[.!?])\s+', extracted_content.strip()) if extracted_content and extracted_content != "None" else [])
+    
+    # Step 2: Use regex (grep alternative) to find all nuclear-related sentences
+    grep_sentences = extract_nuclear_with_grep(body_text)
+    
+    # Step 3: Merge both sources
+    all_nuclear_sentences = gpt_sentences.union(grep_sentences)
+
+    sentences = []
+    for sentence in all_nuclear_sentences:
+        clean_content = sentence.lstrip("-").strip()  # Remove leading hyphen and extra spaces
+        if clean_content and clean_content.lower() != "none":  # Ensure we don't insert "None"
+            sentences.append(clean_content)
+    return sentences
+
+def article_result_statements(article_id, sentences):
+    """The (sql, params) writes that store an article's sentences and its processed_status."""
+    if not sentences:
+        return [("UPDATE articles SET processed_status = 'no_nuclear_content' WHERE id = ?", [(article_id,)])]
+    return [
+        ("INSERT INTO extracted_content (article_id, extracted_text) VALUES (?, ?);",
+         [(article_id, sentence) for sentence in sentences]),
+        ("UPDATE articles SET processed_status = 'processed' WHERE id = ?", [(article_id,)]),
+    ]
+
+def save_article_result(conn, article_id, sentences):
+    """
+    Stores the extracted sentences and the article's processed_status in one transaction.
+
+    Returns:
+    - list: (extracted_content id, sentence) rows that were inserted.
+    """
+    with conn:
+        for sql, params in article_result_statements(article_id, sentences):
+            conn.executemany(sql, params)
+        rows = conn.execute("SELECT id, extracted_text FROM extracted_content WHERE article_id = ?;", (article_id,)).fetchall()
+    if sentences:
+        print(f"Extracted and saved content for article ID {article_id}")
+    else:
+        print(f"No nuclear-related content found in article ID {article_id}")
+    return rows
+
+def failed_extraction_statements(article_id, body_text, error):
+    """
+    The (sql, params) writes for an article whose GPT extraction failed. Errors retrying won't
+    fix (e.g. a content-filter or context-length 400) fall back to the regex matches right
+    away; otherwise the failed run is counted and the article is left for the next one.
+    """
+    if not is_retryable(error):
+        return article_result_statements(article_id, split_nuclear_sentences(body_text, ""))
+    return [("UPDATE articles SET extract_attempts = extract_attempts + 1 WHERE id = ?", [(article_id,)])]
+
+def save_failed_extraction(conn, article_id, body_text, error):
+    """
+    Stores failed_extraction_statements() in one transaction.
+
+    Returns:
+    - list: (extracted_content id, sentence) rows of the regex fallback, if it was used.
+    """
+    if not is_retryable(error):
+        return save_article_result(conn, article_id, split_nuclear_sentences(body_text, ""))
+    with conn:
+        for sql, params in failed_extraction_statements(article_id, body_text, error):
+            conn.executemany(sql, params)
+    return []
+
+def settle_failed_articles(conn):
+    """
+    Stores the regex matches for articles whose extraction has failed EXTRACT_MAX_ATTEMPTS runs,
+    so they stop being sent to GPT on every run.
+
+    Returns:
+    - int: Articles settled.
+    """
+    articles = conn.execute(
+        "SELECT id, body_text FROM articles WHERE processed_status IS NULL AND extract_attempts >= ?;",
+        (EXTRACT_MAX_ATTEMPTS,)
+    ).fetchall()
+    for article_id, body_text in articles:
+        print(f"Extraction failed {EXTRACT_MAX_ATTEMPTS} runs for article ID {article_id}, keeping the regex matches")
+        save_article_result(conn, article_id, split_nuclear_sentences(body_text, ""))
+    return len(articles)
+
+async def process_articles_async(concurrency=None, requests_per_minute=None, tokens_per_minute=None):
+    """
+    Extracts nuclear-related content from unprocessed articles with up to `concurrency` GPT calls
+    in flight, under a requests/tokens-per-minute limit. Each article's sentences and status are
+    committed together, in batches of articles (see common.batch_writer). Failed extractions
+    are handled by failed_extraction_statements() and settle_failed_articles().
+    """
+    concurrency = concurrency or EXTRACT_CONCURRENCY
     print("Starting nuclear content extraction...")
-    conn = sqlite3.connect(db_path)
+    init_extracted_db()
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     cursor = conn.cursor()
+    settle_failed_articles(conn)
     
     # Select only unprocessed articles
     cursor.execute("SELECT id, body_text FROM articles WHERE processed_status IS NULL;")
@@ -112,42 +264,42 @@ def process_articles():
         print("All articles are already processed. No updates needed.")
         conn.close()
         return
-    
-    conn_extracted = sqlite3.connect(db_path)
-    cursor_extracted = conn_extracted.cursor()
-    
-    for article_id, body_text in articles:
-        # Step 1: Extract sentences using GPT
-        extracted_content = extract_nuclear_content(body_text)
-        gpt_sentences = set(re.split(r'(?<=[.!?])\s+', extracted_content.strip()) if extracted_content and extracted_content != "None" else [])
-        
-        # Step 2: Use regex (grep alternative) to find all nuclear-related sentences
-        grep_sentences = extract_nuclear_with_grep(body_text)
-        
-        # Step 3: Merge both sources
-        all_nuclear_sentences = gpt_sentences.union(grep_sentences)
-    
-        if all_nuclear_sentences:
-            for sentence in all_nuclear_sentences:
-                clean_content = sentence.lstrip("-").strip()  # Remove leading hyphen and extra spaces
-                if clean_content.lower() != "none":  # Ensure we don't insert "None"
-                    cursor_extracted.execute(
-                        "INSERT INTO extracted_content (article_id, extracted_text) VALUES (?, ?);",
-                        (article_id, clean_content)
-                    )
-                    conn_extracted.commit()  # Commit after each insert
-            print(f"Extracted and saved content for article ID {article_id}")
-            cursor.execute("UPDATE articles SET processed_status = 'processed' WHERE id = ?", (article_id,))
-        else:
-            print(f"No nuclear-related content found in article ID {article_id}")
-            cursor.execute("UPDATE articles SET processed_status = 'no_nuclear_content' WHERE id = ?", (article_id,))
-
-        conn.commit()
-        time.sleep(0.5)  # Delay to avoid overwhelming API
-    
-    conn_extracted.close()
-    conn.close()
-    print("Processing complete.")
+
+    limiter = RateLimiter(requests_per_minute or EXTRACT_RPM, tokens_per_minute or EXTRACT_TPM)
+    semaphore = asyncio.Semaphore(concurrency)
+    async_client = create_async_client()
+
+    async def extract(article_id, body_text):
+        async with semaphore:
+            try:
+                return article_id, body_text, await extract_nuclear_content_async(async_client, limiter, body_text)
+            except Exception as e:
+                return article_id, body_text, e
+
+    failed = 0
+    try:
+        with BatchWriter(conn) as writer:
+            tasks = [asyncio.ensure_future(extract(article_id, body_text)) for article_id, body_text in articles]
+            for finished in asyncio.as_completed(tasks):
+                article_id, body_text, extracted_content = await finished
+                if isinstance(extracted_content, Exception):
+                    print(f"Error processing article ID {article_id}: {extracted_content}")
+                    writer.add_unit(failed_extraction_statements(article_id, body_text, extracted_content))
+                    if is_retryable(extracted_content):
+                        failed += 1
+                    continue
+                sentences = split_nuclear_sentences(body_text, extracted_content)
+                writer.add_unit(article_result_statements(article_id, sentences))
+                print(f"Extracted {len(sentences)} nuclear sentences from article ID {article_id}")
+    finally:
+        await async_client.close()
+        conn.close()
+
+    print(f"Processing complete. {len(articles) - failed} processed, {failed} left for the next run.")
+
+def process_articles(concurrency=None):
+    """Processes articles from the SQLite database and extracts nuclear-related content."""
+    asyncio.run(process_articles_async(concurrency=concurrency))
 
 if __name__ == "__main__":
     init_extracted_db()
@@ -0,0 +1,221 @@
+"""
+Monthly rollups of labeled Guardian content.
+
+Three small tables hold, per publish month (YYYY-MM) of the article:
+- rollup_month_label: labeled sentences per sentiment label
+- rollup_month_content: labeled sentences
+- rollup_month_articles: articles with at least one labeled sentence
+
+Triggers on extracted_content keep them current as rows are labeled, relabeled or deleted,
+so every writer (the labeler, the streaming pipeline, the batch writer) maintains them
+without extra code, and the dashboard reads a few dozen rows instead of the whole corpus.
+
+Check the rollups against the raw rows (and optionally rebuild them):
+    python -m guardian.services.rollups [--rebuild]
+"""
+import argparse
+import os
+import sqlite3
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_PATH = os.path.join(ROOT_DIR, "database", "guardian.db")
+
+TABLES = """
+    CREATE TABLE IF NOT EXISTS rollup_month_label (
+        month TEXT NOT NULL,
+        label TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, label)
+    );
+    CREATE TABLE IF NOT EXISTS rollup_month_content (
+        month TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rollup_month_articles (
+        month TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+"""
+
+# Publish month of the row's article
+_MONTH = "(SELECT substr(publish_date, 1, 7) FROM articles WHERE id = {row}.article_id)"
+_HAS_ARTICLE = "EXISTS (SELECT 1 FROM articles WHERE id = {row}.article_id)"
+
+
+def _add(row):
+    """Statements counting `row` (NEW or OLD) in the rollups."""
+    month = _MONTH.format(row=row)
+    return f"""
+        INSERT INTO rollup_month_label (month, label, count) VALUES ({month}, {row}.label, 1)
+            ON CONFLICT (month, label) DO UPDATE SET count = count + 1;
+        INSERT INTO rollup_month_content (month, count) VALUES ({month}, 1)
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+        INSERT INTO rollup_month_articles (month, count)
+            SELECT {month}, 1
+            WHERE NOT EXISTS (
+                SELECT 1 FROM extracted_content
+                WHERE article_id = {row}.article_id AND label IS NOT NULL AND id != {row}.id
+            )
+            ON CONFLICT (month) DO UPDATE SET count = count + 1;
+    """
+
+
+def _remove(row):
+    """Statements uncounting `row`; run once the row no longer carries its label."""
+    month = _MONTH.format(row=row)
+    return f"""
+        UPDATE rollup_month_label SET count = count - 1 WHERE month = {month} AND label = {row}.label;
+        UPDATE rollup_month_content SET count = count - 1 WHERE month = {month};
+        UPDATE rollup_month_articles SET count = count - 1
+            WHERE month = {month} AND NOT EXISTS (
+                SELECT 1 FROM extracted_content
+                WHERE article_id = {row}.article_id AND label IS NOT NULL AND id != {row}.id
+            );
+    """
+
+
+TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS rollup_on_insert AFTER INSERT ON extracted_content
+    WHEN NEW.label IS NOT NULL AND {_HAS_ARTICLE.format(row="NEW")}
+    BEGIN {_add("NEW")} END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_on_label_set AFTER UPDATE OF label ON extracted_content
+    WHEN OLD.label IS NULL AND NEW.label IS NOT NULL AND {_HAS_ARTICLE.format(row="NEW")}
+    BEGIN {_add("NEW")} END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_on_label_change AFTER UPDATE OF label ON extracted_content
+    WHEN OLD.label IS NOT NULL AND NEW.label IS NOT NULL AND OLD.label != NEW.label
+        AND {_HAS_ARTICLE.format(row="NEW")}
+    BEGIN
+        UPDATE rollup_month_label SET count = count - 1
+            WHERE month = {_MONTH.format(row="OLD")} AND label = OLD.label;
+        INSERT INTO rollup_month_label (month, label, count) VALUES ({_MONTH.format(row="NEW")}, NEW.label, 1)
+            ON CONFLICT (month, label) DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_on_label_clear AFTER UPDATE OF label ON extracted_content
+    WHEN OLD.label IS NOT NULL AND NEW.label IS NULL AND {_HAS_ARTICLE.format(row="OLD")}
+    BEGIN {_remove("OLD")} END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_on_delete AFTER DELETE ON extracted_content
+    WHEN OLD.label IS NOT NULL AND {_HAS_ARTICLE.format(row="OLD")}
+    BEGIN {_remove("OLD")} END;
+"""
+
+# The same aggregates computed from the raw rows
+RAW_QUERIES = {
+    "rollup_month_label": """
+        SELECT substr(a.publish_date, 1, 7), e.label, COUNT(*)
+        FROM extracted_content e JOIN articles a ON a.id = e.article_id
+        WHERE e.label IS NOT NULL
+        GROUP BY 1, 2
+    """,
+    "rollup_month_content": """
+        SELECT substr(a.publish_date, 1, 7), COUNT(*)
+        FROM extracted_content e JOIN articles a ON a.id = e.article_id
+        WHERE e.label IS NOT NULL
+        GROUP BY 1
+    """,
+    "rollup_month_articles": """
+        SELECT substr(a.publish_date, 1, 7), COUNT(DISTINCT e.article_id)
+        FROM extracted_content e JOIN articles a ON a.id = e.article_id
+        WHERE e.label IS NOT NULL
+        GROUP BY 1
+    """,
+}
+
+
+def ensure_rollups(conn):
+    """
+    Creates the rollup tables and triggers if missing, and fills them from the raw rows the
+    first time. Requires the extracted_content table with its label column.
+    """
+    with conn:
+        conn.executescript(TABLES)
+        conn.executescript(TRIGGERS)
+    empty = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM rollup_month_content)").fetchone()[0]
+    labeled = conn.execute("SELECT EXISTS (SELECT 1 FROM extracted_content WHERE label IS NOT NULL)").fetchone()[0]
+    if empty and labeled:
+        rebuild_rollups(conn)
+
+
+def rebuild_rollups(conn):
+    """Recomputes every rollup table from the raw rows in one transaction."""
+    with conn:
+        for table, query in RAW_QUERIES.items():
+            conn.execute(f"DELETE FROM {table};")
+            conn.execute(f"INSERT INTO {table} {query}")
+
+
+def _counts(rows):
+    # Keys are everything but the last column; zero counts are the same as missing rows
+    return {tuple(row[:-1]): row[-1] for row in rows if row[-1]}
+
+
+def check_rollups(conn):
+    """
+    Compares each rollup table with the same aggregate computed from the raw rows.
+
+    Returns:
+    - list: (table, key, rollup count, raw count) for every mismatch; empty when consistent.
+    """
+    mismatches = []
+    for table, query in RAW_QUERIES.items():
+        stored = _counts(conn.execute(f"SELECT * FROM {table}").fetchall())
+        raw = _counts(conn.execute(query).fetchall())
+        for key in sorted(stored.keys() | raw.keys()):
+            if stored.get(key, 0) != raw.get(key, 0):
+                mismatches.append((table, key, stored.get(key, 0), raw.get(key, 0)))
+    return mismatches
+
+
+def read_rollups(conn, since_month):
+    """
+    Reads the dashboard aggregates for months from `since_month` (YYYY-MM) on.
+
+    Returns:
+    - dict: sentiment_trend, sentiment_distribution, article_count and content_count records.
+    """
+    trend = conn.execute("""
+        SELECT month, label, count FROM rollup_month_label
+        WHERE month >= ? AND count > 0 ORDER BY month, label
+    """, (since_month,)).fetchall()
+    distribution = conn.execute("""
+        SELECT label, SUM(count) FROM rollup_month_label
+        WHERE month >= ? AND count > 0 GROUP BY label ORDER BY label
+    """, (since_month,)).fetchall()
+    articles = conn.execute("""
+        SELECT month, count FROM rollup_month_articles WHERE month >= ? AND count > 0 ORDER BY month
+    """, (since_month,)).fetchall()
+    content = conn.execute("""
+        SELECT month, count FROM rollup_month_content WHERE month >= ? AND count > 0 ORDER BY month
+    """, (since_month,)).fetchall()
+    return {
+        "sentiment_trend": [{"Year-Month": m, "label": label, "Count": c} for m, label, c in trend],
+        "sentiment_distribution": [{"label": label, "Total Count": c} for label, c in distribution],
+        "article_count": [{"Year-Month": m, "Article Count": c} for m, c in articles],
+        "content_count": [{"Year-Month": m, "Content Count": c} for m, c in content],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the rollups if they differ from the raw rows")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ensure_rollups(conn)
+    mismatches = check_rollups(conn)
+    for table, key, stored, raw in mismatches:
+        print(f"{table} {'/'.join(key)}: rollup={stored} raw={raw}")
+    print(f"{len(mismatches)} mismatches.")
+    if mismatches and args.rebuild:
+        rebuild_rollups(conn)
+        print(f"Rebuilt; {len(check_rollups(conn))} mismatches remain.")
+    conn.close()
+    raise SystemExit(1 if mismatches and not args.rebuild else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import os
+import time
+import asyncio
+import httpx
 import requests
 import sqlite3
 from dotenv import load_dotenv
+from common.ratelimit import RateLimiter
+from common.crawl_state import init_crawl_state, open_window, advance_page, close_window
 
 # Load environment variables
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
@@ -15,6 +20,14 @@ GUARDIAN_BASE_URL = os.getenv("GUARDIAN_BASE_URL")
 if not GUARDIAN_API_KEY or not GUARDIAN_BASE_URL:
     raise ValueError("Missing API keys! Ensure you have a .env file in the guardian directory.")
 
+# "async" fetches pages of every query concurrently; "sync" fetches them one after another
+SCRAPE_MODE = os.getenv("GUARDIAN_SCRAPE_MODE", "async")
+SCRAPE_CONCURRENCY = int(os.getenv("GUARDIAN_SCRAPE_CONCURRENCY", "4"))
+# Content API calls allowed per minute (the developer tier allows about one per second)
+SCRAPE_RPM = int(os.getenv("GUARDIAN_SCRAPE_RPM", "60"))
+# Source name of the Guardian rows in the crawl_state table
+CRAWL_SOURCE = "guardian"
+
 class GuardianScraper:
     """
     A scraper for fetching articles from The Guardian API and storing them in an SQLite database.
@@ -26,6 +39,15 @@ class GuardianScraper:
     - db_path (str): Path to the SQLite database.
     - section (str): The Guardian news section to search within.
     - queries (dict): Dictionary of search queries categorized by topic.
+    - stats (dict): Pages, rows fetched, new rows and elapsed seconds for the last scrape.
+    - seen_ids (set): Guardian content ids already stored or seen during the current scrape.
+    - on_new_articles (callable): Optional; called with the (id, body_text, publish_date) rows
+      of each page's newly stored articles, e.g. to stream them into the extraction pipeline.
+      In async mode it runs on a worker thread, so it may block without stalling the fetches.
+
+    Each query is crawled incrementally: its window starts at the query's watermark in the
+    crawl_state table (or `from_date` the first time) and ends at `to_date`, and an interrupted
+    window resumes from the first page that was not stored.
     """
     
     def __init__(self, from_date, to_date, db_path):
@@ -46,6 +68,11 @@ class GuardianScraper:
             "Nuclear waste": ["radiotoxic", "disposal", "spent-fuel", "contamination"],
             "Nuclear energy": ["green", "carbon-free", "eco-friendly"]
         }
+        self.stats = {"pages": 0, "fetched": 0, "new": 0, "seconds": 0.0}
+        self.seen_ids = set()
+        self._progress = {}
+        self._session = None
+        self.on_new_articles = None
 
         # Ensure database file exists
         self.init_db()
@@ -64,6 +91,7 @@ class GuardianScraper:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS articles (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guardian_id TEXT,
                 title TEXT UNIQUE,
                 author TEXT,
                 section TEXT,
@@ -74,9 +102,31 @@ class GuardianScraper:
                 processed_status TEXT DEFAULT NULL
             )
         ''')
+
+        # Older databases predate the guardian_id column; add it and fill it in from the article URL
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(articles);")]
+        if "guardian_id" not in columns:
+            cursor.execute("ALTER TABLE articles ADD COLUMN guardian_id TEXT;")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_guardian_id ON articles (guardian_id);")
+        cursor.execute('''
+            UPDATE OR IGNORE articles
+            SET guardian_id = substr(url, length('https://www.theguardian.com/') + 1)
+            WHERE guardian_id IS NULL AND url LIKE 'https://www.theguardian.com/%'
+        ''')
+        init_crawl_state(conn)
         conn.commit()
         conn.close()
 
+    def search_queries(self):
+        """Returns the full list of search queries ("Nuclear <keyword>")."""
+        return [f"Nuclear {keyword}" for keywords in self.queries.values() for keyword in keywords]
+
+    def page_url(self, query, page, from_date=None, to_date=None):
+        """Builds the Content API URL for one page of results (defaults to the scraper's date range)."""
+        return (f"{self.base_url}q={query}&section={self.section}&type=article"
+                f"&from-date={from_date or self.from_date}&to-date={to_date or self.to_date}&order-by=newest"
+                f"&page-size=100&page={page}&show-fields=bodyText,wordcount,byline&show-tags=all&api-key={self.api_key}")
+
     def get_total_pages(self, query):
         """
         Fetches the total number of pages of articles that match the query.
@@ -87,74 +137,229 @@ class GuardianScraper:
         Returns:
         - int: Total number of result pages.
         """
-        url = (f"{self.base_url}q={query}&section={self.section}&type=article"
-               f"&from-date={self.from_date}&to-date={self.to_date}&order-by=newest"
-               f"&page-size=100&page=1&show-fields=bodyText,wordcount,byline&show-tags=all&api-key={self.api_key}")
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            return data['response'].get('pages', 0)
-        return 0
+        data = self.get_article_data(query, 1)
+        return data['response'].get('pages', 0) if data else 0
 
-    def get_article_data(self, query, page):
+    def get_article_data(self, query, page, from_date=None, to_date=None):
         """
         Retrieves article data for a given search query and page number.
         
         Parameters:
         - query (str): Search keyword.
         - page (int): Page number of search results.
+        - from_date, to_date (str): Optional window overriding the scraper's date range.
         
         Returns:
         - dict or None: JSON response containing article data or None if request fails.
         """
-        url = (f"{self.base_url}q={query}&section={self.section}&type=article"
-               f"&from-date={self.from_date}&to-date={self.to_date}&order-by=newest"
-               f"&page-size=100&page={page}&show-fields=bodyText,wordcount,byline&show-tags=all&api-key={self.api_key}")
-        response = requests.get(url)
+        if self._session is None:
+            self._session = requests.Session()  # Keep-alive connection reused across pages
+        response = self._session.get(self.page_url(query, page, from_date, to_date))
+        self.stats["pages"] += 1
         if response.status_code == 200:
             return response.json()
         return None
 
+    def start_run(self, conn):
+        """Resets the run statistics and loads the ids of articles already in the database."""
+        self.stats.update(pages=0, fetched=0, new=0, seconds=0.0)
+        self._progress = {}
+        cursor = conn.execute("SELECT guardian_id FROM articles WHERE guardian_id IS NOT NULL;")
+        self.seen_ids = {row[0] for row in cursor}
+
+    def plan_query(self, conn, query):
+        """
+        Opens (or resumes) the crawl window of `query`.
+
+        Returns:
+        - dict or None: The window dates, the first page still to fetch and the page count
+          (None until page 1 is fetched), or None if the query is already up to date.
+        """
+        with conn:
+            window = open_window(conn, CRAWL_SOURCE, query, self.from_date, self.to_date)
+        if window is None:
+            return None
+        from_date, to_date, next_page, pages = window
+        if pages is None:
+            next_page = 1  # The page count comes with page 1
+        if next_page > 1:
+            print(f"Resuming '{query}' ({from_date} to {to_date}) at page {next_page} of {pages}.")
+        progress = {"from_date": from_date, "to_date": to_date, "next_page": next_page, "pages": pages, "done": set()}
+        self._progress[query] = progress
+        return progress
+
+    def advance_cursor(self, conn, query, page):
+        """
+        Records `page` of `query` as stored. The cursor only moves past pages that are stored
+        contiguously, and the window is closed once every page is in.
+        """
+        progress = self._progress[query]
+        progress["done"].add(page)
+        while progress["next_page"] in progress["done"]:
+            progress["next_page"] += 1
+        advance_page(conn, CRAWL_SOURCE, query, progress["next_page"], progress["pages"])
+        if progress["next_page"] > progress["pages"]:
+            close_window(conn, CRAWL_SOURCE, query)
+
+    def store_results(self, conn, results, query=None, page=None):
+        """
+        Inserts one page of Content API results into the articles table in a single transaction.
+        Articles are deduplicated by Guardian content id across every query of the run; the
+        INSERT OR IGNORE also skips rows whose title or URL is already stored. With `query` and
+        `page`, the crawl cursor is advanced in the same transaction.
+
+        Returns:
+        - list: The (id, body_text, publish_date) rows of the newly stored articles, when
+          on_new_articles is set (the caller hands them over); otherwise empty.
+        """
+        self.stats["fetched"] += len(results)
+        rows = []
+        for result in results:
+            guardian_id = result.get("id")
+            if guardian_id in self.seen_ids:
+                continue
+            self.seen_ids.add(guardian_id)
+
+            fields = result.get("fields", {})
+            rows.append((
+                guardian_id,
+                result.get("webTitle", "N/A"),
+                fields.get("byline", "N/A"),
+                result.get("sectionName", "N/A"),
+                result.get("webPublicationDate", "N/A"),
+                result.get("webUrl", "N/A"),
+                fields.get("wordcount", "N/A"),
+                fields.get("bodyText", "No text available"),
+            ))
+
+        with conn:
+            changes_before = conn.total_changes
+            if rows:
+                conn.executemany('''
+                    INSERT OR IGNORE INTO articles (guardian_id, title, author, section, publish_date, url, word_count, body_text)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            self.stats["new"] += conn.total_changes - changes_before
+            if query is not None:
+                self.advance_cursor(conn, query, page)
+
+        if not (self.on_new_articles and rows):
+            return []
+        guardian_ids = [row[0] for row in rows]
+        return conn.execute(f'''
+            SELECT id, body_text, publish_date FROM articles
+            WHERE processed_status IS NULL AND guardian_id IN ({",".join("?" * len(guardian_ids))})
+        ''', guardian_ids).fetchall()
+
+    def hand_off(self, new_articles):
+        """Passes newly stored articles to on_new_articles, if any."""
+        if new_articles:
+            self.on_new_articles(new_articles)
+
+    def report(self):
+        """Prints how many rows the last scrape fetched and how many of them were new."""
+        fetched, new = self.stats["fetched"], self.stats["new"]
+        print(f"Fetched {fetched} rows over {self.stats['pages']} pages in {self.stats['seconds']:.1f}s: "
+              f"{new} new, {fetched - new} duplicates or already stored.")
+
     def scrape_articles(self):
         """
         Scrapes articles related to given queries from The Guardian and stores them in the SQLite database.
-        Avoids storing duplicate articles based on title.
+        Uses the concurrent async mode unless GUARDIAN_SCRAPE_MODE=sync.
         """
+        if SCRAPE_MODE == "async":
+            asyncio.run(self.scrape_articles_async())
+        else:
+            self.scrape_articles_sync()
+
+    def scrape_articles_sync(self):
+        """
+        Scrapes every query page by page, one request at a time. Page 1 is fetched once:
+        its payload supplies both the page count and the first page of results. A query stops
+        at its first failed page, which is where the next run resumes.
+        """
+        started_at = time.perf_counter()
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.start_run(conn)
 
-        for keywords in self.queries.values():
-            for keyword in keywords:
-                search_query = f"Nuclear {keyword}"
-                total_pages = self.get_total_pages(search_query)
-
-                for page in range(1, total_pages + 1):
-                    json_data = self.get_article_data(search_query, page)
-
-                    if json_data and json_data['response']['status'] == 'ok':
-                        results = json_data['response']['results']
-                        
-                        for result in results:
-                            title = result.get("webTitle", "N/A")
-                            author = result.get("fields", {}).get("byline", "N/A")
-                            publish_date = result.get("webPublicationDate", "N/A")
-                            url = result.get("webUrl", "N/A")
-                            word_count = result.get("fields", {}).get("wordcount", "N/A")
-                            body_text = result.get('fields', {}).get('bodyText', 'No text available')
-
-                            # Avoid storing duplicate articles by checking the title
-                            cursor.execute("SELECT id FROM articles WHERE title = ?", (title,))
-                            if cursor.fetchone():
-                                continue
-                            
-                            # Insert new article into the database
-                            cursor.execute('''
-                                INSERT INTO articles (title, author, section, publish_date, url, word_count, body_text)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)
-                            ''', (title, author, result.get("sectionName", "N/A"), publish_date, url, word_count, body_text))
+        for search_query in self.search_queries():
+            progress = self.plan_query(conn, search_query)
+            if progress is None:
+                continue
+            window = (progress["from_date"], progress["to_date"])
+
+            if progress["next_page"] == 1:
+                first_page = self.get_article_data(search_query, 1, *window)
+                if not first_page or first_page['response']['status'] != 'ok':
+                    continue
+                progress["pages"] = first_page['response'].get('pages', 0)
+                self.hand_off(self.store_results(conn, first_page['response']['results'], search_query, 1))
+
+            for page in range(progress["next_page"], progress["pages"] + 1):
+                json_data = self.get_article_data(search_query, page, *window)
+                if not json_data or json_data['response']['status'] != 'ok':
+                    break
+                self.hand_off(self.store_results(conn, json_data['response']['results'], search_query, page))
+
+        conn.close()
+        self.stats["seconds"] = time.perf_counter() - started_at
+        self.report()
+
+    async def scrape_articles_async(self, concurrency=None, requests_per_minute=None):
+        """
+        Scrapes every query concurrently over one pooled HTTP client. Page 1 of each query is
+        fetched first (its payload is reused for the page count and results), then the remaining
+        pages of all queries are fetched with up to `concurrency` requests in flight, under a
+        requests-per-minute limit. Pages are written as they arrive; a failed page holds the
+        query's cursor there for the next run.
+        """
+        concurrency = concurrency or SCRAPE_CONCURRENCY
+        limiter = RateLimiter(requests_per_minute or SCRAPE_RPM)
+        semaphore = asyncio.Semaphore(concurrency)
+        started_at = time.perf_counter()
+        conn = sqlite3.connect(self.db_path)
+        self.start_run(conn)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+            async def fetch(query, page):
+                progress = self._progress[query]
+                async with semaphore:
+                    await limiter.acquire()
+                    try:
+                        response = await client.get(self.page_url(query, page, progress["from_date"], progress["to_date"]))
+                    except httpx.HTTPError as e:
+                        print(f"Error fetching '{query}' page {page}: {e}")
+                        return None
+                self.stats["pages"] += 1
+                if response.status_code != 200:
+                    return None
+                data = response.json()
+                if data['response']['status'] != 'ok':
+                    return None
+                if page == 1:
+                    progress["pages"] = data['response'].get('pages', 0)
+                new_articles = self.store_results(conn, data['response']['results'], query, page)
+                if new_articles:
+                    # on_new_articles may block (the pipeline's bounded queue); run it off the
+                    # event loop so the other fetches keep going meanwhile
+                    await asyncio.get_running_loop().run_in_executor(None, self.hand_off, new_articles)
+                return data
+
+            async def scrape_query(query):
+                progress = self.plan_query(conn, query)
+                if progress is None:
+                    return
+                if progress["next_page"] == 1 and await fetch(query, 1) is None:
+                    return
+                pages = range(progress["next_page"], progress["pages"] + 1)
+                await asyncio.gather(*(fetch(query, page) for page in pages))
+
+            await asyncio.gather(*(scrape_query(query) for query in self.search_queries()))
 
-        conn.commit()
         conn.close()
+        self.stats["seconds"] = time.perf_counter() - started_at
+        self.report()
 
 # Example usage
 if __name__ == "__main__":
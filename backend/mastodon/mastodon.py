@@ -3,17 +3,24 @@ import sqlite3
 import numpy as np
 import pandas as pd
 import ast
-import torch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from common.models import get_classifier, id2label
+from common import warmup
+from common.etag import conditional, db_version
+from common.responses import FastJSONResponse, json_response
+from common.change_seq import current_cursor, deleted_since, track_changes
+from common.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from common.post_metrics import averages, period_boundaries, sentiment_trends
+from common.batching import get_batcher
+from common.sharded import LABEL_WORKERS, label_texts
 
 warnings.filterwarnings("ignore")
 
 # --- Step 1: Create FastAPI application ---
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -55,40 +62,23 @@ def init_db():
             predicted_label TEXT
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at, id)")
     conn.commit()
+    track_changes(conn, "posts", ["true_label", "predicted_label"])
     conn.close()
 
 init_db()
 
 
-# --- Step 3: Load BERT checkpoint and model ---
-checkpoint = 'kumo24/bert-sentiment-nuclear'
-tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-
-id2label = {0: "negative", 1: "neutral", 2: "positive"}
-label2id = {"negative": 0, "neutral": 1, "positive": 2}
-
-model = AutoModelForSequenceClassification.from_pretrained(
-    checkpoint,
-    num_labels=3,
-    id2label=id2label,
-    label2id=label2id
-)
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# --- Step 3: The shared BERT classifier is loaded lazily by get_classifier() ---
 
 # --- Step 4: Function to classify text ---
+def classify_text_async(text):
+    """Queues text on the shared micro-batcher; returns a Future for its label."""
+    return get_batcher().submit(text)
+
 def classify_text(text):
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predicted_class = torch.argmax(outputs.logits, dim=1).item()
-    return id2label[predicted_class]
+    return classify_text_async(text).result()
 
 def load_and_combine_data():
     train = pd.read_csv('./mastodon/training_mastodon.csv', quotechar='"')
@@ -96,50 +86,35 @@ def load_and_combine_data():
     all_data = pd.concat([train, test], ignore_index=True)
     return all_data
 
-def get_sentiment_trends(df):
-    df['created_at'] = pd.to_datetime(df['created_at'])
-
-    date_range = pd.date_range(start='2023-01-01', end='2024-12-31', freq='2M').tz_localize('UTC')
-
-    trends = {"time_periods": [], "positive": [], "negative": [], "neutral": []}
-
-    for i in range(len(date_range) - 1):
-        start_date = date_range[i]
-        end_date = date_range[i + 1]
+# Two-month periods of the sentiment trend chart
+TREND_BOUNDARIES = period_boundaries(datetime(2023, 1, 1).date(), datetime(2024, 12, 31).date())
 
-        period_df = df[(df['created_at'] >= start_date) & (df['created_at'] < end_date)]
+# Columns the /posts endpoint serves; the raw account and media strings only on request
+POST_FIELDS = ["id", "created_at", "content", "language", "visibility", "replies_count", "reblogs_count",
+               "favourites_count", "true_label", "predicted_label", "sensitive", "account", "media_attachments"]
+DEFAULT_POST_FIELDS = POST_FIELDS[:-2]
+POST_ORDERS = ["created_at"]
 
-        sentiment_counts = period_df['predicted_label'].value_counts()
-
-        trends["time_periods"].append(f"{start_date.strftime('%Y-%m')}-{end_date.strftime('%Y-%m')}")
-        trends["positive"].append(int(sentiment_counts.get(2, 0)))
-        trends["negative"].append(int(sentiment_counts.get(0, 0)))
-        trends["neutral"].append(int(sentiment_counts.get(1, 0)))
-
-    return trends
-
-def calculate_averages(df):
-  return {
-      "avg_comments": round(df['replies_count'].mean(), 2),
-      "avg_reposts": round(df['reblogs_count'].mean(), 2),
-      "avg_likes": round(df['favourites_count'].mean(), 2)
-  }
-  
-def calculate_sensitive_proportion(df):
-    return round(df['sensitive'].mean() * 100, 2)
+def calculate_metrics(conn):
+    """Averages, sensitive and media shares and sentiment trends, computed from the posts table."""
+    sensitive, media = conn.execute("SELECT AVG(sensitive), AVG(media_attachments != '[]') FROM posts").fetchone()
+    return {
+        "averages": averages(conn, "posts", {
+            "replies": "replies_count",
+            "reblogs": "reblogs_count",
+            "favourites": "favourites_count",
+        }),
+        "sensitive_proportion": sensitive,
+        "media_proportion": media,
+        "sentiment_trends": sentiment_trends(conn, "posts", TREND_BOUNDARIES, date_column="created_at",
+                                             label_column="predicted_label"),
+    }
 
 # --- Step 5: Populate database with sentiment analysis results ---
 def batch_classify_texts(texts, batch_size=32):
-    results = []
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i+batch_size]
-        inputs = tokenizer(batch_texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        with torch.no_grad():
-            outputs = model(**inputs)
-            preds = torch.argmax(outputs.logits, dim=1).cpu().numpy()
-        results.extend([id2label[p] for p in preds])
-    return results
+    if LABEL_WORKERS > 1:
+        return label_texts(texts, workers=LABEL_WORKERS)
+    return get_classifier().classify_batch(texts, batch_size=batch_size)
 
 
 def populate_db():
@@ -213,7 +188,21 @@ def populate_db():
     conn.close()
     print("database populated successfully!")
 
-populate_db()
+def has_data():
+    """True if the database already holds a populated snapshot that can be served."""
+    conn = sqlite3.connect("./mastodon/mastodon.db")
+    c = conn.cursor()
+    c.execute("SELECT EXISTS (SELECT 1 FROM posts)")
+    populated = c.fetchone()[0]
+    conn.close()
+    return bool(populated)
+
+# Model loading and first-time population run in the background warm-up task
+warmup.register("mastodon", populate_db)
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
 
 # --- Step 6: FastAPI routes ---
 # @app.get("/", response_class=HTMLResponse)
@@ -230,54 +219,77 @@ populate_db()
 #     return HTMLResponse(content=html_content)
 
 @app.get("/")
-def get_posts():
+def get_posts(request: Request, response: Response, since: int = None):
+    """
+    All posts plus metrics and a change cursor. With `since` (a cursor from an earlier
+    response), only posts inserted or relabeled after it are sent, plus the ids of deleted ones.
+    """
+    # Until warm-up finishes, serve the last populated snapshot if there is one
+    if not warmup.is_ready("mastodon") and not has_data():
+        return warmup.warming_response("mastodon")
+
+    # Unchanged since the client's last poll: skip building the payload
+    unchanged = conditional(request, response, db_version("./mastodon/mastodon.db"))
+    if unchanged is not None:
+        return unchanged
+
     conn = sqlite3.connect("./mastodon/mastodon.db")
-    c = conn.cursor()
-    df = pd.read_sql_query("""
+    cursor = current_cursor(conn)
+    df = pd.read_sql_query(f"""
         SELECT id, created_at, content, language, visibility, replies_count,
                reblogs_count, favourites_count, true_label, predicted_label, account,
                media_attachments, sensitive
-        FROM posts
-    """, conn)
-
+        FROM posts {"WHERE change_seq > ?" if since is not None else ""}
+    """, conn, params=() if since is None else (since,))
+    deleted = deleted_since(conn, "posts", since) if since is not None else None
+    metrics = calculate_metrics(conn)
     conn.close()
 
-    # Convert date
-    df['created_at'] = pd.to_datetime(df['created_at'])
-
-    # Basic results
+    # Basic results; the metrics cover every post. created_at is sent as stored, like /posts
     results = df.to_dict(orient='records')
 
-    # --- METRICS ---
-
-    # Averages
-    averages = {
-        "replies": df["replies_count"].mean(),
-        "reblogs": df["reblogs_count"].mean(),
-        "favourites": df["favourites_count"].mean()
+    payload = {
+        "results": results,
+        "metrics": metrics,
+        "cursor": cursor
     }
+    if since is not None:
+        payload["deleted"] = deleted
+    return json_response(payload, response)
+
+@app.get("/posts")
+def list_posts(request: Request, response: Response, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+               fields: str = None, order: str = "created_at"):
+    """
+    One page of posts, read in index order. `fields` picks columns (comma-separated; account
+    and media_attachments only when asked for), `order` is created_at or -created_at, and
+    `cursor` is the next_cursor of the previous page. Posts without a created_at are
+    included, first ascending and last descending.
+    """
+    if not warmup.is_ready("mastodon") and not has_data():
+        return warmup.warming_response("mastodon")
+    unchanged = conditional(request, response, db_version("./mastodon/mastodon.db"))
+    if unchanged is not None:
+        return unchanged
 
-    # Sensitive proportion
-    sensitive_proportion = df['sensitive'].mean()
-
-    # Media proportion
-    def has_media(media):
-        return media != "[]"
+    conn = sqlite3.connect("./mastodon/mastodon.db")
+    page = fetch_page(conn, "posts", POST_FIELDS, POST_ORDERS, fields, order, limit, cursor,
+                      default_fields=DEFAULT_POST_FIELDS)
+    conn.close()
+    return page
 
-    df['has_media'] = df['media_attachments'].apply(has_media)
-    media_proportion = df['has_media'].mean()
-        
-    # Sentiment trends
-    sentiment_trends = get_sentiment_trends(df)
+@app.get("/metrics")
+def get_metrics(request: Request, response: Response):
+    """The aggregate metrics block on its own, for the charts."""
+    if not warmup.is_ready("mastodon") and not has_data():
+        return warmup.warming_response("mastodon")
+    unchanged = conditional(request, response, db_version("./mastodon/mastodon.db"))
+    if unchanged is not None:
+        return unchanged
 
-    return {
-        "results": results,
-        "metrics": {
-            "averages": averages,
-            "sensitive_proportion": sensitive_proportion,
-            "media_proportion": media_proportion,
-            "sentiment_trends": sentiment_trends
-        }
-    }
+    conn = sqlite3.connect("./mastodon/mastodon.db")
+    metrics = calculate_metrics(conn)
+    conn.close()
+    return metrics
 
 # Run the app with: uvicorn mastodon:app --reload
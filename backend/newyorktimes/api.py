@@ -214,15 +214,23 @@
 
 # if __name__ == "__main__":
 #     app.run(debug=True)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+import os
 import sqlite3
+import sys
 import re
 from collections import Counter
 import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.etag import conditional, db_version
+from common.change_seq import current_cursor, deleted_since, track_changes
+from common.compression import CompressionMiddleware
+from common.responses import FastJSONResponse
+
 # =================== FastAPI Initialization ===================
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # If you need CORS settings, you can allow all origins or specific domains:
 app.add_middleware(
@@ -231,9 +239,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Change-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
 
 DB_PATH = "var/dashdb.sqlite3"  # Path to your SQLite database file
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+
+
+def apply_migrations(conn):
+    """
+    Applies the sql/migrations/NNN_*.sql files numbered above the database's user_version,
+    each in its own transaction, as bin/dashdb migrate does.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        number = int(name.split("_")[0])
+        if number <= version:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+            script = f.read()
+        conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+        print(f"Applied migration {name}")
+
+
+@app.on_event("startup")
+def install_change_tracking():
+    """
+    Brings the schema up to date and installs the change-sequence triggers so every writer
+    stamps the records it touches.
+    """
+    if os.path.exists(DB_PATH):
+        conn = sqlite3.connect(DB_PATH)
+        apply_migrations(conn)
+        track_changes(conn, "records", ["label"])
+        conn.close()
 
 # ========== Utility functions for DB connection & date handling ==========
 
@@ -267,22 +307,41 @@ def get_year_month_str(year, month):
     """
     return f"{year:04d}-{month:02d}"
 
+
+def not_modified(request: Request, response: Response):
+    """
+    Tags the response with the current data version: the database's last write plus today's
+    date (month offsets are relative to today). Returns a 304 if the client already has it.
+    """
+    return conditional(request, response, db_version(DB_PATH), datetime.date.today())
+
 # ========== 1) GET /api/posts/recent ==========
 
 
 @app.get("/api/posts/recent")
-def get_recent_posts():
+def get_recent_posts(request: Request, response: Response, since: int = None):
     """
     Returns the most recent 50 posts, including date, content, and label.
+    The change cursor is sent in the X-Change-Cursor header.
+
+    With `since` (an earlier cursor), returns {"posts", "ids", "deleted", "metrics", "cursor"}:
+    `posts` holds those of the 50 that were inserted or relabeled after the cursor, and `ids`
+    the ids of the current 50, newest first. A client merges `posts` into its copy by id and
+    then keeps exactly the rows in `ids`, in that order, which drops posts pushed out of the
+    window. If records were deleted since the cursor, older posts may have moved back into
+    the window, so `posts` then holds all 50.
     """
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
     conn = get_db_connection()
+    cursor = current_cursor(conn)
     rows = conn.execute("""
-        SELECT id, date, content, label
+        SELECT id, date, content, label, change_seq
         FROM records
         ORDER BY date DESC
         LIMIT 50
     """).fetchall()
-    conn.close()
 
     result = []
     for row in rows:
@@ -292,17 +351,29 @@ def get_recent_posts():
             "content": row["content"],
             "label": row["label"]
         })
-    return result
+
+    response.headers["X-Change-Cursor"] = str(cursor)
+    if since is None:
+        conn.close()
+        return result
+    deleted = deleted_since(conn, "records", since)
+    delta = {
+        "posts": result if deleted else [post for post, row in zip(result, rows) if row["change_seq"] > since],
+        "ids": [post["id"] for post in result],
+        "deleted": deleted,
+        "metrics": read_metrics(conn),
+        "cursor": cursor
+    }
+    conn.close()
+    return delta
 
 # ========== 2) GET /api/metrics ==========
 
 
-@app.get("/api/metrics")
-def get_metrics():
+def read_metrics(conn):
     """
     Returns total post count and the counts of positive, negative, and neutral posts.
     """
-    conn = get_db_connection()
     row = conn.execute("""
         SELECT
             COUNT(*) as totalPosts,
@@ -311,7 +382,6 @@ def get_metrics():
             SUM(CASE WHEN label=1 THEN 1 ELSE 0 END) as neutralCount
         FROM records
     """).fetchone()
-    conn.close()
 
     # If no records exist, row might be None or all zeros
     if row is None:
@@ -330,11 +400,73 @@ def get_metrics():
     }
     return result
 
-# ========== 3) GET /api/sentiment/{which_month} ==========
+
+@app.get("/api/metrics")
+def get_metrics(request: Request, response: Response):
+    """
+    Returns total post count and the counts of positive, negative, and neutral posts.
+    """
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+    conn = get_db_connection()
+    result = read_metrics(conn)
+    conn.close()
+    return result
+
+# ========== 3) GET /api/sentiment/range ==========
+# Declared before /api/sentiment/{which_month}, which would otherwise match "range"
+
+
+@app.get("/api/sentiment/range")
+def get_sentiment_range(request: Request, response: Response, start: int = 0, end: int = 12):
+    """
+    Returns sentiment stats for every month offset from `start` to `end` (0 = current month,
+    12 = 12 months ago) in one query, oldest month first. Months without records are
+    included with zero counts. Each item has the same fields as /api/sentiment/{which_month}.
+    """
+    if not (0 <= start <= end <= 12):
+        raise HTTPException(
+            status_code=400, detail="Month offsets must satisfy 0 <= start <= end <= 12")
+
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
+    months = [compute_year_month_by_offset(offset) for offset in range(end, start - 1, -1)]
+
+    # One range read of the (year_month, label) index for the whole window
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT
+            year_month as yearMonth,
+            SUM(CASE WHEN label=2 THEN 1 ELSE 0 END) as positiveCount,
+            SUM(CASE WHEN label=0 THEN 1 ELSE 0 END) as negativeCount,
+            SUM(CASE WHEN label=1 THEN 1 ELSE 0 END) as neutralCount
+        FROM records
+        WHERE year_month >= ? AND year_month <= ?
+        GROUP BY year_month
+    """, (get_year_month_str(*months[0]), get_year_month_str(*months[-1]))).fetchall()
+    conn.close()
+
+    counts = {row["yearMonth"]: row for row in rows}
+    result = []
+    for year, month in months:
+        row = counts.get(get_year_month_str(year, month))
+        result.append({
+            "year": year,
+            "month": month,
+            "positive": row["positiveCount"] if row else 0,
+            "negative": row["negativeCount"] if row else 0,
+            "neutral": row["neutralCount"] if row else 0
+        })
+    return result
+
+# ========== 4) GET /api/sentiment/{which_month} ==========
 
 
 @app.get("/api/sentiment/{which_month}")
-def get_sentiment_by_month(which_month: int):
+def get_sentiment_by_month(which_month: int, request: Request, response: Response):
     """
     Returns sentiment stats for a specific month offset:
       - which_month=0 => current month
@@ -346,6 +478,10 @@ def get_sentiment_by_month(which_month: int):
         raise HTTPException(
             status_code=400, detail="Month offset must be between 0 and 12")
 
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
+
     # Compute target (year, month)
     year, month = compute_year_month_by_offset(which_month)
     ym_str = get_year_month_str(year, month)  # e.g. '2024-08'
@@ -357,7 +493,7 @@ def get_sentiment_by_month(which_month: int):
             SUM(CASE WHEN label=0 THEN 1 ELSE 0 END) as negativeCount,
             SUM(CASE WHEN label=1 THEN 1 ELSE 0 END) as neutralCount
         FROM records
-        WHERE substr(date,1,7) = ?
+        WHERE year_month = ?
     """, (ym_str, )).fetchone()
     conn.close()
 
@@ -379,16 +515,19 @@ def get_sentiment_by_month(which_month: int):
     }
     return result
 
-# ========== 4) GET /api/sentiment/keyword ==========
+# ========== 5) GET /api/sentiment/keyword ==========
 
 
 @app.get("/api/keyword")
-def get_keywords_by_sentiment():
+def get_keywords_by_sentiment(request: Request, response: Response):
     """
     Looks at the last 12 months of records, obtains the most frequent words
     (excluding stopwords) for each label=0,1,2.
     Returns the top words for negative, neutral, and positive posts.
     """
+    unchanged = not_modified(request, response)
+    if unchanged is not None:
+        return unchanged
     conn = get_db_connection()
 
     now = datetime.date.today()
@@ -401,8 +540,8 @@ def get_keywords_by_sentiment():
         SELECT content, label
         FROM records
         WHERE label IN (0,1,2)
-        AND substr(date,1,7) >= ?
-        AND substr(date,1,7) <= ?
+        AND year_month >= ?
+        AND year_month <= ?
     """, (past_ym, now_ym)).fetchall()
     conn.close()
 
@@ -0,0 +1,199 @@
+"""
+Backfills NYT "nuclear" coverage over an arbitrary date range.
+
+The range is split into windows of `--window-days` days. A window with more hits than the
+Article Search API will page through (1,000) is split in half until it fits. Several
+workers fetch windows at once while sharing the API rate limit. Every page is checkpointed
+in the backfill_windows table together with its articles, so re-running the command resumes
+where it stopped.
+
+Run from the newyorktimes directory:
+    python backfill.py 2021-04-01 2025-03-01 --window-days 7 --workers 4
+"""
+import argparse
+import datetime
+import math
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from collect_articles import (AZURE_OPENAI_KEY, DB_PATH, NYT_API_KEY, NYT_MAX_PAGES, NYT_PAGE_SIZE,
+                              ArticleSearcher, label_nuclear_attitude_bert)
+from common.change_seq import track_changes
+
+# Most results the API will page through for one search
+RESULT_CAP = NYT_PAGE_SIZE * NYT_MAX_PAGES
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS backfill_windows (
+        begin_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        hits INTEGER,
+        pages INTEGER,
+        next_page INTEGER NOT NULL DEFAULT 1,
+        inserted INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (begin_date, end_date)
+    )
+"""
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _days(begin, end):
+    return [begin + datetime.timedelta(days=i) for i in range((end - begin).days + 1)]
+
+
+def plan_windows(conn, start, end, window_days=7):
+    """
+    Returns the (begin, end) windows still to fetch between `start` and `end`.
+
+    Windows left pending by an earlier run are resumed. Days that no pending or finished
+    window covers are grouped into new windows of up to `window_days` days.
+    """
+    conn.execute(SCHEMA)
+    covered = set()
+    for begin, stop in conn.execute("SELECT begin_date, end_date FROM backfill_windows WHERE status != 'split'"):
+        covered.update(_days(datetime.date.fromisoformat(begin), datetime.date.fromisoformat(stop)))
+
+    new_windows, run = [], []
+    for day in _days(start, end) + [None]:
+        # Close the current run of uncovered days at a covered day, the window size or the end
+        if run and (day is None or day in covered or len(run) == window_days):
+            new_windows.append((run[0].isoformat(), run[-1].isoformat()))
+            run = []
+        if day is not None and day not in covered:
+            run.append(day)
+
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO backfill_windows (begin_date, end_date, updated_at) VALUES (?, ?, ?)",
+                         [(begin, stop, _now()) for begin, stop in new_windows])
+    rows = conn.execute("""
+        SELECT begin_date, end_date FROM backfill_windows
+        WHERE status = 'pending' AND begin_date <= ? AND end_date >= ?
+        ORDER BY begin_date
+    """, (end.isoformat(), start.isoformat())).fetchall()
+    return [(datetime.date.fromisoformat(begin), datetime.date.fromisoformat(stop)) for begin, stop in rows]
+
+
+def backfill_window(searcher, db_path, begin, end):
+    """
+    Fetches, summarizes and stores every page of one window, resuming at its checkpoint.
+
+    Returns:
+    - dict: Pages fetched, articles inserted and whether a request failed, plus the two
+      halves under "split" if the window had too many hits and was split instead.
+    """
+    result = {"pages": 0, "inserted": 0, "failed": False, "split": None}
+    key = (begin.isoformat(), end.isoformat())
+    conn = sqlite3.connect(db_path, timeout=30)
+    page, pages = conn.execute(
+        "SELECT next_page, pages FROM backfill_windows WHERE begin_date = ? AND end_date = ?", key
+    ).fetchone()
+    if pages is None:
+        page = 1  # The page count comes with page 1
+
+    try:
+        while pages is None or page <= pages:
+            try:
+                articles, hits = searcher.search_page(begin, end, page - 1)
+            except Exception as e:
+                print(f"[Backfill] {begin} to {end} page {page} failed: {e}. Re-run to resume.")
+                result["failed"] = True
+                break
+            result["pages"] += 1
+
+            if pages is None:
+                if hits > RESULT_CAP and begin < end:
+                    middle = begin + datetime.timedelta(days=(end - begin).days // 2)
+                    halves = [(begin, middle), (middle + datetime.timedelta(days=1), end)]
+                    with conn:
+                        conn.execute("""
+                            UPDATE backfill_windows SET status = 'split', hits = ?, updated_at = ?
+                            WHERE begin_date = ? AND end_date = ?
+                        """, (hits, _now(), *key))
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO backfill_windows (begin_date, end_date, updated_at) VALUES (?, ?, ?)",
+                            [(b.isoformat(), e.isoformat(), _now()) for b, e in halves])
+                    result["split"] = halves
+                    return result
+                if hits > RESULT_CAP:
+                    print(f"[Backfill] Warning: {hits} hits on {begin}; only the first {RESULT_CAP} can be paged.")
+                pages = min(math.ceil(hits / NYT_PAGE_SIZE), NYT_MAX_PAGES)
+
+            rows = searcher.summarize_articles(articles)
+            with conn:
+                conn.executemany("INSERT INTO records (date, content) VALUES (?, ?)", rows)
+                conn.execute("""
+                    UPDATE backfill_windows
+                    SET hits = ?, pages = ?, next_page = ?, inserted = inserted + ?, updated_at = ?,
+                        status = CASE WHEN ? > ? THEN 'done' ELSE status END
+                    WHERE begin_date = ? AND end_date = ?
+                """, (hits, pages, page + 1, len(rows), _now(), page + 1, pages, *key))
+            result["inserted"] += len(rows)
+            page += 1
+    finally:
+        conn.close()
+    return result
+
+
+def run_backfill(start, end, db_path=DB_PATH, window_days=7, workers=4, searcher=None):
+    """
+    Backfills `start` through `end` with `workers` windows in flight at once.
+
+    Returns:
+    - dict: Windows completed, split and failed, pages fetched, articles inserted and elapsed seconds.
+    """
+    searcher = searcher or ArticleSearcher(nyt_api_key=NYT_API_KEY, azure_openai_key=AZURE_OPENAI_KEY)
+    conn = sqlite3.connect(db_path)
+    track_changes(conn, "records", ["label"])
+    windows = plan_windows(conn, start, end, window_days)
+    conn.close()
+    print(f"[Backfill] {len(windows)} windows to fetch from {start} to {end} with {workers} workers.")
+
+    stats = {"windows": 0, "split": 0, "failed": 0, "pages": 0, "inserted": 0, "seconds": 0.0}
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(backfill_window, searcher, db_path, begin, stop) for begin, stop in windows}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                stats["pages"] += result["pages"]
+                stats["inserted"] += result["inserted"]
+                if result["split"]:
+                    stats["split"] += 1
+                    pending |= {pool.submit(backfill_window, searcher, db_path, begin, stop)
+                                for begin, stop in result["split"]}
+                elif result["failed"]:
+                    stats["failed"] += 1
+                else:
+                    stats["windows"] += 1
+    stats["seconds"] = time.perf_counter() - started_at
+
+    rate = stats["inserted"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"[Backfill] {stats['windows']} windows done ({stats['split']} split, {stats['failed']} failed), {stats['pages']} pages, "
+          f"{stats['inserted']} articles in {stats['seconds']:.1f}s ({rate:.2f} articles/s).")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("start", type=datetime.date.fromisoformat, help="First day, YYYY-MM-DD")
+    parser.add_argument("end", type=datetime.date.fromisoformat, help="Last day, YYYY-MM-DD")
+    parser.add_argument("--window-days", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--label", action="store_true", help="Label the new records with BERT afterwards")
+    args = parser.parse_args()
+
+    run_backfill(args.start, args.end, args.db, args.window_days, args.workers)
+    if args.label:
+        label_nuclear_attitude_bert()
+
+
+if __name__ == "__main__":
+    main()
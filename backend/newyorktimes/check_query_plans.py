@@ -0,0 +1,79 @@
+"""
+Checks that every query the API runs reads its tables through an index.
+
+Starts the API against var/dashdb.sqlite3 (which applies pending migrations), calls each
+endpoint, records the SQL it executes (with the parameters bound), and runs EXPLAIN QUERY
+PLAN on each SELECT. A full table scan ("SCAN <table>") fails the check, and so does a full
+walk of a non-covering index ("SCAN <table> USING INDEX") unless the query has a LIMIT to
+stop it early. Exits with 1 on any failure.
+
+Run from backend/newyorktimes/ (bin/dashdb explain does this):
+    python check_query_plans.py
+"""
+import re
+import sqlite3
+import sys
+from fastapi.testclient import TestClient
+
+import api
+
+ENDPOINTS = [
+    "/api/posts/recent",
+    "/api/posts/recent?since=0",
+    "/api/metrics",
+    "/api/sentiment/range?start=0&end=12",
+    "/api/sentiment/0",
+    "/api/keyword",
+]
+
+
+def full_scans(conn, sql, tables):
+    """Plan steps of `sql` that read all of one of `tables`."""
+    steps = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    limited = re.search(r"\bLIMIT\b", sql, re.IGNORECASE) is not None
+    scans = []
+    for step in steps:
+        match = re.match(r"SCAN (\w+)( USING (COVERING )?INDEX)?", step)
+        if not match or match.group(1) not in tables or match.group(3):
+            continue
+        if match.group(2) is None or not limited:
+            scans.append(step)
+    return steps, scans
+
+
+def main():
+    statements = []
+    connect = api.get_db_connection
+
+    def traced_connection():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    api.get_db_connection = traced_connection
+    with TestClient(api.app) as client:
+        for path in ENDPOINTS:
+            response = client.get(path)
+            if response.status_code != 200:
+                print(f"{path} returned {response.status_code}: {response.text}")
+                return 1
+
+    conn = sqlite3.connect(api.DB_PATH)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    failed = 0
+    for sql in dict.fromkeys(statements):
+        if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            continue
+        steps, scans = full_scans(conn, sql, tables)
+        failed += bool(scans)
+        print(f"{'FAIL' if scans else 'OK'}  {' '.join(sql.split())[:100]}")
+        for step in steps:
+            print(f"      {step}")
+    conn.close()
+
+    print(f"{failed} of the API's queries scan a table without an index." if failed else "Every API query uses an index.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
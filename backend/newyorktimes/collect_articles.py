@@ -1,68 +1,74 @@
 import datetime
+import math
 import sqlite3
 
-import torch
+import httpx
 import pandas as pd
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pynytimes import NYTAPI
 from openai import AzureOpenAI
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import time
 import os
+import sys
 import schedule
 from dotenv import load_dotenv
 
+# The collector runs from newyorktimes/, so make the shared backend modules importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.models import label2id
+from common.batching import get_batcher
+from common.sharded import LABEL_WORKERS, iter_labeled_rows
+from common.batch_writer import BatchWriter
+from common.crawl_state import init_crawl_state, open_window, advance_page, close_window
+from common.change_seq import track_changes
+
 DB_PATH = "var/dashdb.sqlite3"
 
 NYT_API_KEY = os.getenv("NYT_API_KEY")
 AZURE_OPENAI_KEY = os.getenv("AZURE_OPENAI_KEY")
+AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", "https://api.umgpt.umich.edu/azure-openai-api")
 
-checkpoint = 'kumo24/bert-sentiment-nuclear'
-tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-
-# If the tokenizer has no pad token, add '[PAD]'
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-
-id2label = {0: "negative", 1: "neutral", 2: "positive"}
-label2id = {"negative": 0, "neutral": 1, "positive": 2}
+# Articles summarized in parallel per result page
+SUMMARIZE_CONCURRENCY = int(os.getenv("NYT_SUMMARIZE_CONCURRENCY", "8"))
+GPT_ERROR_SUMMARY = "(GPT error) Unable to summarize."
 
-model = AutoModelForSequenceClassification.from_pretrained(
-    checkpoint,
-    num_labels=3,
-    id2label=id2label,
-    label2id=label2id
-)
+# Article Search API, paged directly so the crawl can resume at a page
+NYT_SEARCH_URL = os.getenv("NYT_SEARCH_URL", "https://api.nytimes.com/svc/search/v2/articlesearch.json")
+# The API allows 5 requests per minute
+NYT_REQUEST_INTERVAL = float(os.getenv("NYT_REQUEST_INTERVAL", "12"))
+NYT_PAGE_SIZE = 10
+NYT_MAX_PAGES = 100  # The API will not page past 1,000 results
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# Key of the NYT crawl in the crawl_state table
+CRAWL_SOURCE = "nyt"
+CRAWL_QUERY = 'nuclear|body:("nuclear")'
 
 
 def classify_text(text: str) -> str:
     """
     Returns 'negative' / 'neutral' / 'positive'.
     """
-    inputs = tokenizer(text, return_tensors="pt",
-                       padding=True, truncation=True)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-
-    with torch.no_grad():
-        outputs = model(**inputs)
-        pred_idx = torch.argmax(outputs.logits, dim=1).item()
-
-    return id2label[pred_idx]
+    return get_batcher().submit(text).result()
 
 
-def label_nuclear_attitude_bert():
+def label_nuclear_attitude_bert(workers=None):
     """
     Connect to the SQLite database and do the following:
     1. Delete records where content = "Not related." (or similar irrelevant text)
     2. Find all rows with label IS NULL
     3. Use the local BERT model classify_text() to label them (0=negative,1=neutral,2=positive)
     4. Update the database with these labels
+
+    With `workers` > 1 (or LABEL_WORKERS set) step 3 runs on a pool of processes,
+    which is what large backfills should use. Step 4 commits in batches (WRITE_BATCH_ROWS
+    rows or WRITE_BATCH_SECONDS seconds), so an interrupted run keeps what was flushed.
     """
+    workers = workers or LABEL_WORKERS
 
-    # (1) Open the database
-    conn = sqlite3.connect('var/dashdb.sqlite3')
+    # (1) Open the database; label updates and deletions bump the change sequence
+    conn = sqlite3.connect('var/dashdb.sqlite3', check_same_thread=False)
+    track_changes(conn, "records", ["label"])
     c = conn.cursor()
 
     # (2) Remove irrelevant records
@@ -73,6 +79,7 @@ def label_nuclear_attitude_bert():
     """
     c.execute(delete_sql)
     deleted_rows = c.rowcount
+    conn.commit()
     print(f"Deleted {deleted_rows} rows where content='Not related.'")
 
     # (3) Select all rows where label IS NULL
@@ -87,7 +94,6 @@ def label_nuclear_attitude_bert():
 
     if not rows_to_label:
         print("No rows need labeling. Done.")
-        conn.commit()
         conn.close()
         return
 
@@ -98,24 +104,26 @@ def label_nuclear_attitude_bert():
         WHERE id = ?
     """
 
-    # (4) Loop through each row, use local BERT to classify, update DB
-    for row in rows_to_label:
-        row_id, content_text = row
-        try:
-            # Could be 'negative'/'neutral'/'positive'
-            label_str = classify_text(content_text)
-            label_int = label2id[label_str]
-            c.execute(update_sql, (label_int, row_id))
-        except Exception as e:
-            print(f"[BERT Error] row_id={row_id}, error: {e}")
-            # You can decide whether to keep label=NULL or something else if error
-            pass
-
-        # Optional slight delay
-        time.sleep(0.05)
+    with BatchWriter(conn) as writer:
+        if workers > 1:
+            # (4) Label shards in worker processes and write each shard as it arrives
+            for shard in iter_labeled_rows(rows_to_label, workers=workers):
+                writer.add_many(update_sql, [(label2id[label], row_id) for row_id, label, _ in shard])
+        else:
+            # (4) Queue every row on the micro-batcher, then update DB as labels resolve
+            batcher = get_batcher()
+            pending = [(row_id, batcher.submit(content_text)) for row_id, content_text in rows_to_label]
+            for row_id, future in pending:
+                try:
+                    # Could be 'negative'/'neutral'/'positive'
+                    label_str = future.result()
+                    writer.add(update_sql, (label2id[label_str], row_id))
+                except Exception as e:
+                    print(f"[BERT Error] row_id={row_id}, error: {e}")
+                    # You can decide whether to keep label=NULL or something else if error
+                    pass
 
-    # (5) Commit & close
-    conn.commit()
+    # (5) Close
     conn.close()
     print("All done. Database updated with nuclear attitude labels (local BERT).")
 
@@ -168,7 +176,7 @@ def label_nuclear_attitude(azure_api_key: str):
     client = AzureOpenAI(
         api_key=azure_api_key,
         api_version="2024-06-01",
-        azure_endpoint="https://api.umgpt.umich.edu/azure-openai-api",
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
         organization="372598"
     )
 
@@ -225,13 +233,30 @@ def label_nuclear_attitude(azure_api_key: str):
     print("All done. Database updated with nuclear attitude labels.")
 
 
-def gpt_summarize(azure_api_key: str, content_text: str) -> str:
-    gpt_client = AzureOpenAI(
+def create_gpt_client(azure_api_key: str, max_connections: int = SUMMARIZE_CONCURRENCY) -> AzureOpenAI:
+    """
+    AzureOpenAI client whose HTTP connection pool is sized for `max_connections`
+    concurrent requests. Reuse it; every client opens its own connections.
+    """
+    return AzureOpenAI(
         api_key=azure_api_key,
         api_version="2024-06-01",
-        azure_endpoint="https://api.umgpt.umich.edu/azure-openai-api",
-        organization="372598"
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        organization="372598",
+        http_client=httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=60.0
+        )
     )
+
+
+def gpt_summarize(azure_api_key: str, content_text: str, client: AzureOpenAI = None) -> str:
+    """
+    Summarize an article with GPT, focusing on "nuclear". Pass `client` to reuse a
+    pooled client; otherwise a new one is created for this call.
+    """
+    gpt_client = client or create_gpt_client(azure_api_key, max_connections=1)
     system_prompt = (
         "Please analyze the following text (Title, Abstract, Snippet, Lead Paragraph). "
         "If the content is not related to \"nuclear\" at all, output \"Not related\". "
@@ -251,25 +276,39 @@ def gpt_summarize(azure_api_key: str, content_text: str) -> str:
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"[GPT Error] {e}")
-        return "(GPT error) Unable to summarize."
+        return GPT_ERROR_SUMMARY
 
 
 class ArticleSearcher:
-    def __init__(self, nyt_api_key: str, azure_openai_key: str):
+    """
+    Searches NYT for "nuclear" articles, summarizes them with GPT and stores the summaries.
+
+    Attributes:
+    - nyt (NYTAPI): Article Search client.
+    - gpt_client (AzureOpenAI): Shared, connection-pooled client used for every summary.
+    - concurrency (int): Maximum summaries in flight at once.
+    - stats (dict): Throughput and error counters across all collect_* calls.
+    - http (httpx.Client): Keep-alive client for paging the Article Search API directly.
+    """
+
+    def __init__(self, nyt_api_key: str, azure_openai_key: str, concurrency: int = SUMMARIZE_CONCURRENCY):
         self.nyt_api_key = nyt_api_key
         self.azure_openai_key = azure_openai_key
         self.nyt = NYTAPI(nyt_api_key, parse_dates=True)
+        self.concurrency = concurrency
+        self.gpt_client = create_gpt_client(azure_openai_key, max_connections=concurrency)
+        self.stats = {"summarized": 0, "errors": 0, "seconds": 0.0}
+        self._stats_lock = threading.Lock()
+        self.http = httpx.Client(timeout=30.0)
+        self._search_lock = threading.Lock()
+        self._next_search_at = 0.0
 
     def collect_summarized_articles_at_date(self, start_date: datetime.datetime):
         """
         Single call to article_search; set results=500 (up to 500 articles).
         The library auto-paginates with 10 items per page until filled or no more data.
         """
-        # (1) We don't check if DB exists. Just open the connection
-        conn = sqlite3.connect('var/dashdb.sqlite3')
-        c = conn.cursor()
-
-        # (2) Try up to 100 results. The library auto pages
+        # (1) Try up to 100 results. The library auto pages
         articles = self.nyt.article_search(
             query="nuclear",
             results=100,
@@ -283,40 +322,14 @@ class ArticleSearcher:
             }
         )
         print(f"Got {len(articles)} articles from NYT.")
-
-        total_inserted = 0
-        for article in articles:
-            pub_date_str = self._extract_pub_date_str(article)
-            if not pub_date_str:
-                continue
-
-            # (3) Combine article fields
-            content_text = self._get_article_text(article)
-
-            # (4) Summarize with GPT
-            summary_text = gpt_summarize(self.azure_openai_key, content_text)
-
-            # (5) Insert into DB (optionally do local BERT classification if desired)
-            c.execute(
-                "INSERT INTO records (date, content) VALUES (?, ?)",
-                (pub_date_str, summary_text)
-            )
-            total_inserted += 1
-
-        conn.commit()
-        conn.close()
-        print(f"Done. Inserted {total_inserted} articles into DB.")
+        self._summarize_and_insert(articles)
 
     def collect_summarized_articles_after_date(self, start_date: datetime.datetime):
         """
         Single call to article_search; set results=500 (up to 500 articles).
         The library auto-paginates with 10 items per page until filled or no more data.
         """
-        # (1) We don't check if DB exists
-        conn = sqlite3.connect('var/dashdb.sqlite3')
-        c = conn.cursor()
-
-        # (2) Try up to 100 results
+        # (1) Try up to 100 results
         articles = self.nyt.article_search(
             query="nuclear",
             results=100,
@@ -329,28 +342,156 @@ class ArticleSearcher:
             }
         )
         print(f"Got {len(articles)} articles from NYT.")
+        self._summarize_and_insert(articles)
 
-        total_inserted = 0
-        for article in articles:
-            pub_date_str = self._extract_pub_date_str(article)
-            if not pub_date_str:
-                continue
+    def search_page(self, begin: datetime.date, end: datetime.date, page: int):
+        """
+        Fetches one page (0-based) of "nuclear" articles published between `begin` and `end`,
+        oldest first, waiting as needed to stay under the API's rate limit. Safe to call from
+        several threads: they share the one rate limit.
 
-            # (3) Combine article fields
-            content_text = self._get_article_text(article)
+        Returns:
+        - tuple: (list of article dicts, total hits for the window)
+        """
+        # Reserve the next free request slot, then wait for it outside the lock
+        with self._search_lock:
+            slot = max(time.monotonic(), self._next_search_at)
+            self._next_search_at = slot + NYT_REQUEST_INTERVAL
+        wait = slot - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        response = self.http.get(NYT_SEARCH_URL, params={
+            "q": "nuclear",
+            "fq": 'body:("nuclear")',
+            "begin_date": begin.strftime("%Y%m%d"),
+            "end_date": end.strftime("%Y%m%d"),
+            "sort": "oldest",
+            "page": page,
+            "api-key": self.nyt_api_key,
+        })
+        response.raise_for_status()
+        data = response.json()["response"]
+        return data.get("docs") or [], data.get("meta", {}).get("hits", 0)
+
+    def collect_new_articles(self, db_path: str = DB_PATH, default_start: datetime.date = None,
+                             window_end: datetime.date = None):
+        """
+        Collects every article published after the crawl watermark, up to `window_end`
+        (default: yesterday, the last complete day). Each page is summarized and inserted
+        in the same transaction that advances the page cursor, so an interrupted crawl
+        resumes at the first page that was not stored.
 
-            # (4) Summarize with GPT
-            summary_text = gpt_summarize(self.azure_openai_key, content_text)
+        Parameters:
+        - default_start (date): Watermark to use the first time (default: newest date in the DB).
+        - window_end (date): Last day to collect.
 
-            # (5) Insert into DB
-            c.execute(
-                "INSERT INTO records (date, content) VALUES (?, ?)",
-                (pub_date_str, summary_text)
-            )
-            total_inserted += 1
+        Returns:
+        - int: Number of articles inserted.
+        """
+        window_end = window_end or datetime.date.today() - datetime.timedelta(days=1)
+        default_start = default_start or get_last_date_in_db(db_path).date()
+
+        conn = sqlite3.connect(db_path)
+        track_changes(conn, "records", ["label"])
+        with conn:
+            init_crawl_state(conn)
+            window = open_window(conn, CRAWL_SOURCE, CRAWL_QUERY, default_start.isoformat(), window_end.isoformat())
+        if window is None:
+            print(f"NYT articles are up to date through {window_end}.")
+            conn.close()
+            return 0
+
+        window_start, window_end, page, pages = window
+        # The watermark is the last day collected, so the window begins the day after it
+        begin = datetime.date.fromisoformat(window_start) + datetime.timedelta(days=1)
+        end = datetime.date.fromisoformat(window_end)
+        if pages is None:
+            page = 1
+        print(f"Collecting NYT articles from {begin} to {end}, starting at page {page}.")
+
+        inserted = 0
+        while pages is None or page <= pages:
+            try:
+                articles, hits = self.search_page(begin, end, page - 1)
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                print(f"[NYT Error] page {page}: {e}. The next run resumes here.")
+                break
+            if pages is None:
+                pages = min(math.ceil(hits / NYT_PAGE_SIZE), NYT_MAX_PAGES)
+                if hits > NYT_PAGE_SIZE * NYT_MAX_PAGES:
+                    print(f"Warning: {hits} hits from {begin} to {end}; only the first "
+                          f"{NYT_PAGE_SIZE * NYT_MAX_PAGES} can be paged.")
+
+            rows = self.summarize_articles(articles)
+            with conn:
+                conn.executemany("INSERT INTO records (date, content) VALUES (?, ?)", rows)
+                advance_page(conn, CRAWL_SOURCE, CRAWL_QUERY, page + 1, pages)
+                if page + 1 > pages:
+                    close_window(conn, CRAWL_SOURCE, CRAWL_QUERY)
+            inserted += len(rows)
+            page += 1
+
+        conn.close()
+        print(f"Inserted {inserted} NYT articles.")
+        return inserted
+
+    def _summarize_and_insert(self, articles):
+        """
+        Summarize `articles` with up to `concurrency` GPT calls in flight and insert the
+        summaries in the order the articles were returned.
+        """
+        rows = self.summarize_articles(articles)
+
+        # (4) Insert into DB
+        conn = sqlite3.connect('var/dashdb.sqlite3')
+        c = conn.cursor()
+        c.executemany("INSERT INTO records (date, content) VALUES (?, ?)", rows)
         conn.commit()
         conn.close()
-        print(f"Done. Inserted {total_inserted} articles into DB.")
+        print(f"Done. Inserted {len(rows)} articles into DB.")
+
+    def summarize_articles(self, articles):
+        """
+        Summarize `articles` with up to `concurrency` GPT calls in flight.
+
+        Returns:
+        - list: (date, summary) rows in the order the articles were given.
+        """
+        # (2) Keep only articles with a usable date, and combine their fields
+        dated = []
+        for article in articles:
+            pub_date_str = self._extract_pub_date_str(article)
+            if pub_date_str:
+                dated.append((pub_date_str, self._get_article_text(article)))
+
+        # (3) Summarize with GPT; map() yields results in input order
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            summaries = list(pool.map(self._summarize, [text for _, text in dated]))
+        elapsed = time.perf_counter() - started_at
+
+        with self._stats_lock:
+            self.stats["seconds"] += elapsed
+        rate = len(summaries) / elapsed if elapsed else 0.0
+        print(f"Summarized {len(summaries)} articles "
+              f"({rate:.2f} summaries/s, {self.stats['errors']} GPT errors so far).")
+        return [(pub_date_str, summary) for (pub_date_str, _), summary in zip(dated, summaries)]
+
+    def _summarize(self, content_text: str) -> str:
+        summary = gpt_summarize(self.azure_openai_key, content_text, client=self.gpt_client)
+        with self._stats_lock:
+            self.stats["summarized"] += 1
+            if summary == GPT_ERROR_SUMMARY:
+                self.stats["errors"] += 1
+        return summary
+
+    def throughput(self) -> dict:
+        """Summaries done, GPT errors and summaries per second of summarization time."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["summaries_per_second"] = stats["summarized"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
 
     def _extract_pub_date_str(self, article) -> str:
         """Extract a YYYY-MM-DD date from the article's pub_date field."""
@@ -417,27 +558,20 @@ def get_last_date_in_db(db_path: str) -> datetime.datetime:
 def job():
     """
     The daily job at 3 AM:
-    1. Get the newest date in DB
-    2. Use ArticleSearcher to gather articles after that date
-    3. Label them with local BERT
+    1. Gather every article published since the crawl watermark (resuming an interrupted crawl)
+    2. Label them with local BERT
     """
     print("[Job] Starting daily job...")
 
-    # (1) Find the latest date
-    last_date = get_last_date_in_db(DB_PATH)
-    print(f"[Job] Last date in DB is {last_date.strftime('%Y-%m-%d')}")
-
-    # (2) Grab articles after that date
+    # (1) Grab articles after the watermark
     searcher = ArticleSearcher(
         nyt_api_key=NYT_API_KEY,
         azure_openai_key=AZURE_OPENAI_KEY
     )
-    start_dt = last_date + datetime.timedelta(days=1)
-    print(f"[Job] Collecting articles after {start_dt} ...")
-
-    searcher.collect_summarized_articles_at_date(start_dt)
+    searcher.collect_new_articles(DB_PATH)
+    print(f"[Job] Summarization stats: {searcher.throughput()}")
 
-    # (3) Label with BERT
+    # (2) Label with BERT
     print("[Job] Labeling nuclear attitude...")
     label_nuclear_attitude_bert()
 
@@ -469,12 +603,9 @@ def clear_database(db_path: str):
 
 def first_fetch():
     # clear_database(DB_PATH)
-    searcher = ArticleSearcher(
-        nyt_api_key=NYT_API_KEY,
-        azure_openai_key=AZURE_OPENAI_KEY
-    )
-    searcher.collect_summarized_articles_after_date(
-        datetime.datetime(2021, 3, 31))
+    # Backfill everything since 2021-04-01 in resumable windows (see backfill.py)
+    from backfill import run_backfill
+    run_backfill(datetime.date(2021, 4, 1), datetime.date.today() - datetime.timedelta(days=1), DB_PATH)
     print("[Job] Labeling nuclear attitude...")
     label_nuclear_attitude_bert()
 
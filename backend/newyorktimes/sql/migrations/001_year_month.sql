@@ -0,0 +1,21 @@
+-- year_month ('YYYY-MM', the month of date) for the per-month API queries, and the indexes
+-- the API reads through: (year_month, label) covers the sentiment counts, date DESC serves
+-- the most recent posts. Applied by bin/dashdb migrate and at API startup.
+--
+-- A plain column kept current by triggers rather than a generated one: SQLite never answers
+-- a query from an index on a generated column alone, so the index could not be covering.
+ALTER TABLE records ADD COLUMN year_month TEXT;
+UPDATE records SET year_month = substr(date, 1, 7);
+
+CREATE TRIGGER IF NOT EXISTS records_year_month_insert AFTER INSERT ON records
+BEGIN
+    UPDATE records SET year_month = substr(NEW.date, 1, 7) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS records_year_month_update AFTER UPDATE OF date ON records
+BEGIN
+    UPDATE records SET year_month = substr(NEW.date, 1, 7) WHERE id = NEW.id;
+END;
+
+CREATE INDEX IF NOT EXISTS idx_records_year_month_label ON records (year_month, label);
+CREATE INDEX IF NOT EXISTS idx_records_date ON records (date DESC);
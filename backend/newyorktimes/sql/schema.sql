@@ -2,5 +2,50 @@ CREATE TABLE records (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     date DATE,
     content TEXT,
-    label INTEGER CHECK(label IS NULL OR label IN (0, 1, 2)) DEFAULT NULL
+    label INTEGER CHECK(label IS NULL OR label IN (0, 1, 2)) DEFAULT NULL,
+    -- Stamped by the triggers common/change_seq.py installs
+    change_seq INTEGER,
+    -- 'YYYY-MM' month of date, set by the triggers below (see sql/migrations/001_year_month.sql)
+    year_month TEXT
 );
+
+CREATE INDEX idx_records_change_seq ON records (change_seq);
+CREATE INDEX idx_records_year_month_label ON records (year_month, label);
+CREATE INDEX idx_records_date ON records (date DESC);
+
+CREATE TRIGGER records_year_month_insert AFTER INSERT ON records
+BEGIN
+    UPDATE records SET year_month = substr(NEW.date, 1, 7) WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER records_year_month_update AFTER UPDATE OF date ON records
+BEGIN
+    UPDATE records SET year_month = substr(NEW.date, 1, 7) WHERE id = NEW.id;
+END;
+
+CREATE TABLE crawl_state (
+    source TEXT NOT NULL,
+    query TEXT NOT NULL,
+    watermark TEXT,
+    window_start TEXT,
+    window_end TEXT,
+    next_page INTEGER,
+    pages INTEGER,
+    updated_at TEXT,
+    PRIMARY KEY (source, query)
+);
+
+CREATE TABLE backfill_windows (
+    begin_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    hits INTEGER,
+    pages INTEGER,
+    next_page INTEGER NOT NULL DEFAULT 1,
+    inserted INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (begin_date, end_date)
+);
+
+-- Number of the last file in sql/migrations this schema already includes
+PRAGMA user_version = 1;
@@ -1,13 +1,21 @@
-from fastapi import FastAPI
+import os
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 
 from threads.threads import app as threads_app
 from mastodon.mastodon import app as mastodon_app
-from guardian.guardian import app as guardian_app
+from guardian.guardian import app as guardian_app, DATABASE_PATH as GUARDIAN_DB_PATH
 from youtube.youtube import app as youtube_app
+from common.models import memory_report
+from common.batching import batching_report
+from common.prediction_cache import get_prediction_cache
+from common import warmup
+from common.compression import CompressionMiddleware
+from common.events import Broadcaster
+from common.responses import FastJSONResponse
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,12 +24,75 @@ app.add_middleware(
     allow_methods=["GET"],
     allow_headers=["*"],
 )
+# Wraps the mounted sub-apps too; brotli when installed, gzip otherwise
+app.add_middleware(CompressionMiddleware)
+
+# Mounted sub-apps don't receive startup events, so warm-up is kicked off here
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+# Databases whose changes are pushed to the dashboards over /events. The NYT app runs in its
+# own process; its database is watched here so its tab is pushed updates too.
+broadcaster = Broadcaster({
+    "threads": "./threads/threads.db",
+    "mastodon": "./mastodon/mastodon.db",
+    "guardian": GUARDIAN_DB_PATH,
+    "youtube": "./youtube/youtube.db",
+    "nyt": os.path.join(os.path.dirname(os.path.abspath(__file__)), "newyorktimes", "var", "dashdb.sqlite3"),
+})
+
+@app.on_event("startup")
+async def start_events():
+    broadcaster.start()
+
+@app.on_event("shutdown")
+async def stop_events():
+    broadcaster.stop()
 
 app.mount("/threads", threads_app)
 app.mount("/mastodon", mastodon_app)
 app.mount("/guardian", guardian_app)
 app.mount("/youtube", youtube_app)
 
+@app.get("/status")
+def get_status():
+    """Reports per-sub-app warm-up state ("pending", "warming", "ready" or "failed")."""
+    return warmup.status()
+
+@app.get("/models")
+def get_models():
+    """Reports the shared sentiment models loaded in this process and their memory use."""
+    return memory_report()
+
+@app.get("/inference")
+def get_inference_stats():
+    """Reports queue depth, batch size histogram and batch latency of the micro-batcher."""
+    return batching_report()
+
+@app.get("/cache")
+def get_cache_stats():
+    """Reports prediction cache size and hit rate."""
+    cache = get_prediction_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+@app.get("/events")
+def get_events(sources: str = None):
+    """
+    Server-sent events: "changed" with {"source", "cursor"} whenever a source's data changes,
+    so dashboards refetch only then instead of polling. `sources` limits the stream to a
+    comma-separated subset of threads, mastodon, guardian, youtube and nyt.
+    """
+    names = [name.strip() for name in sources.split(",")] if sources else None
+    unknown = [name for name in names or [] if name not in broadcaster.sources]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sources: {', '.join(unknown)}")
+    return StreamingResponse(
+        broadcaster.stream(names),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/", response_class=HTMLResponse)
 def read_root():
     html_content = """
@@ -35,6 +106,12 @@ def read_root():
             <li><a href='/mastodon'>Mastodon API</a></li>
             <li><a href='/guardian/'>Guardian API</a></li>
             <li><a href='/youtube/'>YouTube API</a></li>
+            <li><a href='/status'>Warm-up status</a></li>
+            <li><a href='/models'>Loaded models</a></li>
+            <li><a href='/inference'>Inference batching stats</a></li>
+            <li><a href='/cache'>Prediction cache stats</a></li>
+            <li><a href='/guardian/pipeline'>Guardian pipeline stats</a></li>
+            <li><a href='/events'>Data change events (SSE)</a></li>
         </ul>
     </body>
     </html>
@@ -0,0 +1,12 @@
+import threading
+import time
+
+
+def serve_in_thread(app, port):
+    """Serves the ASGI app at import path `app` on 127.0.0.1:`port` from a daemon thread."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
@@ -0,0 +1,43 @@
+"""
+Benchmarks GuardianScraper's sync and async modes against the local Content API stand-in.
+
+Run from the backend directory:
+    python -m stubs.bench_guardian_scraper --latency-ms 150 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+from stubs import serve_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=60000, help="Rate limit for the async mode")
+    args = parser.parse_args()
+
+    # The stub and the scraper read their settings at import time
+    os.environ["STUB_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["GUARDIAN_API_KEY"] = "stub"
+    os.environ["GUARDIAN_BASE_URL"] = f"http://127.0.0.1:{args.port}/search?"
+    from guardian.services.scraper import GuardianScraper
+
+    server = serve_in_thread("stubs.guardian_content:app", args.port)
+    print(f"{'mode':<6} {'pages':>6} {'seconds':>8} {'pages/s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("sync", "async"):
+            scraper = GuardianScraper("2024-01-01", "2024-12-31", os.path.join(tmp, f"{mode}.db"))
+            if mode == "sync":
+                scraper.scrape_articles_sync()
+            else:
+                asyncio.run(scraper.scrape_articles_async(concurrency=args.concurrency, requests_per_minute=args.rpm))
+            pages, seconds = scraper.stats["pages"], scraper.stats["seconds"]
+            print(f"{mode:<6} {pages:>6} {seconds:>8.2f} {pages / seconds:>8.1f}")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures NYT backfill throughput against the local Article Search and chat-completions stand-ins.
+
+Run from the backend directory:
+    python -m stubs.bench_nyt_backfill --days 90 --workers 1 2 4 8
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+from stubs import serve_in_thread
+
+NYT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "newyorktimes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=datetime.date.fromisoformat, default=datetime.date(2024, 1, 1))
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--window-days", type=int, default=7)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--articles-per-day", type=float, default=8)
+    parser.add_argument("--search-latency-ms", type=float, default=300)
+    parser.add_argument("--gpt-latency-ms", type=float, default=500)
+    parser.add_argument("--request-interval", type=float, default=0.1,
+                        help="Seconds between Article Search requests (the real API needs 12)")
+    parser.add_argument("--nyt-port", type=int, default=9300)
+    parser.add_argument("--gpt-port", type=int, default=9100)
+    args = parser.parse_args()
+
+    # The stubs and the collector read their settings at import time
+    os.environ.update({
+        "STUB_NYT_LATENCY_MS": str(args.search_latency_ms),
+        "STUB_NYT_ARTICLES_PER_DAY": str(args.articles_per_day),
+        "STUB_LATENCY_MS": str(args.gpt_latency_ms),
+        "NYT_SEARCH_URL": f"http://127.0.0.1:{args.nyt_port}/svc/search/v2/articlesearch.json",
+        "NYT_REQUEST_INTERVAL": str(args.request_interval),
+        "NYT_API_KEY": "stub",
+        "AZURE_OPENAI_ENDPOINT": f"http://127.0.0.1:{args.gpt_port}",
+        "AZURE_OPENAI_KEY": "stub",
+    })
+    sys.path.insert(0, NYT_DIR)
+    from backfill import run_backfill
+
+    servers = [serve_in_thread("stubs.nyt_search:app", args.nyt_port),
+               serve_in_thread("stubs.openai_chat:app", args.gpt_port)]
+    end = args.start + datetime.timedelta(days=args.days - 1)
+    with open(os.path.join(NYT_DIR, "sql", "schema.sql")) as f:
+        schema = f.read()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            db_path = os.path.join(tmp, f"backfill-{workers}.sqlite3")
+            conn = sqlite3.connect(db_path)
+            conn.executescript(schema)
+            conn.close()
+            results.append((workers, run_backfill(args.start, end, db_path, args.window_days, workers)))
+
+    print(f"\n{'workers':>7} {'windows':>8} {'pages':>6} {'articles':>9} {'seconds':>8} {'articles/s':>11}")
+    for workers, stats in results:
+        print(f"{workers:>7} {stats['windows']:>8} {stats['pages']:>6} {stats['inserted']:>9} "
+              f"{stats['seconds']:>8.1f} {stats['inserted'] / stats['seconds']:>11.2f}")
+    for server in servers:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
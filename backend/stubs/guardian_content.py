@@ -0,0 +1,70 @@
+"""
+Local stand-in for The Guardian Content API search endpoint.
+
+Every query gets a deterministic slice of a shared pool of fake articles, so the
+"Nuclear X" queries overlap the way the real ones do. Latency is configurable:
+
+    STUB_LATENCY_MS=150 uvicorn stubs.guardian_content:app --port 9200
+    GUARDIAN_BASE_URL="http://127.0.0.1:9200/search?" GUARDIAN_API_KEY=stub ...
+"""
+import asyncio
+import datetime
+import math
+import os
+import zlib
+from fastapi import FastAPI, Query
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "150"))
+POOL_SIZE = int(os.getenv("STUB_POOL_SIZE", "1500"))
+RESULTS_PER_QUERY = int(os.getenv("STUB_RESULTS_PER_QUERY", "350"))
+
+app = FastAPI()
+stats = {"requests": 0}
+
+
+def fake_article(n):
+    published = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(hours=6 * n)
+    slug = f"us-news/{published:%Y/%b/%d}/nuclear-story-{n}".lower()
+    return {
+        "id": slug,
+        "type": "article",
+        "sectionId": "us-news",
+        "sectionName": "US news",
+        "webPublicationDate": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "webTitle": f"Nuclear story {n}",
+        "webUrl": f"https://www.theguardian.com/{slug}",
+        "apiUrl": f"https://content.guardianapis.com/{slug}",
+        "fields": {
+            "byline": f"Reporter {n % 40}",
+            "wordcount": "120",
+            "bodyText": f"Story {n} is about energy. Officials said the nuclear plant would reopen. Prices rose.",
+        },
+    }
+
+
+@app.get("/search")
+async def search(q: str = "", page: int = 1, page_size: int = Query(100, alias="page-size")):
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY_MS / 1000)
+
+    pages = math.ceil(RESULTS_PER_QUERY / page_size)
+    if page > pages:
+        return {"response": {"status": "error", "message": "requested page is beyond the number of available pages"}}
+
+    # Each query walks the shared pool from its own offset, so queries overlap
+    offset = zlib.crc32(q.encode()) % POOL_SIZE
+    start = (page - 1) * page_size
+    indices = range(start, min(start + page_size, RESULTS_PER_QUERY))
+    return {
+        "response": {
+            "status": "ok",
+            "userTier": "developer",
+            "total": RESULTS_PER_QUERY,
+            "startIndex": start + 1,
+            "pageSize": page_size,
+            "currentPage": page,
+            "pages": pages,
+            "orderBy": "newest",
+            "results": [fake_article((offset + i) % POOL_SIZE) for i in indices],
+        }
+    }
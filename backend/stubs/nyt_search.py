@@ -0,0 +1,67 @@
+"""
+Local stand-in for the NYT Article Search API.
+
+Every day has a deterministic number of "nuclear" articles (STUB_NYT_ARTICLES_PER_DAY on
+average), served oldest first, 10 per page, up to the real API's 100-page limit:
+
+    STUB_NYT_LATENCY_MS=300 uvicorn stubs.nyt_search:app --port 9300
+    NYT_SEARCH_URL=http://127.0.0.1:9300/svc/search/v2/articlesearch.json NYT_REQUEST_INTERVAL=0 \
+        python newyorktimes/backfill.py 2024-01-01 2024-03-31
+"""
+import asyncio
+import datetime
+import os
+import zlib
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("STUB_NYT_LATENCY_MS", "300"))
+ARTICLES_PER_DAY = float(os.getenv("STUB_NYT_ARTICLES_PER_DAY", "8"))
+PAGE_SIZE = 10
+MAX_PAGE = 100
+
+app = FastAPI()
+stats = {"requests": 0}
+
+
+def articles_on(day):
+    """Deterministic count for `day`, between half and one and a half times the average."""
+    spread = zlib.crc32(day.isoformat().encode()) % 101 / 100
+    return int(ARTICLES_PER_DAY * (0.5 + spread))
+
+
+def fake_article(day, n):
+    return {
+        "_id": f"nyt://article/{day:%Y%m%d}-{n}",
+        "web_url": f"https://www.nytimes.com/{day:%Y/%m/%d}/climate/nuclear-story-{n}.html",
+        "headline": {"main": f"Nuclear story {n} of {day}"},
+        "abstract": f"Story {n} looks at nuclear power on {day}.",
+        "snippet": "Officials said the nuclear plant would reopen.",
+        "lead_paragraph": "The reactor has been offline since the spring.",
+        "pub_date": f"{day.isoformat()}T{n % 24:02d}:00:00+0000",
+    }
+
+
+@app.get("/svc/search/v2/articlesearch.json")
+async def article_search(begin_date: str, end_date: str, page: int = 0, q: str = "", fq: str = "", sort: str = "oldest"):
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY_MS / 1000)
+    if page >= MAX_PAGE:
+        return JSONResponse(status_code=400, content={"fault": {"faultstring": "Requested page is out of range"}})
+
+    begin = datetime.datetime.strptime(begin_date, "%Y%m%d").date()
+    end = datetime.datetime.strptime(end_date, "%Y%m%d").date()
+    days = [begin + datetime.timedelta(days=i) for i in range((end - begin).days + 1)]
+    counts = [(day, articles_on(day)) for day in days]
+    hits = sum(count for _, count in counts)
+
+    # Walk the days up to the requested page without building every article
+    start, docs, offset = page * PAGE_SIZE, [], 0
+    for day, count in counts:
+        if offset + count > start and len(docs) < PAGE_SIZE:
+            first = max(0, start - offset)
+            docs.extend(fake_article(day, n) for n in range(first, count))
+        offset += count
+        if len(docs) >= PAGE_SIZE:
+            break
+    return {"status": "OK", "response": {"docs": docs[:PAGE_SIZE], "meta": {"hits": hits, "offset": start, "time": 5}}}
@@ -0,0 +1,72 @@
+"""
+Local stand-in for the Azure OpenAI chat-completions endpoint.
+
+Answers like the extraction/summarization prompts expect (sentences mentioning "nuclear",
+or "None"), after a configurable delay, and fails a configurable share of requests with
+429/500 so retry and rate-limit handling can be exercised offline:
+
+    STUB_LATENCY_MS=800 STUB_ERROR_RATE=0.1 uvicorn stubs.openai_chat:app --port 9100
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:9100 python -m guardian.services.processor
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "500"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+
+app = FastAPI()
+stats = {"requests": 0, "rate_limited": 0, "server_errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    roll = random.random()
+    if roll < ERROR_RATE / 2:
+        stats["rate_limited"] += 1
+        return JSONResponse(status_code=429, content={"error": {"message": "Rate limit"}}, headers={"Retry-After": "1"})
+    if roll < ERROR_RATE:
+        stats["server_errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Stub server error"}})
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    finally:
+        stats["in_flight"] -= 1
+
+    text = body["messages"][-1]["content"]
+    sentences = re.findall(r'[^.?!]*\bnuclear\b[^.?!]*[.?!]', text, re.IGNORECASE)
+    content = " ".join(s.strip() for s in sentences) or "None"
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+
+    return {
+        "id": f"chatcmpl-stub-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    """Request counters, including the highest number of concurrent requests seen."""
+    return stats
@@ -2,17 +2,24 @@ import warnings
 import sqlite3
 import numpy as np
 import pandas as pd
-import torch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from common.models import id2label
+from common import warmup
+from common.etag import conditional, db_version
+from common.responses import FastJSONResponse, json_response
+from common.change_seq import current_cursor, deleted_since, track_changes
+from common.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from common.batching import get_batcher
+from common.sharded import LABEL_WORKERS, label_texts
+from common.post_metrics import averages, period_boundaries, sentiment_trends
 
 warnings.filterwarnings("ignore")
 
 # --- Step 1: Create FastAPI application ---
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -34,42 +41,33 @@ def init_db():
             published_on TEXT NOT NULL,
             comment_count INTEGER DEFAULT 0,
             like_count INTEGER DEFAULT 0,
-            retweet_count INTEGER DEFAULT 0
+            retweet_count INTEGER DEFAULT 0,
+            is_verified INTEGER
         )
     """)
+    # Databases created before is_verified was stored; backfill_verified() fills it in
+    columns = [col[1] for col in c.execute("PRAGMA table_info(posts)")]
+    if "is_verified" not in columns:
+        c.execute("ALTER TABLE posts ADD COLUMN is_verified INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_published_on ON posts (published_on)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_like_count ON posts (like_count)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_comment_count ON posts (comment_count)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_retweet_count ON posts (retweet_count)")
     conn.commit()
+    track_changes(conn, "posts", ["true_label", "predicted_label"])
     conn.close()
 
 init_db()
 
-# --- Step 3: Load BERT checkpoint and model ---
-checkpoint = 'kumo24/bert-sentiment-nuclear'
-tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-
-id2label = {0: "negative", 1: "neutral", 2: "positive"}
-label2id = {"negative": 0, "neutral": 1, "positive": 2}
-
-model = AutoModelForSequenceClassification.from_pretrained(
-    checkpoint,
-    num_labels=3,
-    id2label=id2label,
-    label2id=label2id
-)
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# --- Step 3: The shared BERT classifier is loaded lazily by the micro-batcher ---
 
 # --- Step 4: Function to classify text ---
+def classify_text_async(text):
+    """Queues text on the shared micro-batcher; returns a Future for its label."""
+    return get_batcher().submit(text)
+
 def classify_text(text):
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predicted_class = torch.argmax(outputs.logits, dim=1).item()
-    return id2label[predicted_class]
+    return classify_text_async(text).result()
 
 def load_and_combine_data():
     train = pd.read_csv('./threads/training_threads.csv', quotechar='"')
@@ -78,37 +76,28 @@ def load_and_combine_data():
     all_data['published_on'] = pd.to_datetime(all_data['published_on']).dt.strftime('%Y-%m-%d')
     return all_data
 
-def calculate_averages(df):
-  return {
-      "avg_comments": round(df['comment_count'].mean(), 2),
-      "avg_likes": round(df['like_count'].mean(), 2),
-      "avg_retweets": round(df['retweet_count'].mean(), 2)
-  }
-
-def calculate_verified_proportion(df):
-    return round(df['is_verified'].mean() * 100, 2)
-
-def get_sentiment_trends(df):
-    df['published_on'] = pd.to_datetime(df['published_on'])
-
-    date_range = pd.date_range(start='2023-01-01', end='2024-12-31', freq='2M')
-
-    trends = {"time_periods": [], "positive": [], "negative": [], "neutral": []}
+# Two-month periods of the sentiment trend chart
+TREND_BOUNDARIES = period_boundaries(datetime(2023, 1, 1).date(), datetime(2024, 12, 31).date())
 
-    for i in range(len(date_range) - 1):
-        start_date = date_range[i]
-        end_date = date_range[i + 1]
+# Columns the /posts endpoint serves and sorts by (each sort column is indexed)
+POST_FIELDS = ["id", "text", "true_label", "predicted_label", "published_on", "comment_count", "like_count", "retweet_count", "is_verified"]
+POST_ORDERS = ["published_on", "like_count", "comment_count", "retweet_count"]
 
-        period_df = df[(df['published_on'] >= start_date) & (df['published_on'] < end_date)]
-
-        sentiment_counts = period_df['label'].value_counts()
-
-        trends["time_periods"].append(f"{start_date.strftime('%Y-%m')}-{end_date.strftime('%Y-%m')}")
-        trends["positive"].append(int(sentiment_counts.get(2, 0)))
-        trends["negative"].append(int(sentiment_counts.get(0, 0)))
-        trends["neutral"].append(int(sentiment_counts.get(1, 0)))
+def calculate_metrics(conn):
+    """Averages, verified share and sentiment trends, computed from the posts table."""
+    verified = conn.execute("SELECT ROUND(AVG(is_verified) * 100, 2) FROM posts").fetchone()[0]
+    return {
+        "averages": averages(conn, "posts", {
+            "avg_comments": "comment_count",
+            "avg_likes": "like_count",
+            "avg_retweets": "retweet_count",
+        }),
+        "verified_proportion": verified,
+        "sentiment_trends": sentiment_trends(conn, "posts", TREND_BOUNDARIES),
+    }
 
-    return trends
+def _verified(row):
+    return int(row['is_verified']) if 'is_verified' in row and pd.notna(row['is_verified']) else None
 
 # --- Step 5: Populate database with sentiment analysis results ---
 def populate_db():
@@ -120,6 +109,7 @@ def populate_db():
 
     if count > 0:
         print("database was already populated")
+        backfill_verified()
         return
 
     print("populating database with sentiment analysis results...")
@@ -133,25 +123,66 @@ def populate_db():
             continue
         
         true_label = id2label[row['label']]
-        predicted_label = classify_text(text)
+        # Resolved below, once the micro-batcher (or the worker pool for backfills) has run
+        predicted_label = classify_text_async(text) if LABEL_WORKERS <= 1 else None
         published_on = row['published_on']
         comment_count = int(row['comment_count']) if pd.notna(row['comment_count']) else 0
         like_count = int(row['like_count']) if pd.notna(row['like_count']) else 0
         retweet_count = int(row['retweet_count']) if pd.notna(row['retweet_count']) else 0
 
-        results.append((text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count))
+        results.append((text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count,
+                        _verified(row)))
+
+    if LABEL_WORKERS > 1:
+        predicted = label_texts([row[0] for row in results], workers=LABEL_WORKERS)
+    else:
+        # Rows were queued one at a time; the micro-batcher ran them as batches
+        predicted = [row[2].result() for row in results]
+    results = [(row[0], row[1], label) + row[3:] for row, label in zip(results, predicted)]
 
     conn = sqlite3.connect("./threads/threads.db")
     c = conn.cursor()
     c.executemany(
-        "INSERT INTO posts (text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        "INSERT INTO posts (text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count, is_verified) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
         results
     )
     conn.commit()
     conn.close()
     print("database populated successfully!")
 
-populate_db()
+def backfill_verified():
+    """One-time fill of is_verified for posts stored before the column existed, matched on text and date."""
+    conn = sqlite3.connect("./threads/threads.db")
+    missing = conn.execute("SELECT EXISTS (SELECT 1 FROM posts WHERE is_verified IS NULL)").fetchone()[0]
+    if not missing:
+        conn.close()
+        return
+
+    all_data = load_and_combine_data()
+    rows = [
+        (_verified(row), str(row['text']).strip(), row['published_on'])
+        for _, row in all_data.iterrows() if pd.notna(row['text']) and _verified(row) is not None
+    ]
+    conn.executemany("UPDATE posts SET is_verified = ? WHERE text = ? AND published_on = ? AND is_verified IS NULL", rows)
+    conn.commit()
+    conn.close()
+    print(f"backfilled is_verified for {len(rows)} posts")
+
+def has_data():
+    """True if the database already holds a populated snapshot that can be served."""
+    conn = sqlite3.connect("./threads/threads.db")
+    c = conn.cursor()
+    c.execute("SELECT EXISTS (SELECT 1 FROM posts)")
+    populated = c.fetchone()[0]
+    conn.close()
+    return bool(populated)
+
+# Model loading and first-time population run in the background warm-up task
+warmup.register("threads", populate_db)
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
 
 # --- Step 6: FastAPI routes ---
 # @app.get("/", response_class=HTMLResponse)
@@ -168,37 +199,80 @@ populate_db()
 #     return HTMLResponse(content=html_content)
 
 @app.get("/")
-def get_posts():
-    all_data = load_and_combine_data()
-    all_data['label'] = all_data.label.replace({'positive': 2, 'negative': 0, 'neutral': 1})
+def get_posts(request: Request, response: Response, since: int = None):
+    """
+    All posts plus metrics and a change cursor. With `since` (a cursor from an earlier
+    response), only posts inserted or relabeled after it are sent, plus the ids of deleted ones.
+    """
+    # Until warm-up finishes, serve the last populated snapshot if there is one
+    if not warmup.is_ready("threads") and not has_data():
+        return warmup.warming_response("threads")
+
+    # Unchanged since the client's last poll: skip building the payload
+    unchanged = conditional(request, response, db_version("./threads/threads.db"))
+    if unchanged is not None:
+        return unchanged
 
     conn = sqlite3.connect("./threads/threads.db")
+    cursor = current_cursor(conn)
     c = conn.cursor()
-    c.execute("SELECT text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count FROM posts ORDER BY published_on ASC")
+    # Deltas walk the change_seq index; the client merges them into its own ordering
+    c.execute(f"""
+        SELECT id, text, true_label, predicted_label, published_on, comment_count, like_count, retweet_count
+        FROM posts {"ORDER BY published_on ASC" if since is None else "WHERE change_seq > ? ORDER BY change_seq"}
+    """, () if since is None else (since,))
     results = [
         {
-            "text": row[0],
-            "true_label": row[1],
-            "predicted_label": row[2],
-            "published_on": row[3],
-            "comment_count": row[4],
-            "like_count": row[5],
-            "retweet_count": row[6]
+            "id": row[0],
+            "text": row[1],
+            "true_label": row[2],
+            "predicted_label": row[3],
+            "published_on": row[4],
+            "comment_count": row[5],
+            "like_count": row[6],
+            "retweet_count": row[7]
         } for row in c.fetchall()
     ]
-    conn.close()
-    
-    averages = calculate_averages(all_data)
-    verified_proportion = calculate_verified_proportion(all_data)
-    sentiment_trends = get_sentiment_trends(all_data)
-    
-    return {
+    payload = {
         "results": results,
-        "metrics": {
-            "averages": averages,
-            "verified_proportion": verified_proportion,
-            "sentiment_trends": sentiment_trends
-        }
+        "metrics": calculate_metrics(conn),
+        "cursor": cursor
     }
+    if since is not None:
+        payload["deleted"] = deleted_since(conn, "posts", since)
+    conn.close()
+    return json_response(payload, response)
+
+@app.get("/posts")
+def list_posts(request: Request, response: Response, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+               fields: str = None, order: str = "published_on"):
+    """
+    One page of posts, read in index order. `fields` picks columns (comma-separated), `order`
+    is a sort column with an optional "-" for descending, and `cursor` is the next_cursor of the previous page.
+    """
+    if not warmup.is_ready("threads") and not has_data():
+        return warmup.warming_response("threads")
+    unchanged = conditional(request, response, db_version("./threads/threads.db"))
+    if unchanged is not None:
+        return unchanged
+
+    conn = sqlite3.connect("./threads/threads.db")
+    page = fetch_page(conn, "posts", POST_FIELDS, POST_ORDERS, fields, order, limit, cursor)
+    conn.close()
+    return page
+
+@app.get("/metrics")
+def get_metrics(request: Request, response: Response):
+    """The aggregate metrics block on its own, for the charts."""
+    if not warmup.is_ready("threads") and not has_data():
+        return warmup.warming_response("threads")
+    unchanged = conditional(request, response, db_version("./threads/threads.db"))
+    if unchanged is not None:
+        return unchanged
+
+    conn = sqlite3.connect("./threads/threads.db")
+    metrics = calculate_metrics(conn)
+    conn.close()
+    return metrics
 
 # Run the app with: uvicorn threads:app --reload
\ No newline at end of file
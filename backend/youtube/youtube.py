@@ -2,18 +2,24 @@ import warnings
 import sqlite3
 import numpy as np
 import pandas as pd
-import torch
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
-from sklearn.model_selection import train_test_split
+from common.models import id2label
+from common import warmup
+from common.etag import conditional, db_version
+from common.responses import FastJSONResponse, json_response
+from common.change_seq import current_cursor, deleted_since, track_changes
+from common.pagination import DEFAULT_PAGE_SIZE, fetch_page
+from common.batching import get_batcher
+from common.sharded import LABEL_WORKERS, label_texts
+from common.post_metrics import averages, period_boundaries, sentiment_trends
 
 warnings.filterwarnings("ignore")
 
 # --- Step 1: Create FastAPI application ---
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
@@ -38,42 +44,30 @@ def init_db():
             video_id TEXT NOT NULL
         )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_videos_published_on ON videos (published_on)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_videos_like_count ON videos (like_count)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_videos_comment_count ON videos (comment_count)")
     conn.commit()
+    track_changes(conn, "videos", ["true_label", "predicted_label"])
     conn.close()
 
 init_db()
 
-# --- Step 3: Load BERT checkpoint and model ---
-checkpoint = 'kumo24/bert-sentiment-nuclear'
-tokenizer = AutoTokenizer.from_pretrained(checkpoint)
-
-if tokenizer.pad_token is None:
-    tokenizer.add_special_tokens({'pad_token': '[PAD]'})
-
-id2label = {0: "negative", 1: "neutral", 2: "positive"}
-label2id = {"negative": 0, "neutral": 1, "positive": 2}
-
-model = AutoModelForSequenceClassification.from_pretrained(
-    checkpoint,
-    num_labels=3,
-    id2label=id2label,
-    label2id=label2id
-)
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# --- Step 3: The shared BERT classifier is loaded lazily by the micro-batcher ---
 
 # --- Step 4: Function to classify text ---
+def classify_text_async(text):
+    """Queues text on the shared micro-batcher; returns a Future for its label."""
+    return get_batcher().submit(text)
+
 def classify_text(text):
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
-    with torch.no_grad():
-        outputs = model(**inputs)
-        predicted_class = torch.argmax(outputs.logits, dim=1).item()
-    return id2label[predicted_class]
+    return classify_text_async(text).result()
 
 # --- Step 5: Load and split dataset ---
 def load_and_split_data():
+    # Only the first-time ingest needs sklearn
+    from sklearn.model_selection import train_test_split
+
     data = pd.read_csv("./youtube/Youtube_Label.csv", quotechar='"')
 
     # Ensure required columns exist
@@ -99,33 +93,22 @@ def load_and_split_data():
 
 
 
-def calculate_averages(df):
-  return {
-      "avg_comments": round(df['comment_count'].mean(), 2),
-      "avg_likes": round(df['like_count'].mean(), 2)
-  }
-
-def get_youtube_trends(df):
-    df['published_on'] = pd.to_datetime(df['published_on'])
-
-    date_range = pd.date_range(start='2022-01-01', end='2024-12-31', freq='2M')
+# Two-month periods of the sentiment trend chart
+TREND_BOUNDARIES = period_boundaries(datetime(2022, 1, 1).date(), datetime(2024, 12, 31).date())
 
-    trends = {"time_periods": [], "positive": [], "negative": [], "neutral": []}
+# Columns the /videos endpoint serves and sorts by (each sort column is indexed)
+VIDEO_FIELDS = ["id", "text", "true_label", "predicted_label", "published_on", "like_count", "comment_count", "video_id"]
+VIDEO_ORDERS = ["published_on", "like_count", "comment_count"]
 
-    for i in range(len(date_range) - 1):
-        start_date = date_range[i]
-        end_date = date_range[i + 1]
-
-        period_df = df[(df['published_on'] >= start_date) & (df['published_on'] < end_date)]
-
-        sentiment_counts = period_df['label'].value_counts()
-
-        trends["time_periods"].append(f"{start_date.strftime('%Y-%m')}-{end_date.strftime('%Y-%m')}")
-        trends["positive"].append(int(sentiment_counts.get(2, 0)))
-        trends["negative"].append(int(sentiment_counts.get(0, 0)))
-        trends["neutral"].append(int(sentiment_counts.get(1, 0)))
-
-    return trends
+def calculate_metrics(conn):
+    """Averages and sentiment trends, computed from the videos table."""
+    return {
+        "averages": averages(conn, "videos", {
+            "avg_comments": "comment_count",
+            "avg_likes": "like_count",
+        }),
+        "sentiment_trends": sentiment_trends(conn, "videos", TREND_BOUNDARIES),
+    }
 
 # --- Step 6: Populate database with sentiment analysis results ---
 def populate_db():
@@ -151,7 +134,8 @@ def populate_db():
             continue
         
         true_label = id2label[row['label']]
-        predicted_label = classify_text(text)
+        # Resolved below, once the micro-batcher (or the worker pool for backfills) has run
+        predicted_label = classify_text_async(text) if LABEL_WORKERS <= 1 else None
         published_on = row['published_on']
         like_count = int(row['like_count']) if pd.notna(row['like_count']) else 0
         comment_count = int(row['comment_count']) if pd.notna(row['comment_count']) else 0
@@ -159,6 +143,13 @@ def populate_db():
         video_id = row['video_id'] if 'video_id' in row and pd.notna(row['video_id']) else ''
         results.append((text, true_label, predicted_label, published_on, like_count, comment_count, video_id))
 
+    if LABEL_WORKERS > 1:
+        predicted = label_texts([row[0] for row in results], workers=LABEL_WORKERS)
+    else:
+        # Rows were queued one at a time; the micro-batcher ran them as batches
+        predicted = [row[2].result() for row in results]
+    results = [(row[0], row[1], label) + row[3:] for row, label in zip(results, predicted)]
+
     conn = sqlite3.connect("./youtube/youtube.db")
     c = conn.cursor()
     c.executemany(
@@ -170,7 +161,21 @@ def populate_db():
     conn.close()
     print("Database populated successfully!")
 
-populate_db()
+def has_data():
+    """True if the database already holds a populated snapshot that can be served."""
+    conn = sqlite3.connect("./youtube/youtube.db")
+    c = conn.cursor()
+    c.execute("SELECT EXISTS (SELECT 1 FROM videos)")
+    populated = c.fetchone()[0]
+    conn.close()
+    return bool(populated)
+
+# Model loading and first-time population run in the background warm-up task
+warmup.register("youtube", populate_db)
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
 
 # --- Step 7: FastAPI routes ---
 # @app.get("/", response_class=HTMLResponse)
@@ -187,37 +192,81 @@ populate_db()
 #     return HTMLResponse(content=html_content)
 
 @app.get("/")
-def get_videos():
-    train, test = load_and_split_data()
-    all_data = pd.concat([train, test], ignore_index=True)
-    all_data['label'] = all_data.label.replace({'positive': 2, 'negative': 0, 'neutral': 1})
+def get_videos(request: Request, response: Response, since: int = None):
+    """
+    All comments plus metrics and a change cursor. With `since` (a cursor from an earlier
+    response), only rows inserted or relabeled after it are sent, plus the ids of deleted ones.
+    """
+    # Until warm-up finishes, serve the last populated snapshot if there is one
+    if not warmup.is_ready("youtube") and not has_data():
+        return warmup.warming_response("youtube")
+
+    # Unchanged since the client's last poll: skip building the payload
+    unchanged = conditional(request, response, db_version("./youtube/youtube.db"))
+    if unchanged is not None:
+        return unchanged
 
     conn = sqlite3.connect("./youtube/youtube.db")
+    cursor = current_cursor(conn)
     c = conn.cursor()
-    c.execute("SELECT text, true_label, predicted_label, published_on, like_count, comment_count, video_id FROM videos ORDER BY published_on ASC")
+    # Deltas walk the change_seq index; the client merges them into its own ordering
+    c.execute(f"""
+        SELECT id, text, true_label, predicted_label, published_on, like_count, comment_count, video_id
+        FROM videos {"ORDER BY published_on ASC" if since is None else "WHERE change_seq > ? ORDER BY change_seq"}
+    """, () if since is None else (since,))
 
     results = [
     {
-        "text": row[0],
-        "true_label": row[1],
-        "predicted_label": row[2],
-        "published_on": row[3],
-        "like_count": row[4],
-        "comment_count": row[5],
-        "video_id": row[6]
+        "id": row[0],
+        "text": row[1],
+        "true_label": row[2],
+        "predicted_label": row[3],
+        "published_on": row[4],
+        "like_count": row[5],
+        "comment_count": row[6],
+        "video_id": row[7]
     } for row in c.fetchall()
     ]
-    conn.close()
-    
-    averages = calculate_averages(all_data)
-    sentiment_trends = get_youtube_trends(all_data)
-    
-    return {
+    payload = {
         "results": results,
-        "metrics": {
-            "averages": averages,
-            "sentiment_trends": sentiment_trends
-        }
+        "metrics": calculate_metrics(conn),
+        "cursor": cursor
     }
+    if since is not None:
+        payload["deleted"] = deleted_since(conn, "videos", since)
+    conn.close()
+    return json_response(payload, response)
+
+@app.get("/videos")
+def list_videos(request: Request, response: Response, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None,
+                fields: str = None, order: str = "published_on"):
+    """
+    One page of comments, read in index order. `fields` picks columns (comma-separated), `order`
+    is a sort column with an optional "-" for descending, and `cursor` is the next_cursor of the previous page.
+    """
+    if not warmup.is_ready("youtube") and not has_data():
+        return warmup.warming_response("youtube")
+    unchanged = conditional(request, response, db_version("./youtube/youtube.db"))
+    if unchanged is not None:
+        return unchanged
+
+    conn = sqlite3.connect("./youtube/youtube.db")
+    page = fetch_page(conn, "videos", VIDEO_FIELDS, VIDEO_ORDERS, fields, order, limit, cursor)
+    conn.close()
+    return page
+
+@app.get("/metrics")
+def get_metrics(request: Request, response: Response):
+    """The aggregate metrics block on its own, for the charts."""
+    if not warmup.is_ready("youtube") and not has_data():
+        return warmup.warming_response("youtube")
+    unchanged = conditional(request, response, db_version("./youtube/youtube.db"))
+    if unchanged is not None:
+        return unchanged
+
+    conn = sqlite3.connect("./youtube/youtube.db")
+    metrics = calculate_metrics(conn)
+    conn.close()
+    return metrics
 
 # Run the app with: uvicorn youtube:app --reload
\ No newline at end of file
@@ -18,6 +18,11 @@ import {
 } from "recharts"
 import { TagCloud } from "react-tagcloud"
 import Loading from "./ui/Loading"
+import { createDeltaFeed } from "../lib/deltaFeed"
+import { subscribe } from "../lib/liveEvents"
+
+// Polls download only the rows changed since the previous poll
+const fetchLatest = createDeltaFeed("http://127.0.0.1:8000/mastodon")
 
 function Mastodon() {
   const [loading, setLoading] = useState(true)
@@ -55,8 +60,7 @@ function Mastodon() {
   const stopWords = new Set(["a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "as", "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can", "did", "do", "does", "doing", "don", "down", "during", "each", "few", "for", "from", "further", "had", "has", "have", "having", "he", "her", "here", "hers", "herself", "him", "himself", "his", "how", "i", "if", "in", "into", "is", "it", "its", "itself", "just", "me", "more", "most", "my", "myself", "no", "nor", "not", "now", "of", "off", "on", "once", "only", "or", "other", "our", "ours", "ourselves", "out", "over", "own", "s", "same", "she", "should", "so", "some", "such", "t", "than", "that", "the", "their", "theirs", "them", "themselves", "then", "there", "these", "they", "this", "those", "through", "to", "too", "under", "until", "up", "very", "was", "we", "were", "what", "when", "where", "which", "while", "who", "whom", "why", "will", "with", "you", "your", "yours", "yourself", "yourselves"])
 
   const fetchData = () => {
-    fetch("http://127.0.0.1:8000/mastodon")
-      .then((response) => response.json())
+    fetchLatest()
       .then((data) => {
         const results = data.results
         const totalPosts = results.length
@@ -227,8 +231,8 @@ function Mastodon() {
 
   useEffect(() => {
     fetchData()
-    const interval = setInterval(fetchData, 60000)
-    return () => clearInterval(interval)
+    // Refetch when the server reports new data instead of polling
+    return subscribe("mastodon", fetchData)
   }, [])
 
   return (
@@ -23,6 +23,11 @@ import {
 } from "recharts"
 import { TagCloud } from "react-tagcloud"
 import Loading from "./ui/Loading"
+import { createDeltaFeed } from "../lib/deltaFeed"
+import { subscribe } from "../lib/liveEvents"
+
+// Polls download only the rows changed since the previous poll
+const fetchLatest = createDeltaFeed("http://127.0.0.1:8000/threads", { sortKey: "published_on" });
 
 function Threads() {
   const [loading, setLoading] = useState(true)
@@ -214,8 +219,7 @@ function Threads() {
   };
 
   const fetchData = () => {
-    fetch("http://127.0.0.1:8000/threads")
-      .then((response) => response.json())
+    fetchLatest()
       .then((data) => {
         const { results, metrics } = data;
         const totalPosts = results.length;
@@ -364,9 +368,8 @@ function Threads() {
 
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchData, 60000);
-
-    return () => clearInterval(interval);
+    // Refetch when the server reports new data instead of polling
+    return subscribe("threads", fetchData);
   }, []);
 
   return (
@@ -66,20 +66,18 @@ function App() {
   const [sentimentData, setSentimentData] = useState([]);
   useEffect(() => {
     const fetchAllMonths = async () => {
-      const results = [];
-      for (let offset = 0; offset <= 12; offset++) {
-        const res = await fetch(
-          `http://127.0.0.1:5000/api/sentiment/${offset}`
-        );
-        const data = await res.json();
-        const label = `${data.year}-${String(data.month).padStart(2, "0")}`;
-        let pos = data.positive || 0;
-        let neg = data.negative || 0;
-        let neu = data.neutral || 0;
-        results.push({ label, pos, neg, neu });
-      }
-      // Place the most recent (offset=0) at the right end
-      setSentimentData(results.reverse());
+      // All 13 months in one request, oldest first (the most recent ends up at the right end)
+      const res = await fetch(
+        "http://127.0.0.1:5000/api/sentiment/range?start=0&end=12"
+      );
+      const data = await res.json();
+      const results = data.map((month) => ({
+        label: `${month.year}-${String(month.month).padStart(2, "0")}`,
+        pos: month.positive || 0,
+        neg: month.negative || 0,
+        neu: month.neutral || 0,
+      }));
+      setSentimentData(results);
     };
     fetchAllMonths();
   }, []);
@@ -23,6 +23,11 @@ import {
 } from "recharts"
 import { TagCloud } from "react-tagcloud"
 import Loading from "./ui/Loading"
+import { createDeltaFeed } from "../lib/deltaFeed"
+import { subscribe } from "../lib/liveEvents"
+
+// Polls download only the rows changed since the previous poll
+const fetchLatest = createDeltaFeed("http://127.0.0.1:8000/youtube/", { sortKey: "published_on" });
 
 function YouTube() {
   const [loading, setLoading] = useState(true)
@@ -211,8 +216,7 @@ function YouTube() {
   };
 
   const fetchData = () => {
-    fetch("http://127.0.0.1:8000/youtube/")
-      .then((response) => response.json())
+    fetchLatest()
       .then((data) => {
         const { results, metrics } = data;
         const totalPosts = results.length;
@@ -359,9 +363,8 @@ function YouTube() {
 
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchData, 60000);
-
-    return () => clearInterval(interval);
+    // Refetch when the server reports new data instead of polling
+    return subscribe("youtube", fetchData);
   }, []);
 
   return (
@@ -0,0 +1,27 @@
+// Keeps a local copy of a dashboard endpoint's rows. The first call downloads everything;
+// later calls send the cursor from the previous response (?since=) and merge in only the
+// rows inserted, relabeled or deleted since then. Resolves to the payload with the merged
+// rows in `results`.
+export function createDeltaFeed(url, { key = "id", sortKey } = {}) {
+  const rows = new Map()
+  let cursor = null
+
+  return async function fetchLatest() {
+    const separator = url.includes("?") ? "&" : "?"
+    const response = await fetch(cursor === null ? url : `${url}${separator}since=${cursor}`)
+    const data = await response.json()
+    // Warming-up responses carry no rows or cursor
+    if (data.cursor === undefined) return data
+
+    if (cursor === null) rows.clear()
+    data.results.forEach((row) => rows.set(row[key], row))
+    ;(data.deleted || []).forEach((rowKey) => rows.delete(rowKey))
+    cursor = data.cursor
+
+    const results = [...rows.values()]
+    if (sortKey) {
+      results.sort((a, b) => (a[sortKey] < b[sortKey] ? -1 : a[sortKey] > b[sortKey] ? 1 : a[key] - b[key]))
+    }
+    return { ...data, results }
+  }
+}
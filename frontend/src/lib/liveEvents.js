@@ -0,0 +1,44 @@
+// One EventSource to the combined server's /events stream, shared by every tab. subscribe()
+// calls back whenever a source's data changes (its change cursor moves), including changes
+// made while the connection was down, so tabs refetch only when there is something new.
+const EVENTS_URL = "http://127.0.0.1:8000/events"
+
+const listeners = new Map()
+const cursors = {}
+let events = null
+
+function notify(name, cursor) {
+  if (cursors[name] === cursor) return
+  cursors[name] = cursor
+  ;(listeners.get(name) || []).forEach((callback) => callback())
+}
+
+function connect() {
+  events = new EventSource(EVENTS_URL)
+  // Sent on every (re)connect: the first one is the baseline, later ones catch up on missed changes
+  events.addEventListener("hello", (event) => {
+    Object.entries(JSON.parse(event.data).cursors).forEach(([name, cursor]) => {
+      if (cursor === null) return
+      if (cursors[name] === undefined) cursors[name] = cursor
+      else notify(name, cursor)
+    })
+  })
+  events.addEventListener("changed", (event) => {
+    const { source, cursor } = JSON.parse(event.data)
+    notify(source, cursor)
+  })
+}
+
+export function subscribe(name, callback) {
+  if (!listeners.has(name)) listeners.set(name, new Set())
+  listeners.get(name).add(callback)
+  if (events === null) connect()
+
+  return () => {
+    listeners.get(name).delete(callback)
+    if ([...listeners.values()].every((callbacks) => callbacks.size === 0)) {
+      events.close()
+      events = null
+    }
+  }
+}